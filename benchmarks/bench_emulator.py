@@ -0,0 +1,58 @@
+"""Benchmark loading and querying the in-memory datastore.
+
+Saves a number of entities
+through an :class:`gclouddatastore.emulator.InMemoryConnection`
+and prints how long it took,
+along with the time taken by a few kinds of query::
+
+  $ python benchmarks/bench_emulator.py 100000
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gclouddatastore.emulator import InMemoryConnection
+from gclouddatastore.key import Key
+
+
+def _timed(name, func, count=None):
+  start = time.time()
+  result = func()
+  elapsed = time.time() - start
+  rate = ''
+  if count:
+    rate = '(%.0f per second)' % (count / elapsed)
+  print '%-28s %8.3fs %s' % (name, elapsed, rate)
+  return result
+
+
+def main(count=100000, batch=500):
+  dataset = InMemoryConnection().dataset('dataset')
+
+  def load():
+    for start in range(0, count, batch):
+      entities = []
+      for id in range(start + 1, min(start + batch, count) + 1):
+        entity = dataset.entity('Thing').key(
+            Key.from_path('Thing', id, dataset=dataset))
+        entity.update({'group': id % 100, 'value': (id * 7919) % count})
+        entities.append(entity)
+      dataset.put_entities(entities)
+
+  _timed('load', load, count)
+
+  query = dataset.query('Thing')
+  _timed('first page (key order)', lambda: query.fetch(100))
+  _timed('scan (key order)', lambda: len(list(query)), count)
+  _timed('equality filter', lambda: len(query.filter('group =', 7).fetch()))
+  _timed('sort (first query)', lambda: query.order('-value').fetch(100))
+  _timed('sort (cached)', lambda: query.order('-value').fetch(100))
+  _timed('inequality filter', lambda: len(
+      query.filter('value <', count // 10).fetch()))
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+"""Benchmark encoding and decoding property values.
+
+Prints the time taken per property (in nanoseconds)
+by :func:`gclouddatastore.helpers.set_protobuf_value`
+and :func:`gclouddatastore.helpers.get_value_from_protobuf`
+for each of the value types::
+
+  $ python benchmarks/bench_values.py
+"""
+
+import datetime
+import os
+import sys
+import timeit
+
+import pytz
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore import helpers
+from gclouddatastore.dataset import Dataset
+from gclouddatastore.key import Key
+
+
+VALUES = [
+    ('bool', True),
+    ('int', 1234),
+    ('float', 3.14),
+    ('string', 'a string'),
+    ('datetime', datetime.datetime(2014, 1, 1, tzinfo=pytz.utc)),
+    ('key', Key.from_path('Kind', 1234, dataset=Dataset('dataset'))),
+    ]
+
+
+def _time_per_call(func, number):
+  best = min(timeit.repeat(func, number=number, repeat=5))
+  return best / number * 1e9
+
+
+def main(number=100000):
+  print '%-10s %12s %12s' % ('type', 'encode (ns)', 'decode (ns)')
+
+  for name, value in VALUES:
+    value_pb = datastore_pb.Value()
+    try:
+      helpers.set_protobuf_value(value_pb, value)
+    except Exception as e:
+      print '%-10s %12s %12s' % (name, type(e).__name__, '-')
+      continue
+
+    property_pb = datastore_pb.Property(name='property')
+    property_pb.value.CopyFrom(value_pb)
+
+    encode = _time_per_call(
+        lambda: helpers.set_protobuf_value(datastore_pb.Value(), value), number)
+    decode = _time_per_call(
+        lambda: helpers.get_value_from_protobuf(property_pb), number)
+    print '%-10s %12.0f %12.0f' % (name, encode, decode)
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,377 @@
+"""Buffering saves and deletes to commit them in batches.
+
+Saving entities one at a time means one ``commit`` request per entity.
+A :class:`Batcher` collects saves and deletes
+into a single mutation
+and commits it in the background
+once it gets big enough (or old enough),
+so high volumes of small writes turn into a few large requests.
+"""
+
+import collections
+import threading
+import time
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore import helpers
+from gclouddatastore.key import Key
+
+
+class Future(object):
+  """The eventual result of a save or delete added to a :class:`Batcher`.
+
+  >>> future = batcher.save(entity)
+  >>> future.done()
+  False
+  >>> future.result()  # Waits for the batch to be committed.
+  <Entity object>
+  """
+
+  def __init__(self):
+    self._done = threading.Event()
+    self._result = None
+    self._exception = None
+
+  def done(self):
+    """Whether the batch holding this operation has been committed (or failed).
+
+    :rtype: bool
+    """
+    return self._done.is_set()
+
+  def exception(self, timeout=None):
+    """Wait for the operation and return the exception it raised, if any.
+
+    :type timeout: float
+    :param timeout: The number of seconds to wait.
+                    If ``None``, waits forever.
+
+    :rtype: Exception or None
+    :returns: The error raised while committing the batch.
+    """
+    if not self._done.wait(timeout):
+      raise RuntimeError('Timed out waiting for the batch to be committed.')
+    return self._exception
+
+  def result(self, timeout=None):
+    """Wait for the operation and return its result.
+
+    If the batch failed to commit, the error is raised here.
+
+    :type timeout: float
+    :param timeout: The number of seconds to wait.
+                    If ``None``, waits forever.
+
+    :returns: The saved :class:`gclouddatastore.entity.Entity`
+              or the deleted :class:`gclouddatastore.key.Key`.
+    """
+    exception = self.exception(timeout)
+    if exception:
+      raise exception
+    return self._result
+
+  def set_result(self, result):
+    self._result = result
+    self._done.set()
+
+  def set_exception(self, exception):
+    self._exception = exception
+    self._done.set()
+
+
+class Batcher(object):
+  """Collects saves and deletes and commits them in batches.
+
+  You typically won't construct this directly,
+  but instead use :func:`gclouddatastore.dataset.Dataset.batcher`::
+
+    >>> with dataset.batcher(max_latency=0.5) as batcher:
+    ...   for event in events:
+    ...     entity = dataset.entity('Event')
+    ...     entity.update(event)
+    ...     batcher.save(entity)
+
+  Each call to :func:`save` or :func:`delete` returns immediately
+  with a :class:`Future`.
+  The operations are added to a mutation
+  which is committed (non-transactionally) in the background
+  once any of the limits below are reached,
+  and everything left is committed on leaving the ``with`` block
+  (or calling :func:`close`).
+
+  Since a commit either succeeds or fails as a whole,
+  if a batch fails to commit
+  every :class:`Future` in that batch will raise the error.
+
+  Operations on the same key within a batch are coalesced,
+  so only the last one is committed:
+  saving an entity twice only writes the second version,
+  and deleting it after saving it only deletes it.
+  The futures for the operations replaced
+  still finish along with the batch.
+  Batches are committed concurrently,
+  except that a batch isn't sent
+  while an earlier batch touching any of the same keys is still in flight,
+  so writes to each key are applied in the order they were made.
+
+  Entities are encoded exactly as they would be by
+  :func:`gclouddatastore.entity.Entity.save`,
+  and entities with partial keys get their keys updated
+  once their batch is committed.
+  If the dataset has a cache,
+  the keys written are invalidated as each batch is committed.
+
+  :type dataset: :class:`gclouddatastore.dataset.Dataset`
+  :param dataset: The dataset to write to.
+
+  :type max_mutations: integer
+  :param max_mutations: Commit once a batch has this many operations.
+
+  :type max_bytes: integer
+  :param max_bytes: Commit once a batch is (approximately) this big.
+
+  :type max_latency: float
+  :param max_latency: Commit once the oldest operation in a batch
+                      has been waiting this many seconds.
+  """
+
+  def __init__(self, dataset, max_mutations=500, max_bytes=1024 * 1024,
+               max_latency=1.0):
+    self._dataset = dataset
+    self._max_mutations = max_mutations
+    self._max_bytes = max_bytes
+    self._max_latency = max_latency
+
+    self._condition = threading.Condition()
+    self._batch = None
+    self._ready = []
+    self._in_flight = []
+    self._unfinished = []
+    self._closed = False
+
+    self._flusher = threading.Thread(target=self._run)
+    self._flusher.daemon = True
+    self._flusher.start()
+
+  def _add(self, identity, operation):
+    with self._condition:
+      if self._closed:
+        raise ValueError('Cannot add to a closed batcher.')
+
+      if self._dataset.connection().transaction():
+        raise ValueError('Cannot batch writes inside a transaction.')
+
+      if not self._batch:
+        self._batch = _Batch()
+        # Wake up the flusher so it starts counting down max_latency.
+        self._condition.notify()
+
+      self._batch.add(identity, operation)
+
+      if (len(self._batch.operations) >= self._max_mutations or
+          self._batch.size >= self._max_bytes):
+        self._send_batch()
+
+    return operation.future
+
+  def _send_batch(self):
+    """Hand the current batch over to be committed.
+
+    This must be called while holding ``self._condition``.
+    """
+    self._ready.append(self._batch)
+    self._unfinished.append(self._batch)
+    self._batch = None
+    self._condition.notify()
+
+  def save(self, entity):
+    """Add an entity to be saved.
+
+    :type entity: :class:`gclouddatastore.entity.Entity`
+    :param entity: The entity to save.
+
+    :rtype: :class:`Future`
+    :returns: A future for the saved entity.
+    """
+    # Encoding the entity now means later changes to it
+    # don't change what's saved.
+    entity_pb = datastore_pb.Entity()
+    helpers.set_entity_protobuf(entity_pb, entity.key().to_protobuf(),
+                                dict(entity.iteritems()))
+
+    auto_id = entity.key().is_partial()
+    if auto_id:
+      # Every entity with a partial key is a new entity.
+      identity = object()
+    else:
+      identity = helpers.get_key_identity(entity_pb.key)
+
+    return self._add(identity, _Operation(
+        Future(), entity, entity_pb, None, auto_id, entity_pb.ByteSize()))
+
+  def delete(self, key):
+    """Add a key to be deleted.
+
+    :type key: :class:`gclouddatastore.key.Key`
+    :param key: The key of the entity to delete.
+
+    :rtype: :class:`Future`
+    :returns: A future for the deleted key.
+    """
+    key_pb = key.to_protobuf()
+    return self._add(helpers.get_key_identity(key_pb), _Operation(
+        Future(), key, None, key_pb, False, key_pb.ByteSize()))
+
+  def _wait(self):
+    """Wait for all of the batches sent so far to finish."""
+    with self._condition:
+      unfinished = list(self._unfinished)
+
+    for batch in unfinished:
+      for future in batch.futures():
+        future.exception()
+
+  def flush(self):
+    """Commit everything added so far, waiting for it to finish."""
+    with self._condition:
+      if self._batch:
+        self._send_batch()
+    self._wait()
+
+  def close(self):
+    """Commit everything left and stop the background thread."""
+    with self._condition:
+      self._closed = True
+      if self._batch:
+        self._send_batch()
+      self._condition.notify()
+
+    self._flusher.join()
+    self._wait()
+
+  def _take_sendable(self):
+    """Take the ready batches which don't clash with any in flight.
+
+    A batch clashes with a batch in flight
+    (or an earlier batch still waiting)
+    if they have any keys in common.
+
+    This must be called while holding ``self._condition``.
+
+    :rtype: list of :class:`_Batch`
+    :returns: The batches which can be committed now, in order.
+    """
+    blocked = set()
+    for batch in self._in_flight:
+      blocked.update(batch.operations)
+
+    sendable, waiting = [], []
+    for batch in self._ready:
+      if blocked.isdisjoint(batch.operations):
+        sendable.append(batch)
+      else:
+        waiting.append(batch)
+      blocked.update(batch.operations)
+
+    self._ready = waiting
+    self._in_flight.extend(sendable)
+    return sendable
+
+  def _run(self):
+    while True:
+      with self._condition:
+        while True:
+          sendable = self._take_sendable()
+          if sendable:
+            break
+          if self._closed and not self._ready:
+            return
+
+          timeout = None
+          if self._batch:
+            timeout = self._batch.started + self._max_latency - time.time()
+            if timeout <= 0:
+              self._send_batch()
+              continue
+
+          self._condition.wait(timeout)
+
+      for batch in sendable:
+        self._dataset.connection().submit(self._commit, batch)
+
+  def _commit(self, batch):
+    try:
+      mutation = batch.mutation()
+      result = self._dataset.connection().commit(self._dataset.id(), mutation)
+
+      # Update any cache before the futures say the writes are done.
+      self._dataset._uncache_key_pbs(
+          [entity_pb.key for entity_pb in mutation.upsert] +
+          list(mutation.delete))
+
+      auto_id_keys = iter(result.insert_auto_id_key)
+      for operation in batch.operations.itervalues():
+        if operation.auto_id:
+          key = Key.from_protobuf(auto_id_keys.next())
+          operation.item.key(operation.item.key().path(key.path()))
+    except Exception as e:
+      for future in batch.futures():
+        future.set_exception(e)
+    else:
+      for operation in batch.superseded + batch.operations.values():
+        operation.future.set_result(operation.item)
+    finally:
+      with self._condition:
+        self._in_flight.remove(batch)
+        self._unfinished.remove(batch)
+        # Batches waiting on this one can now be sent.
+        self._condition.notify()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+
+# A save (with an ``entity_pb``) or a delete (with a ``delete_key_pb``).
+_Operation = collections.namedtuple(
+    '_Operation', 'future item entity_pb delete_key_pb auto_id size')
+
+
+class _Batch(object):
+  """The operations to commit together, by the identity of their keys.
+
+  Adding an operation on a key already in the batch
+  replaces the earlier operation,
+  which is kept in ``superseded`` so that its future can be finished.
+  """
+
+  def __init__(self):
+    self.operations = collections.OrderedDict()
+    self.superseded = []
+    self.size = 0
+    self.started = time.time()
+
+  def add(self, identity, operation):
+    previous = self.operations.pop(identity, None)
+    if previous:
+      self.superseded.append(previous)
+      self.size -= previous.size
+    self.operations[identity] = operation
+    self.size += operation.size
+
+  def futures(self):
+    return [operation.future
+            for operation in self.superseded + self.operations.values()]
+
+  def mutation(self):
+    mutation = datastore_pb.Mutation()
+    for operation in self.operations.itervalues():
+      if operation.delete_key_pb is not None:
+        mutation.delete.add().CopyFrom(operation.delete_key_pb)
+      elif operation.auto_id:
+        mutation.insert_auto_id.add().CopyFrom(operation.entity_pb)
+      else:
+        mutation.upsert.add().CopyFrom(operation.entity_pb)
+    return mutation
@@ -0,0 +1,445 @@
+"""Caching entities to avoid repeated lookups.
+
+A cache can be attached to a :class:`gclouddatastore.dataset.Dataset`,
+which will then check it before looking up any keys
+in the Cloud Datastore::
+
+  >>> from gclouddatastore.cache import LRUCache
+  >>> cache = LRUCache(max_entries=10000, kind_ttls={'Config': 60})
+  >>> dataset = connection.dataset('dataset-id', cache=cache)
+  >>> dataset.get_entity(key)  # Looked up in the datastore.
+  >>> dataset.get_entity(key)  # Served from the cache.
+  >>> cache.stats()
+  {'hits': 1, 'misses': 1, 'evictions': 0}
+
+Entities are stored as serialized
+:class:`gclouddatastore.datastore_v1_pb2.Entity` protobufs,
+so every lookup returns a fresh copy.
+
+Entities are only ever added to the cache after being looked up,
+and only if the cache doesn't already hold something for their key.
+Saving or deleting an entity invalidates its cache entry
+by replacing it with a short-lived tombstone,
+so a lookup which raced with the write
+can't put back the version from before it.
+
+To share a cache between processes (or machines),
+use a :class:`MemcacheCache` with any memcached client::
+
+  >>> import memcache
+  >>> client = memcache.Client(['127.0.0.1:11211'])
+  >>> dataset = connection.dataset('dataset-id', cache=MemcacheCache(client))
+"""
+
+import collections
+import hashlib
+import threading
+import time
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+
+
+class Cache(object):
+  """The base class for entity caches.
+
+  This class deals with turning keys and entities into cache entries,
+  and works out how long each entry should live for.
+  Subclasses provide the actual storage
+  by implementing :func:`get_multi`, :func:`set_multi`,
+  :func:`add_multi` and :func:`delete_multi`.
+
+  :type ttl: integer
+  :param ttl: The default number of seconds an entity stays cached.
+              If ``None``, entities stay cached until they're evicted.
+
+  :type kind_ttls: dict
+  :param kind_ttls: A mapping of kinds to the number of seconds
+                    entities of that kind stay cached,
+                    overriding the default ``ttl``.
+                    A TTL of ``0`` means the kind is never cached.
+
+  :type tombstone_ttl: integer
+  :param tombstone_ttl: The number of seconds an invalidated key
+                        is kept out of the cache for.
+                        This should be longer than a lookup can take.
+                        If ``0``, invalidated keys are just deleted.
+  """
+
+  # Stored in place of an entity that has just been written.
+  # A serialized Entity always has a key, so is never empty.
+  _TOMBSTONE = ''
+
+  def __init__(self, ttl=None, kind_ttls=None, tombstone_ttl=10):
+    self._ttl = ttl
+    self._kind_ttls = kind_ttls or {}
+    self._tombstone_ttl = tombstone_ttl
+
+  def get_multi(self, keys):
+    """Get the values stored for several cache keys.
+
+    :type keys: list of strings
+    :param keys: The cache keys to get.
+
+    :rtype: dict
+    :returns: A mapping of the cache keys found to their values.
+    """
+    raise NotImplementedError
+
+  def set_multi(self, mapping, ttl=None):
+    """Store several values.
+
+    :type mapping: dict
+    :param mapping: A mapping of cache keys to the values to store.
+
+    :type ttl: integer
+    :param ttl: The number of seconds to keep the values,
+                or ``None`` to keep them until they're evicted.
+    """
+    raise NotImplementedError
+
+  def add_multi(self, mapping, ttl=None):
+    """Store several values, but only for the keys not already stored.
+
+    :type mapping: dict
+    :param mapping: A mapping of cache keys to the values to store.
+
+    :type ttl: integer
+    :param ttl: The number of seconds to keep the values,
+                or ``None`` to keep them until they're evicted.
+    """
+    raise NotImplementedError
+
+  def delete_multi(self, keys):
+    """Remove several values.
+
+    :type keys: list of strings
+    :param keys: The cache keys to remove.
+    """
+    raise NotImplementedError
+
+  def get_ttl(self, kind):
+    """Get the number of seconds entities of a kind should stay cached.
+
+    :type kind: string
+    :param kind: The kind of entity.
+
+    :rtype: integer or None
+    :returns: The TTL in seconds, or ``None`` for no expiry.
+    """
+    return self._kind_ttls.get(kind, self._ttl)
+
+  def get_cache_key(self, key_pb):
+    """Get the cache key for a Key protobuf.
+
+    :type key_pb: :class:`gclouddatastore.datastore_v1_pb2.Key`
+    :param key_pb: The key of the entity.
+
+    :rtype: string
+    :returns: The serialized key, with the dataset ID normalized
+              (the API doesn't always return the ``s~`` prefix).
+    """
+    dataset_id = key_pb.partition_id.dataset_id
+    if dataset_id.startswith('s~'):
+      return key_pb.SerializeToString()
+
+    normalized = datastore_pb.Key()
+    normalized.CopyFrom(key_pb)
+    if dataset_id:
+      normalized.partition_id.dataset_id = 's~' + dataset_id
+    return normalized.SerializeToString()
+
+  def get_entity_pbs(self, key_pbs):
+    """Get the cached entities for several keys.
+
+    :type key_pbs: list of :class:`gclouddatastore.datastore_v1_pb2.Key`
+    :param key_pbs: The keys to look for.
+
+    :rtype: list of :class:`gclouddatastore.datastore_v1_pb2.Entity`
+    :returns: One result per key, with ``None`` for keys not in the cache.
+    """
+    cache_keys = [self.get_cache_key(key_pb) for key_pb in key_pbs]
+    found = self.get_multi(cache_keys)
+
+    results = []
+    for cache_key in cache_keys:
+      if found.get(cache_key):
+        results.append(datastore_pb.Entity.FromString(found[cache_key]))
+      else:
+        results.append(None)
+    return results
+
+  def add_entity_pbs(self, entity_pbs):
+    """Cache several entities which have just been looked up.
+
+    Entities are only added for keys with nothing cached,
+    so this never overwrites a newer version
+    (or the tombstone left by :func:`delete_key_pbs`).
+
+    :type entity_pbs: list of :class:`gclouddatastore.datastore_v1_pb2.Entity`
+    :param entity_pbs: The entities to cache.
+    """
+    by_ttl = collections.defaultdict(dict)
+    for entity_pb in entity_pbs:
+      ttl = self.get_ttl(entity_pb.key.path_element[-1].kind)
+      if ttl != 0:
+        cache_key = self.get_cache_key(entity_pb.key)
+        by_ttl[ttl][cache_key] = entity_pb.SerializeToString()
+
+    for ttl, mapping in by_ttl.iteritems():
+      self.add_multi(mapping, ttl=ttl)
+
+  def delete_key_pbs(self, key_pbs):
+    """Invalidate the cached entities for several keys.
+
+    This should be called after the entities are written.
+    Each key is left with a tombstone for ``tombstone_ttl`` seconds,
+    which stops a lookup made before the write
+    from caching what it found.
+
+    :type key_pbs: list of :class:`gclouddatastore.datastore_v1_pb2.Key`
+    :param key_pbs: The keys of the entities to invalidate.
+    """
+    cache_keys = [self.get_cache_key(key_pb) for key_pb in key_pbs]
+    if self._tombstone_ttl:
+      self.set_multi(dict.fromkeys(cache_keys, self._TOMBSTONE),
+                     ttl=self._tombstone_ttl)
+    else:
+      self.delete_multi(cache_keys)
+
+
+class LRUCache(Cache):
+  """An in-process cache, evicting the least recently used entries.
+
+  The cache is bounded both by the number of entries
+  and (optionally) by the total size of the keys and values stored.
+  It's safe to share between threads.
+
+  :type max_entries: integer
+  :param max_entries: The maximum number of entries to keep.
+
+  :type max_bytes: integer
+  :param max_bytes: The maximum total size of the entries to keep.
+                    If ``None``, only ``max_entries`` applies.
+
+  :param kwargs: Any other arguments (``ttl`` and ``kind_ttls``)
+                 are passed along to :class:`Cache`.
+  """
+
+  def __init__(self, max_entries=1000, max_bytes=None, **kwargs):
+    super(LRUCache, self).__init__(**kwargs)
+    self._max_entries = max_entries
+    self._max_bytes = max_bytes
+    self._entries = collections.OrderedDict()
+    self._bytes = 0
+    self._lock = threading.Lock()
+    self._hits = self._misses = self._evictions = 0
+
+  def __len__(self):
+    return len(self._entries)
+
+  def stats(self):
+    """Get the counters describing how well the cache is doing.
+
+    :rtype: dict
+    :returns: The number of ``hits``, ``misses`` and ``evictions``.
+    """
+    return {'hits': self._hits, 'misses': self._misses,
+            'evictions': self._evictions}
+
+  def _remove(self, key):
+    value, _ = self._entries.pop(key)
+    self._bytes -= len(key) + len(value)
+
+  def get_multi(self, keys):
+    now = time.time()
+    found = {}
+
+    with self._lock:
+      for key in keys:
+        entry = self._entries.pop(key, None)
+        if entry and (entry[1] is None or entry[1] > now):
+          # Re-inserting the entry marks it as the most recently used.
+          self._entries[key] = entry
+          found[key] = entry[0]
+          if entry[0] == self._TOMBSTONE:
+            # A tombstone means the entity isn't cached.
+            self._misses += 1
+          else:
+            self._hits += 1
+        else:
+          if entry:
+            self._bytes -= len(key) + len(entry[0])
+          self._misses += 1
+
+    return found
+
+  def set_multi(self, mapping, ttl=None):
+    expires = None
+    if ttl is not None:
+      expires = time.time() + ttl
+
+    with self._lock:
+      for key, value in mapping.iteritems():
+        if key in self._entries:
+          self._remove(key)
+        self._entries[key] = (value, expires)
+        self._bytes += len(key) + len(value)
+
+      self._evict()
+
+  def add_multi(self, mapping, ttl=None):
+    now = time.time()
+    expires = None
+    if ttl is not None:
+      expires = now + ttl
+
+    with self._lock:
+      for key, value in mapping.iteritems():
+        entry = self._entries.get(key)
+        if entry and (entry[1] is None or entry[1] > now):
+          continue
+        if entry:
+          self._remove(key)
+        self._entries[key] = (value, expires)
+        self._bytes += len(key) + len(value)
+
+      self._evict()
+
+  def _evict(self):
+    """Remove entries until the cache is within its limits.
+
+    This must be called while holding ``self._lock``.
+    """
+    while self._entries and (
+        len(self._entries) > self._max_entries or
+        (self._max_bytes is not None and self._bytes > self._max_bytes)):
+      self._remove(next(iter(self._entries)))
+      self._evictions += 1
+
+  def delete_multi(self, keys):
+    with self._lock:
+      for key in keys:
+        if key in self._entries:
+          self._remove(key)
+
+  def clear(self):
+    """Remove everything from the cache."""
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+
+class MemcacheCache(Cache):
+  """A cache stored in memcached (or anything speaking its protocol).
+
+  No particular client library is required.
+  The client only needs ``get_multi``, ``set_multi``, ``add``
+  and ``delete_multi`` methods like those of ``python-memcached``,
+  so that each lookup is a single round trip to the cache
+  however many keys it involves.
+  Clients with an ``add_multi`` method (like ``pylibmc``)
+  also fill the cache in a single round trip.
+
+  Memcached keys are limited in length and in the characters allowed,
+  so the serialized keys are hashed to build the memcached keys.
+
+  :param client: The memcached client.
+
+  :type prefix: string
+  :param prefix: A prefix for every memcached key,
+                 to keep them apart from anything else in the cache.
+
+  :param kwargs: Any other arguments (``ttl`` and ``kind_ttls``)
+                 are passed along to :class:`Cache`.
+  """
+
+  def __init__(self, client, prefix='gclouddatastore:', **kwargs):
+    super(MemcacheCache, self).__init__(**kwargs)
+    self._client = client
+    self._prefix = prefix
+
+  def _get_memcache_key(self, key):
+    return self._prefix + hashlib.sha1(key).hexdigest()
+
+  def get_multi(self, keys):
+    memcache_keys = dict((self._get_memcache_key(key), key) for key in keys)
+    found = self._client.get_multi(memcache_keys.keys())
+    return dict((memcache_keys[memcache_key], value)
+                for memcache_key, value in found.iteritems())
+
+  def set_multi(self, mapping, ttl=None):
+    self._client.set_multi(
+        dict((self._get_memcache_key(key), value)
+             for key, value in mapping.iteritems()),
+        time=ttl or 0)
+
+  def add_multi(self, mapping, ttl=None):
+    mapping = dict((self._get_memcache_key(key), value)
+                   for key, value in mapping.iteritems())
+    if hasattr(self._client, 'add_multi'):
+      self._client.add_multi(mapping, time=ttl or 0)
+    else:
+      for memcache_key, value in mapping.iteritems():
+        self._client.add(memcache_key, value, time=ttl or 0)
+
+  def delete_multi(self, keys):
+    self._client.delete_multi([self._get_memcache_key(key) for key in keys])
+
+
+class LocalMemcacheClient(object):
+  """An in-process stand-in for a memcached client.
+
+  This implements just enough of the ``python-memcached`` interface
+  for a :class:`MemcacheCache`,
+  which is handy for testing without a memcached server.
+  """
+
+  # The ``time`` argument of set_multi hides the module.
+  _clock = staticmethod(time.time)
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._values = {}
+
+  def get_multi(self, keys):
+    now = self._clock()
+    found = {}
+    with self._lock:
+      for key in keys:
+        if key in self._values:
+          value, expires = self._values[key]
+          if expires and expires <= now:
+            del self._values[key]
+          else:
+            found[key] = value
+    return found
+
+  def set_multi(self, mapping, time=0):
+    expires = 0
+    if time:
+      expires = self._clock() + time
+
+    with self._lock:
+      for key, value in mapping.iteritems():
+        self._values[key] = (value, expires)
+    return []
+
+  def add(self, key, val, time=0):
+    now = self._clock()
+    expires = 0
+    if time:
+      expires = now + time
+
+    with self._lock:
+      if key in self._values:
+        _, current_expires = self._values[key]
+        if not current_expires or current_expires > now:
+          return False
+      self._values[key] = (val, expires)
+    return True
+
+  def delete_multi(self, keys):
+    with self._lock:
+      for key in keys:
+        self._values.pop(key, None)
+    return True
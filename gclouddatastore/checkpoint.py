@@ -0,0 +1,137 @@
+"""Saving the progress of long-running scans to a file.
+
+A scan over millions of entities can take hours,
+and shouldn't have to start over if it fails part way through.
+A :class:`Checkpoint` periodically saves the query's cursor
+(along with the number of results seen)
+so that running the scan again picks up where it left off::
+
+  >>> checkpoint = Checkpoint('/var/tmp/export-people.json')
+  >>> for person in checkpoint.iter(dataset.query('Person')):
+  ...   export(person)
+"""
+
+import base64
+import json
+import os
+import time
+
+
+class Checkpoint(object):
+  """The progress of a scan, saved to a local file.
+
+  Progress is saved by writing a new file
+  and renaming it over the old one,
+  so a crash while saving never leaves a half-written checkpoint.
+
+  Since cursors are only returned at the end of each batch
+  (see :func:`gclouddatastore.query.Iterator.cursor`),
+  a resumed scan can see again some of the results
+  seen just before it stopped,
+  so the work done with each result should be safe to repeat.
+
+  :type path: string
+  :param path: The file to save progress to.
+
+  :type interval: float
+  :param interval: The least number of seconds between saves.
+                   Progress is always saved when the scan finishes.
+  """
+
+  _clock = staticmethod(time.time)
+
+  def __init__(self, path, interval=30):
+    self._path = path
+    self._interval = interval
+
+  def load(self):
+    """Load the saved progress.
+
+    :rtype: tuple
+    :returns: The cursor to resume from and the number of results before it,
+              or ``(None, 0)`` if nothing has been saved yet.
+    """
+    if not os.path.exists(self._path):
+      return None, 0
+
+    with open(self._path) as checkpoint_file:
+      progress = json.load(checkpoint_file)
+
+    cursor = progress.get('cursor')
+    return (cursor and base64.b64decode(cursor)), progress.get('count', 0)
+
+  def save(self, cursor, count):
+    """Save progress, replacing anything saved before.
+
+    :type cursor: string
+    :param cursor: The cursor to resume from.
+
+    :type count: integer
+    :param count: The number of results before the cursor.
+    """
+    progress = {
+        'cursor': cursor and base64.b64encode(cursor),
+        'count': count,
+        }
+
+    temp_path = self._path + '.tmp'
+    with open(temp_path, 'w') as checkpoint_file:
+      json.dump(progress, checkpoint_file)
+      checkpoint_file.flush()
+      os.fsync(checkpoint_file.fileno())
+    os.rename(temp_path, self._path)
+
+  def clear(self):
+    """Delete the saved progress, so the next scan starts from the beginning."""
+    if os.path.exists(self._path):
+      os.remove(self._path)
+
+  def iter(self, query, limit=None, prefetch=0):
+    """Scan over the results of a query, resuming from any saved progress.
+
+    Progress is saved at most every ``interval`` seconds,
+    and once all the results have been returned.
+
+    :type query: :class:`gclouddatastore.query.Query`
+    :param query: The query to scan over.
+                  It must be the same query each time the scan is run.
+
+    :type limit: integer
+    :param limit: An optional limit on the results of the whole scan
+                  (including those returned before resuming).
+
+    :type prefetch: integer
+    :param prefetch: The number of batches to fetch ahead
+                     (see :func:`gclouddatastore.query.Query.iter`).
+
+    :rtype: iterator
+    :returns: The results of the query not yet seen.
+    """
+    if query._disjunctions:
+      raise ValueError('Queries with IN, != or OR filters have no cursor '
+                       'to resume from.')
+
+    cursor, count = self.load()
+
+    limit = limit or query.limit()
+    if limit:
+      if count >= limit:
+        return
+      limit -= count
+
+    if cursor:
+      query = query.start(cursor)
+
+    iterator = query.iter(limit=limit, prefetch=prefetch)
+    last_saved = self._clock()
+
+    for result in iterator:
+      # Every result before this one has been dealt with by now,
+      # so this is the furthest point it's safe to resume from.
+      if self._clock() - last_saved >= self._interval:
+        self.save(iterator.cursor(), count + iterator.count())
+        last_saved = self._clock()
+
+      yield result
+
+    self.save(iterator.cursor(), count + iterator.count())
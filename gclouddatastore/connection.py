@@ -1,8 +1,16 @@
+from multiprocessing.pool import ThreadPool
+import threading
+import urlparse
+
 import httplib2
 
 from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore import exceptions
 from gclouddatastore import helpers
 from gclouddatastore.dataset import Dataset
+from gclouddatastore.key import Key
+from gclouddatastore.pool import HttpPool
+from gclouddatastore.retry import RetryPolicy
 from gclouddatastore.transaction import Transaction
 
 
@@ -12,8 +20,49 @@ class Connection(object):
   This class should understand only the basic types (and protobufs)
   in method arguments, however should be capable of returning advanced types.
 
+  Connections are safe to share between threads.
+  Each request checks out its own HTTP transport
+  from a pool of authorized, keep-alive transports,
+  so many requests can be in flight at once
+  without re-authenticating or reconnecting for each one.
+  The current transaction (see :func:`transaction`) is kept per thread,
+  so a transaction on one thread never picks up another thread's writes.
+
   :type credentials: :class:`gclouddatastore.credentials.Credentials`
   :param credentials: The OAuth2 Credentials to use for this connection.
+
+  :type pool_size: integer
+  :param pool_size: The maximum number of idle HTTP transports to keep.
+
+  :type max_per_host: integer
+  :param max_per_host: The maximum number of concurrent requests to a host.
+                       If ``None``, there is no limit.
+
+  :type idle_timeout: integer
+  :param idle_timeout: The number of seconds after which
+                       an idle HTTP transport is closed rather than reused.
+
+  :type max_workers: integer
+  :param max_workers: The number of worker threads used by :func:`submit`
+                      to run work in the background.
+
+  :type retry_policy: :class:`gclouddatastore.retry.RetryPolicy` or dict
+  :param retry_policy: How to retry requests that fail with transient errors.
+                       A single policy applies to the idempotent RPCs
+                       (see ``IDEMPOTENT_METHODS``,
+                       plus non-transactional commits
+                       which don't allocate IDs).
+                       A dict maps RPC method names (ie, ``commit``)
+                       to the policy to use for that method,
+                       whether or not the request is idempotent.
+                       By default, idempotent requests are retried
+                       with a :class:`gclouddatastore.retry.RetryPolicy`.
+
+  :type api_base_url: string
+  :param api_base_url: The base of the API call URL,
+                       if not ``API_BASE_URL``
+                       (ie, ``http://localhost:8081`` to talk to a
+                       :class:`gclouddatastore.server.DatastoreServer`).
   """
 
   API_BASE_URL = 'https://www.googleapis.com'
@@ -26,26 +75,161 @@ class Connection(object):
                       '/datasets/{dataset_id}/{method}')
   """A template used to craft the URL pointing toward a particular API call."""
 
+  MAX_LOOKUP_KEYS = 1000
+  """The maximum number of keys sent in a single ``lookup`` request."""
+
+  MAX_MUTATIONS = 500
+  """The maximum number of entities changed in a single ``commit`` request."""
+
+  MAX_REQUEST_BYTES = 1024 * 1024
+  """The maximum (approximate) size of a ``lookup`` or ``commit`` request."""
+
+  # Field numbers used to build requests from pre-serialized pieces.
+  _LOOKUP_KEY_FIELD = datastore_pb.LookupRequest.KEY_FIELD_NUMBER
+  _LOOKUP_READ_OPTIONS_FIELD = (
+      datastore_pb.LookupRequest.READ_OPTIONS_FIELD_NUMBER)
+  _RUN_QUERY_PARTITION_ID_FIELD = (
+      datastore_pb.RunQueryRequest.PARTITION_ID_FIELD_NUMBER)
+  _RUN_QUERY_QUERY_FIELD = datastore_pb.RunQueryRequest.QUERY_FIELD_NUMBER
+  _RUN_QUERY_READ_OPTIONS_FIELD = (
+      datastore_pb.RunQueryRequest.READ_OPTIONS_FIELD_NUMBER)
+
+  IDEMPOTENT_METHODS = frozenset(['lookup', 'runQuery', 'rollback'])
+  """The RPC methods which are always safe to send more than once."""
+
   _EMPTY = object()
   """A pointer to represent an empty value for default arguments."""
 
-  def __init__(self, credentials=None):
+  def __init__(self, credentials=None, pool_size=10, max_per_host=None,
+               idle_timeout=300, max_workers=10, retry_policy=None,
+               api_base_url=None):
     self._credentials = credentials
-    self._current_transaction = None
-    self._http = None
+    self._api_base_url = api_base_url
+    self._pool = HttpPool(self._build_http, max_size=pool_size,
+                          max_per_host=max_per_host, idle_timeout=idle_timeout)
+    self._max_workers = max_workers
+    self._workers = None
+    self._workers_lock = threading.Lock()
+    self._local = threading.local()
+    self._retry_policy = retry_policy or RetryPolicy()
 
-  @property
-  def http(self):
-    """A getter for the HTTP transport used in talking to the API.
+  def _build_http(self):
+    """Build a new HTTP transport, authorized with our credentials.
+
+    All of the transports share the same credentials,
+    so the OAuth2 access token is only fetched (and refreshed) once.
 
     :rtype: :class:`httplib2.Http`
     :returns: A Http object used to transport data.
     """
-    if not self._http:
-      self._http = httplib2.Http()
-      if self._credentials:
-        self._http = self._credentials.authorize(self._http)
-    return self._http
+    http = httplib2.Http()
+    if self._credentials:
+      http = self._credentials.authorize(http)
+    return http
+
+  @property
+  def pool(self):
+    """A getter for the pool of HTTP transports used in talking to the API.
+
+    :rtype: :class:`gclouddatastore.pool.HttpPool`
+    :returns: The pool from which each request checks out a transport.
+    """
+    return self._pool
+
+  def submit(self, func, *args, **kwargs):
+    """Run a function in the background on one of the worker threads.
+
+    The worker threads are only started the first time this is called.
+    The function runs inside the calling thread's current transaction
+    (if there is one).
+
+    >>> result = connection.submit(dataset.get_entities, keys)
+    >>> do_other_work()
+    >>> entities = result.get()
+
+    :type func: callable
+    :param func: The function to run.
+
+    :param args: All args and kwargs will be passed along to the function.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the result.
+              Calling ``get()`` on it waits for the function to finish
+              and returns its result (or raises its exception).
+    """
+    with self._workers_lock:
+      if not self._workers:
+        self._workers = ThreadPool(self._max_workers)
+    return self._workers.apply_async(
+        self._run_in_worker, (func, args, kwargs, self.transaction()))
+
+  def close(self):
+    """Stop the worker threads and close the idle HTTP transports.
+
+    Any work already submitted is finished first.
+    The connection can still be used afterwards
+    (new workers and transports are created as they're needed),
+    but each connection should be closed once it's no longer needed
+    so that its threads don't linger.
+
+    This mustn't be called from one of the worker threads.
+    """
+    with self._workers_lock:
+      workers, self._workers = self._workers, None
+
+    if workers:
+      workers.close()
+      workers.join()
+
+    self._pool.close()
+
+  def _run_in_worker(self, func, args, kwargs, transaction):
+    self._local.in_worker = True
+    self._local.transaction = transaction
+    try:
+      return func(*args, **kwargs)
+    finally:
+      # The worker thread is reused for other work.
+      self._local.transaction = None
+
+  def _map(self, func, items, return_exceptions=False):
+    """Call a function on each item concurrently using the worker threads.
+
+    If there's only one item,
+    or if we're already on one of the worker threads
+    (where waiting on other workers could deadlock),
+    the calls are just made one after the other.
+
+    :type func: callable
+    :param func: The function to call with each item.
+
+    :type items: list
+    :param items: The items to pass to the function.
+
+    :type return_exceptions: bool
+    :param return_exceptions: If True, every call is waited for
+                              and any exception raised by a call
+                              is returned in place of its result.
+                              Otherwise the first exception is raised.
+
+    :rtype: list
+    :returns: The results, in the same order as the items.
+    """
+    if len(items) <= 1 or getattr(self._local, 'in_worker', False):
+      calls = [lambda item=item: func(item) for item in items]
+    else:
+      calls = [self.submit(func, item).get for item in items]
+
+    if not return_exceptions:
+      return [call() for call in calls]
+
+    results = []
+    for call in calls:
+      try:
+        results.append(call())
+      except Exception as e:
+        results.append(e)
+    return results
 
   def _request(self, dataset_id, method, data):
     """Make a request over the Http transport to the Cloud Datastore API.
@@ -63,26 +247,71 @@ class Connection(object):
     :rtype: string
     :returns: The string response content from the API call.
 
-    :raises: Exception if the response code is not 200 OK.
+    :raises: :class:`gclouddatastore.exceptions.RequestError`
+             if the response code is not 200 OK.
     """
     headers = {
         'Content-Type': 'application/x-protobuf',
         'Content-Length': str(len(data)),
         }
-    headers, content = self.http.request(
-        uri=self.build_api_url(dataset_id=dataset_id, method=method),
-        method='POST', headers=headers, body=data)
+    uri = self.build_api_url(dataset_id=dataset_id, method=method,
+                             base_url=self._api_base_url)
+
+    with self.pool.transport(urlparse.urlsplit(uri).netloc) as http:
+      headers, content = http.request(
+          uri=uri, method='POST', headers=headers, body=data)
 
     if headers['status'] != '200':
-      raise Exception('Request failed. Error was: %s' % content)
+      raise exceptions.make_request_error(int(headers['status']), content,
+                                          method=method)
 
     return content
 
   def _rpc(self, dataset_id, method, request_pb, response_pb_cls):
-    response = self._request(dataset_id=dataset_id, method=method,
-                             data=request_pb.SerializeToString())
+    # Requests can be put together from pre-serialized pieces
+    # (see lookup and run_query_batch), in which case they're already bytes.
+    if isinstance(request_pb, str):
+      data = request_pb
+    else:
+      data = request_pb.SerializeToString()
+    request = lambda: self._request(dataset_id=dataset_id, method=method,
+                                    data=data)
+
+    retry_policy = self._get_retry_policy(method, request_pb)
+    if retry_policy:
+      response = retry_policy.call(request)
+    else:
+      response = request()
+
     return response_pb_cls.FromString(response)
 
+  def _get_retry_policy(self, method, request_pb):
+    """Get the policy for retrying a request, if it should be retried.
+
+    :type method: string
+    :param method: The API call method name.
+
+    :type request_pb: protobuf
+    :param request_pb: The request being sent.
+
+    :rtype: :class:`gclouddatastore.retry.RetryPolicy` or None
+    :returns: The policy to retry the request with,
+              or ``None`` if it shouldn't be retried.
+    """
+    if isinstance(self._retry_policy, dict):
+      return self._retry_policy.get(method)
+
+    if method in self.IDEMPOTENT_METHODS:
+      return self._retry_policy
+
+    # Upserts and deletes outside of a transaction can safely be repeated,
+    # however inserts (and especially insert_auto_id) can't.
+    if (method == 'commit' and
+        request_pb.mode == datastore_pb.CommitRequest.NON_TRANSACTIONAL and
+        not request_pb.mutation.insert and
+        not request_pb.mutation.insert_auto_id):
+      return self._retry_policy
+
   @classmethod
   def build_api_url(cls, dataset_id, method, base_url=None, api_version=None):
     """Construct the URL for a particular API call.
@@ -113,12 +342,42 @@ class Connection(object):
         dataset_id=dataset_id, method=method)
 
   def transaction(self, transaction=_EMPTY):
+    """Get or set the current thread's transaction.
+
+    :type transaction: :class:`gclouddatastore.transaction.Transaction`
+    :param transaction: The transaction to make current on this thread
+                        (or ``None`` to end it).
+
+    :returns: Either the current transaction or the :class:`Connection`.
+    """
     if transaction is self._EMPTY:
-      return self._current_transaction
+      return getattr(self._local, 'transaction', None)
     else:
-      self._current_transaction = transaction
+      self._local.transaction = transaction
       return self
 
+  def _encode_read_options(self, field_number):
+    """Encode the read options for the current transaction as a field.
+
+    Reads inside a transaction have to name it,
+    so that the datastore reads a consistent snapshot
+    and can detect conflicting writes when it's committed.
+
+    :type field_number: integer
+    :param field_number: The number of the ``read_options`` field
+                         in the request being built.
+
+    :rtype: string
+    :returns: The encoded field,
+              or an empty string if there's no transaction in progress.
+    """
+    transaction = self.transaction()
+    if not transaction or not transaction.id():
+      return ''
+    read_options = datastore_pb.ReadOptions(transaction=transaction.id())
+    return helpers.encode_bytes_field(field_number,
+                                      read_options.SerializeToString())
+
   def mutation(self):
     if self.transaction():
       return self.transaction().mutation()
@@ -218,16 +477,61 @@ class Connection(object):
     :type namespace: string
     :param namespace: The namespace over which to run the query.
     """
-    request = datastore_pb.RunQueryRequest()
+    batch = self.run_query_batch(dataset_id, query_pb, namespace=namespace)
+    return [e.entity for e in batch.entity_result]
+
+  def run_query_batch(self, dataset_id, query_pb, namespace=None):
+    """Run a query and return the raw batch of results.
+
+    This is the same ``runQuery`` request as :func:`run_query`,
+    however rather than just the entity protobufs
+    it returns the whole
+    :class:`gclouddatastore.datastore_v1_pb2.QueryResultBatch`,
+    which holds the ``end_cursor`` and ``more_results`` values
+    needed to page through large result sets.
+
+    You typically wouldn't use this method directly,
+    in favor of iterating over a :class:`gclouddatastore.query.Query`.
+
+    :type dataset_id: string
+    :param dataset_id: The ID of the dataset over which to run the query.
+
+    :type query_pb: :class:`gclouddatastore.datastore_v1_pb2.Query`
+                    (or a serialized Query)
+    :param query_pb: The Protobuf representing the query to run.
+                     If it's already serialized,
+                     it's added to the request as it is.
+
+    :type namespace: string
+    :param namespace: The namespace over which to run the query.
+
+    :rtype: :class:`gclouddatastore.datastore_v1_pb2.QueryResultBatch`
+    :returns: The batch of results returned by the API.
+    """
+    read_options = self._encode_read_options(
+        self._RUN_QUERY_READ_OPTIONS_FIELD)
+
+    if isinstance(query_pb, str):
+      request = read_options + helpers.encode_bytes_field(
+          self._RUN_QUERY_QUERY_FIELD, query_pb)
+      if namespace:
+        partition_id = datastore_pb.PartitionId(namespace=namespace)
+        request = helpers.encode_bytes_field(
+            self._RUN_QUERY_PARTITION_ID_FIELD,
+            partition_id.SerializeToString()) + request
+    else:
+      request = datastore_pb.RunQueryRequest()
+      request.MergeFromString(read_options)
 
-    if namespace:
-      request.partition_id.namespace = namespace
+      if namespace:
+        request.partition_id.namespace = namespace
+
+      request.query.CopyFrom(query_pb)
 
-    request.query.CopyFrom(query_pb)
     response = self._rpc(dataset_id, 'runQuery', request, datastore_pb.RunQueryResponse)
-    return [e.entity for e in response.batch.entity_result]
+    return response.batch
 
-  def lookup(self, dataset_id, key_pbs):
+  def lookup(self, dataset_id, key_pbs, aligned=False):
     """Lookup keys from a dataset in the Cloud Datastore.
 
     This method deals only with protobufs
@@ -253,12 +557,28 @@ class Connection(object):
     >>> connection.lookup('dataset-id', key.to_protobuf())
     <Entity protobuf>
 
+    Large numbers of keys are split into several requests
+    (see ``MAX_LOOKUP_KEYS`` and ``MAX_REQUEST_BYTES``)
+    which are sent concurrently using the worker threads.
+    Either way, the entities are returned
+    in the same order as the keys provided.
+    Any keys that the datastore defers
+    (rather than looking them up right away)
+    are asked for again automatically.
+    Inside a transaction, the keys are read as part of it.
+
     :type dataset_id: string
     :param dataset_id: The dataset to look up the keys.
 
     :type key_pbs: list of :class:`gclouddatastore.datastore_v1_pb2.Key`
                    (or a single Key)
     :param key_pbs: The key (or keys) to retrieve from the datastore.
+                    These can also be :class:`gclouddatastore.key.Key`
+                    objects, which only serialize themselves once.
+
+    :type aligned: bool
+    :param aligned: If True, return exactly one result per key provided,
+                    with ``None`` in place of any entity that doesn't exist.
 
     :rtype: list of :class:`gclouddatastore.datastore_v1_pb2.Entity`
             (or a single Entity)
@@ -266,22 +586,55 @@ class Connection(object):
               If a single key was provided and no results matched,
               this will return None.
               If multiple keys were provided and no results matched,
-              this will return an empty list.
+              this will return an empty list
+              (or a list of ``None`` values if ``aligned`` is True).
     """
-    lookup_request = datastore_pb.LookupRequest()
-
-    single_key = isinstance(key_pbs, datastore_pb.Key)
+    single_key = isinstance(key_pbs, (datastore_pb.Key, Key))
 
     if single_key:
       key_pbs = [key_pbs]
 
+    # Each key is serialized just once, as a field of the LookupRequest,
+    # and the requests are put together by joining those fields.
+    def encode(key):
+      if isinstance(key, Key):
+        serialized = key.to_protobuf_string()
+      else:
+        serialized = key.SerializeToString()
+      return helpers.encode_bytes_field(self._LOOKUP_KEY_FIELD, serialized)
+
+    fields = [encode(key) for key in key_pbs]
+    key_pbs = [key.to_protobuf() if isinstance(key, Key) else key
+               for key in key_pbs]
+
+    read_options = self._encode_read_options(self._LOOKUP_READ_OPTIONS_FIELD)
+
+    def lookup_chunk(chunk):
+      entity_pbs = []
+      while chunk:
+        lookup_response = self._rpc(dataset_id, 'lookup',
+                                    read_options + ''.join(chunk),
+                                    datastore_pb.LookupResponse)
+        entity_pbs.extend(result.entity for result in lookup_response.found)
+
+        # Deferred keys weren't looked up this time, so ask again.
+        chunk = [encode(key_pb) for key_pb in lookup_response.deferred]
+      return entity_pbs
+
+    found = {}
+    chunks = self._chunk(fields, self.MAX_LOOKUP_KEYS)
+    for entity_pbs in self._map(lookup_chunk, chunks):
+      for entity_pb in entity_pbs:
+        found[helpers.get_key_identity(entity_pb.key)] = entity_pb
+
+    # The order of the results isn't defined, so line them up with the keys.
+    results = []
     for key_pb in key_pbs:
-      lookup_request.key.add().CopyFrom(key_pb)
-
-    lookup_response = self._rpc(dataset_id, 'lookup', lookup_request,
-                                datastore_pb.LookupResponse)
-
-    results = [result.entity for result in lookup_response.found]
+      identity = helpers.get_key_identity(key_pb)
+      if identity in found:
+        results.append(found[identity])
+      elif aligned:
+        results.append(None)
 
     if single_key:
       if results:
@@ -291,6 +644,39 @@ class Connection(object):
 
     return results
 
+  def _chunk(self, items, max_items, get_size=len):
+    """Split a list of items into chunks small enough for a single request.
+
+    :type items: list
+    :param items: The items (like encoded request fields) to split up.
+
+    :type max_items: integer
+    :param max_items: The maximum number of items in each chunk.
+
+    :type get_size: callable
+    :param get_size: A function getting the number of bytes
+                     an item adds to a request.
+
+    :rtype: list of lists
+    :returns: The items, in order, split into chunks.
+    """
+    chunks = []
+    chunk, chunk_bytes = [], 0
+
+    for item in items:
+      item_bytes = get_size(item)
+      if chunk and (len(chunk) >= max_items or
+                    chunk_bytes + item_bytes > self.MAX_REQUEST_BYTES):
+        chunks.append(chunk)
+        chunk, chunk_bytes = [], 0
+
+      chunk.append(item)
+      chunk_bytes += item_bytes
+
+    if chunk:
+      chunks.append(chunk)
+    return chunks
+
   def commit(self, dataset_id, mutation_pb):
     request = datastore_pb.CommitRequest()
 
@@ -320,27 +706,7 @@ class Connection(object):
     # TODO: Is this the right method name?
     # TODO: How do you delete properties? Set them to None?
     mutation = self.mutation()
-
-    # If the Key is complete, we should upsert
-    # instead of using insert_auto_id.
-    path = key_pb.path_element[-1]
-    auto_id = not (path.HasField('id') or path.HasField('name'))
-
-    if auto_id:
-      insert = mutation.insert_auto_id.add()
-    else:
-      insert = mutation.upsert.add()
-
-    insert.key.CopyFrom(key_pb)
-
-    for name, value in properties.iteritems():
-      prop = insert.property.add()
-      # Set the name of the property.
-      prop.name = name
-
-      # Set the appropriate value.
-      pb_attr, pb_value = helpers.get_protobuf_attribute_and_value(value)
-      setattr(prop.value, pb_attr, pb_value)
+    self._add_entity_to_mutation(mutation, key_pb, properties)
 
     # If this is in a transaction, we should just return True. The transaction
     # will handle assigning any keys as necessary.
@@ -349,11 +715,106 @@ class Connection(object):
 
     result = self.commit(dataset_id, mutation)
     # If this was an auto-assigned ID, return the new Key.
-    if auto_id:
+    if _needs_auto_id(key_pb):
       return result.insert_auto_id_key[0]
 
     return True
 
+  def save_entities(self, dataset_id, entities):
+    """Save many entities to the Cloud Datastore at once.
+
+    Rather than committing each entity on its own,
+    the entities are packed into as few mutations as possible
+    (see ``MAX_MUTATIONS`` and ``MAX_REQUEST_BYTES``)
+    and those are committed concurrently using the worker threads.
+
+    Inside a transaction,
+    the entities are just added to the transaction's mutation.
+
+    :type dataset_id: string
+    :param dataset_id: The dataset in which to save the entities.
+
+    :type entities: list of tuples
+    :param entities: A ``(key_pb, properties)`` tuple for each entity,
+                     as would be passed to :func:`save_entity`.
+
+    :rtype: list
+    :returns: One result per entity:
+              the newly allocated :class:`gclouddatastore.datastore_v1_pb2.Key`
+              if the entity needed an automatically assigned ID,
+              otherwise True.
+
+    :raises: :class:`gclouddatastore.exceptions.PartialFailureError`
+             if some of the mutations were committed but others failed.
+             If none of them were committed, the first error is raised.
+    """
+    results = [True] * len(entities)
+
+    if self.transaction():
+      for key_pb, properties in entities:
+        self._add_entity_to_mutation(self.mutation(), key_pb, properties)
+      return results
+
+    # Each batch is a mutation, the indexes of the entities in it
+    # and the indexes of those entities needing IDs.
+    batches = []
+    mutation, mutation_count, mutation_bytes = None, 0, 0
+
+    for index, (key_pb, properties) in enumerate(entities):
+      if (not mutation or mutation_count >= self.MAX_MUTATIONS or
+          mutation_bytes >= self.MAX_REQUEST_BYTES):
+        mutation, mutation_count, mutation_bytes = datastore_pb.Mutation(), 0, 0
+        batches.append((mutation, [], []))
+
+      entity_pb = self._add_entity_to_mutation(mutation, key_pb, properties)
+      mutation_count += 1
+      mutation_bytes += entity_pb.ByteSize() + 4
+
+      batches[-1][1].append(index)
+      if _needs_auto_id(key_pb):
+        batches[-1][2].append(index)
+
+    commit = lambda batch: self.commit(dataset_id, batch[0])
+    outcomes = self._map(commit, batches, return_exceptions=True)
+
+    errors = {}
+    for (_, indexes, auto_id_indexes), outcome in zip(batches, outcomes):
+      if isinstance(outcome, Exception):
+        for index in indexes:
+          results[index] = None
+          errors[index] = outcome
+      else:
+        for index, key_pb in zip(auto_id_indexes, outcome.insert_auto_id_key):
+          results[index] = key_pb
+
+    _raise_batch_errors(results, errors)
+    return results
+
+  def _add_entity_to_mutation(self, mutation, key_pb, properties):
+    """Add an entity to be saved to a mutation.
+
+    :type mutation: :class:`gclouddatastore.datastore_v1_pb2.Mutation`
+    :param mutation: The mutation to add the entity to.
+
+    :type key_pb: :class:`gclouddatastore.datastore_v1_pb2.Key`
+    :param key_pb: The complete or partial key for the entity.
+
+    :type properties: dict
+    :param properties: The properties to store on the entity.
+
+    :rtype: :class:`gclouddatastore.datastore_v1_pb2.Entity`
+    :returns: The entity protobuf added to the mutation.
+    """
+    # If the Key is complete, we should upsert
+    # instead of using insert_auto_id.
+    if _needs_auto_id(key_pb):
+      insert = mutation.insert_auto_id.add()
+    else:
+      insert = mutation.upsert.add()
+
+    helpers.set_entity_protobuf(insert, key_pb, properties)
+    return insert
+
   def delete_entities(self, dataset_id, key_pbs):
     """Delete keys from a dataset in the Cloud Datastore.
 
@@ -363,26 +824,155 @@ class Connection(object):
     For example, it's used under the hood in the
     :func:`gclouddatastore.entity.Entity.delete` method.
 
+    Outside of a transaction,
+    large numbers of keys are split into several mutations
+    which are committed concurrently.
+
     :type dataset_id: string
     :param dataset_id: The dataset from which to delete the keys.
 
     :type key_pbs: list of :class:`gclouddatastore.datastore_v1_pb2.Key`
                    (or a single Key)
     :param key_pbs: The key (or keys) to delete from the datastore.
-    """
-    mutation = self.mutation()
 
-    for key_pb in key_pbs:
-      delete = mutation.delete.add()
-      delete.CopyFrom(key_pb)
+    :rtype: bool
+    :returns: True once the keys are deleted
+              (or added to the current transaction's mutation).
 
-    # TODO: Make this return value be a True/False (or something more useful).
+    :raises: :class:`gclouddatastore.exceptions.PartialFailureError`
+             if some of the mutations were committed but others failed.
+             If none of them were committed, the first error is raised.
+    """
     if self.transaction():
+      self.mutation().delete.extend(key_pbs)
       return True
-    else:
+
+    def delete_chunk(chunk):
+      mutation = datastore_pb.Mutation()
+      mutation.delete.extend(chunk)
       return self.commit(dataset_id, mutation)
 
+    # Each key also needs a tag and a length prefix.
+    chunks = self._chunk(key_pbs, self.MAX_MUTATIONS,
+                         get_size=lambda key_pb: key_pb.ByteSize() + 4)
+    outcomes = self._map(delete_chunk, chunks, return_exceptions=True)
+
+    results, errors = [], {}
+    for chunk, outcome in zip(chunks, outcomes):
+      for key_pb in chunk:
+        if isinstance(outcome, Exception):
+          errors[len(results)] = outcome
+          results.append(None)
+        else:
+          results.append(True)
+
+    _raise_batch_errors(results, errors)
+    return True
+
   def delete_entity(self, dataset_id, key_pb):
     # TODO: Is this the right way to handle deleting
     #       (single and multiple as separate methods)?
     return self.delete_entities(dataset_id, [key_pb])
+
+
+def _needs_auto_id(key_pb):
+  """Whether a Key protobuf is partial (has no ID or name).
+
+  Partial keys need to be inserted with ``insert_auto_id``
+  so that the datastore assigns them an ID.
+  """
+  element = key_pb.path_element[-1]
+  return not (element.HasField('id') or element.HasField('name'))
+
+
+def _raise_batch_errors(results, errors):
+  """Raise the right error if any of the requests in a bulk operation failed.
+
+  :type results: list
+  :param results: One result per item, with ``None`` for failed items.
+
+  :type errors: dict
+  :param errors: A mapping of the index of each failed item
+                 to the exception raised for it.
+  """
+  if not errors:
+    return
+  if len(errors) < len(results):
+    raise exceptions.PartialFailureError(results, errors)
+  # Nothing was committed, so the whole operation can just be retried.
+  raise errors[0]
+
+
+class AsyncConnection(Connection):
+  """A connection with non-blocking versions of each of the RPCs.
+
+  Each ``*_async`` method sends its request from one of the connection's
+  worker threads (see :func:`Connection.submit`)
+  and immediately returns a handle on the result,
+  so a single thread can keep many requests in flight at once::
+
+    >>> connection = AsyncConnection(credentials=credentials, max_workers=50)
+    >>> results = [connection.lookup_async('dataset-id', key_pb)
+    ...            for key_pb in key_pbs]
+    >>> entity_pbs = [result.get() for result in results]
+
+  The blocking methods are still available,
+  so this can be used anywhere a :class:`Connection` can.
+
+  Higher level calls can be run in the background too,
+  using :func:`gclouddatastore.dataset.Dataset.get_entities_async`,
+  :func:`gclouddatastore.query.Query.fetch_async`
+  and :func:`gclouddatastore.entity.Entity.save_async`.
+  """
+
+  def begin_transaction_async(self, dataset_id, serializable=False):
+    """Begin a transaction in the background.
+
+    See :func:`Connection.begin_transaction`.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the ID of the new transaction.
+    """
+    return self.submit(self.begin_transaction, dataset_id,
+                       serializable=serializable)
+
+  def rollback_transaction_async(self, dataset_id, transaction_id):
+    """Roll back a transaction in the background.
+
+    See :func:`Connection.rollback_transaction`.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle to wait on the rollback with.
+    """
+    return self.submit(self.rollback_transaction, dataset_id, transaction_id)
+
+  def run_query_async(self, dataset_id, query_pb, namespace=None):
+    """Run a query in the background.
+
+    See :func:`Connection.run_query`.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the list of entity protobufs.
+    """
+    return self.submit(self.run_query, dataset_id, query_pb,
+                       namespace=namespace)
+
+  def lookup_async(self, dataset_id, key_pbs, aligned=False):
+    """Look up keys in the background.
+
+    See :func:`Connection.lookup`.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the entity protobuf(s) found.
+    """
+    return self.submit(self.lookup, dataset_id, key_pbs, aligned=aligned)
+
+  def commit_async(self, dataset_id, mutation_pb):
+    """Commit a mutation in the background.
+
+    See :func:`Connection.commit`.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the mutation result protobuf.
+    """
+    return self.submit(self.commit, dataset_id, mutation_pb)
@@ -1,3 +1,11 @@
+import threading
+
+from gclouddatastore import exceptions
+
+# The sessions active on each thread (by dataset).
+_sessions = threading.local()
+
+
 class Dataset(object):
   """A dataset in the Cloud Datastore.
 
@@ -25,11 +33,22 @@ class Dataset(object):
 
   :type connection: :class:`gclouddatastore.connection.Connection`
   :param connection: The connection to use for executing API calls.
+
+  :type cache: :class:`gclouddatastore.cache.Cache`
+  :param cache: An optional cache to check before looking up entities
+                (see :mod:`gclouddatastore.cache`).
+
+  :type lazy: bool
+  :param lazy: If True, lookups and queries return
+               :class:`gclouddatastore.entity.LazyEntity` objects,
+               which only decode the properties that are used.
   """
 
-  def __init__(self, id, connection=None):
+  def __init__(self, id, connection=None, cache=None, lazy=False):
     self._connection = connection
     self._id = id
+    self._cache = cache
+    self._lazy = lazy
 
   def connection(self):
     """Get the current connection.
@@ -57,6 +76,66 @@ class Dataset(object):
 
     return self._id
 
+  def cache(self):
+    """Get the entity cache used by this dataset.
+
+    :rtype: :class:`gclouddatastore.cache.Cache`
+    :returns: The cache, or ``None`` if entities aren't being cached.
+    """
+
+    return self._cache
+
+  def _use_cache(self):
+    """Whether the cache should be used right now.
+
+    Reads inside a transaction must go to the datastore,
+    so the cache is bypassed whenever there is one in progress.
+    """
+    return self._cache is not None and not self.connection().transaction()
+
+  def _entity_from_protobuf(self, entity_pb):
+    """Build an entity in this dataset from a protobuf.
+
+    :type entity_pb: :class:`gclouddatastore.datastore_v1_pb2.Entity`
+    :param entity_pb: The protobuf representing the entity.
+
+    :rtype: :class:`gclouddatastore.entity.Entity`
+    :returns: The entity (a lazy one, if the dataset is lazy).
+    """
+    # This import is here to avoid circular references.
+    from gclouddatastore.entity import Entity
+    from gclouddatastore.entity import LazyEntity
+
+    if self._lazy:
+      return LazyEntity.from_protobuf(entity_pb, dataset=self)
+    return Entity.from_protobuf(entity_pb, dataset=self)
+
+  def _session(self):
+    """Get the session active on the current thread, if any."""
+    return getattr(_sessions, 'by_dataset', {}).get(self)
+
+  def _set_session(self, session):
+    """Set (or clear) the session active on the current thread."""
+    by_dataset = _sessions.__dict__.setdefault('by_dataset', {})
+    if session is None:
+      by_dataset.pop(self, None)
+    else:
+      by_dataset[self] = session
+
+  def _uncache_key_pbs(self, key_pbs):
+    """Remove entities which have been written from the cache and session.
+
+    Written entities aren't put back in the cache,
+    which is only ever filled by lookups
+    (see :func:`gclouddatastore.cache.Cache.delete_key_pbs`).
+    """
+    session = self._session()
+    if session is not None:
+      session.forget(key_pbs)
+
+    if self._cache is not None:
+      self._cache.delete_key_pbs(key_pbs)
+
   def query(self, *args, **kwargs):
     from gclouddatastore.query import Query
     kwargs['dataset'] = self
@@ -66,6 +145,44 @@ class Dataset(object):
     from gclouddatastore.entity import Entity
     return Entity(dataset=self, kind=kind)
 
+  def batcher(self, *args, **kwargs):
+    """Factory method for Batcher objects.
+
+    A :class:`gclouddatastore.batcher.Batcher`
+    buffers saves and deletes
+    and commits them in batches in the background::
+
+      >>> with dataset.batcher() as batcher:
+      ...   future = batcher.save(entity)
+      >>> future.result()
+      <Entity object>
+
+    :param args: All args and kwargs will be passed along to the
+                 :class:`gclouddatastore.batcher.Batcher` initializer.
+
+    :rtype: :class:`gclouddatastore.batcher.Batcher`
+    :returns: A batcher writing to this dataset.
+    """
+    from gclouddatastore.batcher import Batcher
+    return Batcher(self, *args, **kwargs)
+
+  def session(self):
+    """Factory method for Session objects.
+
+    Inside a :class:`gclouddatastore.session.Session`,
+    each key is looked up at most once
+    and always gives back the same entity::
+
+      >>> with dataset.session():
+      ...   dataset.get_entity(key) is dataset.get_entity(key)
+      True
+
+    :rtype: :class:`gclouddatastore.session.Session`
+    :returns: A session for this dataset, to be used in a ``with`` block.
+    """
+    from gclouddatastore.session import Session
+    return Session(self)
+
   def transaction(self, *args, **kwargs):
     from gclouddatastore.transaction import Transaction
     kwargs['dataset'] = self
@@ -85,14 +202,168 @@ class Dataset(object):
     if entities:
       return entities[0]
 
-  def get_entities(self, keys):
-    # This import is here to avoid circular references.
-    from gclouddatastore.entity import Entity
+  def get_entities(self, keys, aligned=False):
+    """
+    Retrieves entities from the dataset, in the same order as the keys.
+
+      >>> dataset.get_entities([key1, key2, key3], aligned=True)
+      [<Entity object>, None, <Entity object>]
+
+    If the dataset has a cache,
+    only the keys not found in the cache are looked up
+    (and the entities found are added to the cache).
+    Inside a :func:`session`,
+    keys already looked up in the session aren't looked up again.
+
+    :type keys: list of :class:`gclouddatastore.key.Key`
+    :param keys: The keys of the entities to retrieve.
+
+    :type aligned: bool
+    :param aligned: If True, return one result per key,
+                    with ``None`` for any entity that doesn't exist.
+                    Otherwise missing entities are left out.
+
+    :rtype: list of :class:`gclouddatastore.entity.Entity`
+    :return: The entities found.
+    """
+    session = self._session()
+    if session is not None and not self.connection().transaction():
+      entities = session.get_entities(keys)
+    else:
+      entities = self._lookup_entities(keys)
+
+    if not aligned:
+      entities = [e for e in entities if e is not None]
+    return entities
+
+  def _lookup_entities(self, keys):
+    """Look up entities, using the cache if there is one.
 
-    entity_pbs = self.connection().lookup(dataset_id=self.id(),
-        key_pbs=[k.to_protobuf() for k in keys])
+    :type keys: list of :class:`gclouddatastore.key.Key`
+    :param keys: The keys of the entities to look up.
+
+    :rtype: list of :class:`gclouddatastore.entity.Entity`
+    :returns: One result per key,
+              with ``None`` for any entity that doesn't exist.
+    """
+    if self._use_cache():
+      entity_pbs = self._cache.get_entity_pbs([k.to_protobuf() for k in keys])
+      missing = [i for i, entity_pb in enumerate(entity_pbs) if entity_pb is None]
+
+      if missing:
+        found = self.connection().lookup(
+            dataset_id=self.id(), key_pbs=[keys[i] for i in missing],
+            aligned=True)
+        for index, entity_pb in zip(missing, found):
+          entity_pbs[index] = entity_pb
+        self._cache.add_entity_pbs([pb for pb in found if pb is not None])
+    else:
+      entity_pbs = self.connection().lookup(dataset_id=self.id(),
+          key_pbs=keys, aligned=True)
 
     entities = []
     for entity_pb in entity_pbs:
-      entities.append(Entity.from_protobuf(entity_pb, dataset=self))
+      if entity_pb is None:
+        entities.append(None)
+      else:
+        entities.append(self._entity_from_protobuf(entity_pb))
     return entities
+
+  def put_entities(self, entities):
+    """Saves many entities at once.
+
+    This is the bulk version of :func:`gclouddatastore.entity.Entity.save`.
+    Rather than one ``commit`` request per entity,
+    the entities are packed into as few requests as possible
+    (which are then sent concurrently).
+    Any entities with partial keys
+    have their keys updated with the IDs assigned to them.
+
+      >>> entities = []
+      >>> for n in range(1000):
+      ...   entity = dataset.entity('Thing')
+      ...   entity['n'] = n
+      ...   entities.append(entity)
+      >>> dataset.put_entities(entities)
+      [<Entity object>, <Entity object>, ...]
+
+    :type entities: list of :class:`gclouddatastore.entity.Entity`
+    :param entities: The entities to save.
+
+    If only some of the requests succeed,
+    the entities they saved still have their keys updated
+    before the :class:`gclouddatastore.exceptions.PartialFailureError`
+    is raised.
+
+    :rtype: list of :class:`gclouddatastore.entity.Entity`
+    :returns: The entities, with possibly updated keys.
+    """
+    # This import is here to avoid circular references.
+    from gclouddatastore.key import Key
+
+    connection = self.connection()
+    key_pbs = [e.key().to_protobuf() for e in entities]
+    # Entities with partial keys are new, so can't have been cached.
+    written_key_pbs = [key_pb for entity, key_pb in zip(entities, key_pbs)
+                       if not entity.key().is_partial()]
+
+    try:
+      results, error = connection.save_entities(
+          dataset_id=self.id(),
+          entities=[(key_pb, dict(e.iteritems()))
+                    for e, key_pb in zip(entities, key_pbs)]), None
+    except exceptions.PartialFailureError as e:
+      results, error = e.results, e
+
+    # If we are in a transaction, the entities needing automatically
+    # assigned IDs get them when the transaction is committed.
+    transaction = connection.transaction()
+
+    for entity, result in zip(entities, results):
+      if transaction and entity.key().is_partial():
+        transaction.add_auto_id_entity(entity)
+
+      if result is not None and not isinstance(result, bool):
+        entity.key(entity.key().path(Key.from_protobuf(result).path()))
+
+    # Even the failed requests might have been applied.
+    self._uncache_key_pbs(written_key_pbs)
+
+    if error:
+      raise error
+    return entities
+
+  def delete_entities(self, keys):
+    """Deletes many entities at once.
+
+    :type keys: list of :class:`gclouddatastore.key.Key`
+    :param keys: The keys of the entities to delete.
+    """
+    key_pbs = [k.to_protobuf() for k in keys]
+    try:
+      self.connection().delete_entities(dataset_id=self.id(), key_pbs=key_pbs)
+    finally:
+      # Some of the keys may have been deleted even if others weren't.
+      self._uncache_key_pbs(key_pbs)
+
+  def get_entities_async(self, keys, aligned=False):
+    """Retrieves entities from the dataset in the background.
+
+    This runs :func:`get_entities` on one of the connection's worker threads
+    (see :func:`gclouddatastore.connection.Connection.submit`).
+
+      >>> result = dataset.get_entities_async(keys)
+      >>> do_other_work()
+      >>> entities = result.get()
+
+    :type keys: list of :class:`gclouddatastore.key.Key`
+    :param keys: The keys of the entities to retrieve.
+
+    :type aligned: bool
+    :param aligned: If True, return one result per key,
+                    with ``None`` for any entity that doesn't exist.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the list of entities.
+    """
+    return self.connection().submit(self.get_entities, keys, aligned=aligned)
@@ -0,0 +1,777 @@
+"""An in-memory stand-in for the Cloud Datastore.
+
+An :class:`InMemoryConnection` answers the same protobuf requests
+as the Cloud Datastore API
+(lookups, queries, commits and transactions)
+from an :class:`InMemoryDatastore` in the same process,
+so code using the datastore can be tested and benchmarked
+without a network connection::
+
+  >>> connection = InMemoryConnection()
+  >>> dataset = connection.dataset('dataset-id')
+  >>> entity = dataset.entity('Person')
+  >>> entity['name'] = 'JJ'
+  >>> entity = entity.save()
+  >>> dataset.query('Person').filter('name =', 'JJ').fetch()
+  [<Entity object>]
+
+Requests are still serialized and parsed,
+so everything above the HTTP transport
+(chunking, retries, paging through cursors and so on)
+works just as it would against the real API.
+"""
+
+import ast
+import bisect
+import itertools
+import operator
+import threading
+
+from google.protobuf.message import DecodeError
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore import exceptions
+from gclouddatastore import helpers
+from gclouddatastore.connection import Connection
+
+
+_KEY_PROPERTY = '__key__'
+
+_COMPARISONS = {
+    datastore_pb.PropertyFilter.LESS_THAN: operator.lt,
+    datastore_pb.PropertyFilter.LESS_THAN_OR_EQUAL: operator.le,
+    datastore_pb.PropertyFilter.GREATER_THAN: operator.gt,
+    datastore_pb.PropertyFilter.GREATER_THAN_OR_EQUAL: operator.ge,
+    datastore_pb.PropertyFilter.EQUAL: operator.eq,
+    }
+
+
+class InMemoryDatastore(object):
+  """A datastore held in memory, answering serialized API requests.
+
+  Entities are kept in a dictionary by key,
+  and each kind and property has a sorted index
+  (of values and keys)
+  which queries are answered from.
+  Indexes are only sorted when they're next queried,
+  so loading lots of entities doesn't re-sort them for each one.
+
+  Queries support filters (including ``__key__`` and ancestor filters),
+  sort orders, projections, ``group_by``, offsets, limits and cursors.
+  The results of queries which can't be read straight from an index
+  in key order are sorted once and kept until the next write,
+  so paging through them with cursors stays fast.
+
+  Transactions are checked for conflicts when they're committed:
+  if any entity looked up in the transaction
+  has been written since,
+  the commit fails with a
+  :class:`gclouddatastore.exceptions.TransientError`
+  (as it would under contention in the Cloud Datastore).
+
+  The datastore is safe to share between threads
+  (and between connections).
+
+  :type batch_size: integer
+  :param batch_size: The most results returned for each ``runQuery`` request.
+  """
+
+  def __init__(self, batch_size=500):
+    self._batch_size = batch_size
+    self._lock = threading.RLock()
+    self._entities = {}
+    self._versions = {}
+    self._version = 0
+    self._indexes = {}
+    self._next_ids = {}
+    self._transactions = {}
+    self._transaction_ids = itertools.count(1)
+    self._sorted_results = {}
+    self._methods = {
+        'lookup': (datastore_pb.LookupRequest, self._lookup),
+        'runQuery': (datastore_pb.RunQueryRequest, self._run_query),
+        'commit': (datastore_pb.CommitRequest, self._commit),
+        'beginTransaction': (datastore_pb.BeginTransactionRequest,
+                             self._begin_transaction),
+        'rollback': (datastore_pb.RollbackRequest, self._rollback),
+        'allocateIds': (datastore_pb.AllocateIdsRequest, self._allocate_ids),
+        }
+
+  def __len__(self):
+    return len(self._entities)
+
+  def handle(self, dataset_id, method, data):
+    """Answer a request to the API.
+
+    :type dataset_id: string
+    :param dataset_id: The ID of the dataset the request is for.
+
+    :type method: string
+    :param method: The API method called (ie, ``lookup``, ``runQuery``, ...).
+
+    :type data: string
+    :param data: The serialized request protobuf.
+
+    :rtype: string
+    :returns: The serialized response protobuf.
+
+    :raises: :class:`gclouddatastore.exceptions.RequestError`
+             if the request is invalid or can't be carried out.
+    """
+    if method not in self._methods:
+      raise exceptions.make_request_error(404, 'Unknown method: %s' % method,
+                                          method=method)
+
+    request_cls, handler = self._methods[method]
+    try:
+      request = request_cls.FromString(data)
+    except DecodeError:
+      raise exceptions.make_request_error(400, 'Invalid request.',
+                                          method=method)
+
+    if dataset_id.startswith('s~'):
+      dataset_id = dataset_id[2:]
+
+    try:
+      with self._lock:
+        response = handler(dataset_id, request)
+    except exceptions.RequestError as e:
+      e.method = method
+      raise
+
+    return response.SerializeToString()
+
+  def _index(self, index_key):
+    index = self._indexes.get(index_key)
+    if index is None:
+      index = self._indexes[index_key] = _Index()
+    return index
+
+  def _put(self, dataset_id, entity_pb):
+    _check_complete(entity_pb.key)
+    identity = helpers.get_key_identity(entity_pb.key)
+    self._remove(dataset_id, identity)
+
+    stored_pb = datastore_pb.Entity()
+    stored_pb.CopyFrom(entity_pb)
+    self._entities[(dataset_id, identity)] = stored_pb
+    for index_key, entry in _get_index_entries(dataset_id, stored_pb):
+      self._index(index_key).add(entry)
+
+    # Make sure IDs allocated later can't clash with this one.
+    element = entity_pb.key.path_element[-1]
+    if element.HasField('id'):
+      self._next_ids[dataset_id] = max(self._next_ids.get(dataset_id, 1),
+                                       element.id + 1)
+
+    self._touch(dataset_id, identity)
+
+  def _delete(self, dataset_id, key_pb):
+    _check_complete(key_pb)
+    identity = helpers.get_key_identity(key_pb)
+    if self._remove(dataset_id, identity):
+      self._touch(dataset_id, identity)
+
+  def _remove(self, dataset_id, identity):
+    entity_pb = self._entities.pop((dataset_id, identity), None)
+    if entity_pb is None:
+      return False
+
+    for index_key, entry in _get_index_entries(dataset_id, entity_pb):
+      self._indexes[index_key].remove(entry)
+    return True
+
+  def _touch(self, dataset_id, identity):
+    """Record that an entity changed."""
+    self._version += 1
+    self._versions[(dataset_id, identity)] = self._version
+    self._sorted_results.clear()
+
+  def _allocate_id(self, dataset_id, key_pb):
+    if not _is_partial(key_pb):
+      raise _bad_request('Only partial keys can be allocated an ID.')
+
+    allocated_pb = datastore_pb.Key()
+    allocated_pb.CopyFrom(key_pb)
+    allocated_pb.path_element[-1].id = self._next_ids.get(dataset_id, 1)
+    self._next_ids[dataset_id] = allocated_pb.path_element[-1].id + 1
+    return allocated_pb
+
+  def _get_transaction(self, read_options):
+    """Get the versions of entities read in a transaction (if any)."""
+    if not read_options.HasField('transaction'):
+      return None
+
+    read_versions = self._transactions.get(read_options.transaction)
+    if read_versions is None:
+      raise _bad_request('Unknown transaction.')
+    return read_versions
+
+  def _lookup(self, dataset_id, request):
+    read_versions = self._get_transaction(request.read_options)
+    response = datastore_pb.LookupResponse()
+
+    for key_pb in request.key:
+      identity = helpers.get_key_identity(key_pb)
+      if read_versions is not None:
+        read_versions.setdefault(
+            identity, self._versions.get((dataset_id, identity)))
+
+      entity_pb = self._entities.get((dataset_id, identity))
+      if entity_pb is None:
+        response.missing.add().entity.key.CopyFrom(key_pb)
+      else:
+        response.found.add().entity.CopyFrom(entity_pb)
+
+    return response
+
+  def _commit(self, dataset_id, request):
+    mutation = request.mutation
+
+    if request.mode == datastore_pb.CommitRequest.TRANSACTIONAL:
+      read_versions = self._transactions.pop(request.transaction, None)
+      if read_versions is None:
+        raise _bad_request('Unknown transaction.')
+      for identity, version in read_versions.iteritems():
+        if self._versions.get((dataset_id, identity)) != version:
+          raise exceptions.make_request_error(
+              409, 'Too much contention on these datastore entities.')
+
+    # Check everything before changing anything,
+    # so that a failed commit leaves the datastore as it was.
+    for entity_pb in mutation.insert:
+      if (dataset_id, helpers.get_key_identity(entity_pb.key)) in self._entities:
+        raise _bad_request('Entity already exists.')
+    for entity_pb in mutation.update:
+      if (dataset_id,
+          helpers.get_key_identity(entity_pb.key)) not in self._entities:
+        raise _bad_request('Entity to update doesn\'t exist.')
+    for entity_pb in mutation.insert_auto_id:
+      if not _is_partial(entity_pb.key):
+        raise _bad_request('Entities inserted with insert_auto_id '
+                           'must have partial keys.')
+    for entity_pb in itertools.chain(mutation.upsert, mutation.update,
+                                     mutation.insert):
+      _check_complete(entity_pb.key)
+    for key_pb in mutation.delete:
+      _check_complete(key_pb)
+
+    response = datastore_pb.CommitResponse()
+    result = response.mutation_result
+
+    for entity_pb in itertools.chain(mutation.upsert, mutation.update,
+                                     mutation.insert):
+      self._put(dataset_id, entity_pb)
+
+    for entity_pb in mutation.insert_auto_id:
+      inserted_pb = datastore_pb.Entity()
+      inserted_pb.CopyFrom(entity_pb)
+      inserted_pb.key.CopyFrom(self._allocate_id(dataset_id, entity_pb.key))
+      self._put(dataset_id, inserted_pb)
+      result.insert_auto_id_key.add().CopyFrom(inserted_pb.key)
+
+    for key_pb in mutation.delete:
+      self._delete(dataset_id, key_pb)
+
+    result.index_updates = (len(mutation.upsert) + len(mutation.update) +
+                            len(mutation.insert) +
+                            len(mutation.insert_auto_id) + len(mutation.delete))
+    return response
+
+  def _begin_transaction(self, dataset_id, request):
+    transaction_id = str(next(self._transaction_ids))
+    self._transactions[transaction_id] = {}
+    return datastore_pb.BeginTransactionResponse(transaction=transaction_id)
+
+  def _rollback(self, dataset_id, request):
+    if self._transactions.pop(request.transaction, None) is None:
+      raise _bad_request('Unknown transaction.')
+    return datastore_pb.RollbackResponse()
+
+  def _allocate_ids(self, dataset_id, request):
+    response = datastore_pb.AllocateIdsResponse()
+    for key_pb in request.key:
+      response.key.add().CopyFrom(self._allocate_id(dataset_id, key_pb))
+    return response
+
+  def _run_query(self, dataset_id, request):
+    if request.HasField('gql_query'):
+      raise _bad_request('GQL queries are not supported.')
+    self._get_transaction(request.read_options)
+
+    query = _ParsedQuery(request.query)
+    namespace = request.partition_id.namespace
+
+    if query.key_ordered:
+      positions = self._scan_in_key_order(dataset_id, namespace, query)
+    else:
+      positions = self._scan_sorted(dataset_id, namespace, query)
+
+    batch = datastore_pb.QueryResultBatch()
+    batch.entity_result_type = query.result_type
+    batch.end_cursor = request.query.start_cursor
+
+    limit = query.limit or self._batch_size
+    returned = skipped = 0
+    more_results = False
+    # The group of the last entity looked at, which may be before the cursor.
+    group_size = len(query.group_by)
+    previous_group = query.start and query.start[:group_size]
+
+    for position, identity in positions:
+      entity_pb = self._entities[(dataset_id, identity)]
+      if query.end is not None and query.compare(position, query.end) > 0:
+        break
+
+      if query.group_by:
+        group = position[:group_size]
+        if group == previous_group:
+          # Skipped duplicates are behind the cursor too, so the next
+          # page starts after the whole group.
+          batch.end_cursor = repr(position)
+          continue
+
+      if returned >= min(limit, self._batch_size):
+        more_results = True
+        break
+
+      if query.group_by:
+        previous_group = group
+      batch.end_cursor = repr(position)
+      if skipped < query.offset:
+        skipped += 1
+        continue
+
+      query.add_result(batch, entity_pb)
+      returned += 1
+
+    batch.skipped_results = skipped
+    if query.limit and returned >= query.limit:
+      batch.more_results = datastore_pb.QueryResultBatch.MORE_RESULTS_AFTER_LIMIT
+    elif more_results:
+      batch.more_results = datastore_pb.QueryResultBatch.NOT_FINISHED
+    else:
+      batch.more_results = datastore_pb.QueryResultBatch.NO_MORE_RESULTS
+
+    return datastore_pb.RunQueryResponse(batch=batch)
+
+  def _scan_in_key_order(self, dataset_id, namespace, query):
+    """Yield the positions and keys of the results in key order.
+
+    Results are read straight from an index:
+    the range of an equality filter's property index
+    (where every entry has the same value, so they're in key order),
+    or otherwise the index of the kind.
+    """
+    # Start (and stop) scanning at the bounds of any __key__ filters.
+    start, stop = None, None
+    if query.start is not None:
+      start = query.start[-1]
+    for name, operator_enum, ordering in query.filters:
+      if name != _KEY_PROPERTY:
+        continue
+      if operator_enum in (datastore_pb.PropertyFilter.GREATER_THAN,
+                           datastore_pb.PropertyFilter.GREATER_THAN_OR_EQUAL):
+        start = max(start, ordering[1])
+      elif operator_enum in (datastore_pb.PropertyFilter.LESS_THAN,
+                             datastore_pb.PropertyFilter.LESS_THAN_OR_EQUAL):
+        stop = ordering[1] if stop is None else min(stop, ordering[1])
+
+    equality = [(name, ordering) for name, operator_enum, ordering in query.filters
+                if operator_enum == datastore_pb.PropertyFilter.EQUAL and
+                name != _KEY_PROPERTY]
+
+    if equality and query.kind:
+      name, ordering = equality[0]
+      entries = self._index((dataset_id, namespace, query.kind, name)).entries()
+      index = bisect.bisect_left(entries, (ordering, start))
+      identities = (identity for _, identity in
+                    itertools.takewhile(lambda entry: entry[0] == ordering,
+                                        itertools.islice(entries, index, None)))
+    else:
+      entries = self._get_kind_entries(dataset_id, namespace, query.kind)
+      index = bisect.bisect_left(entries, start)
+      identities = itertools.islice(entries, index, None)
+
+    for identity in identities:
+      if stop is not None and identity > stop:
+        break
+      position = (identity,)
+      if query.start is not None and position <= query.start:
+        continue
+      if query.matches(self._entities[(dataset_id, identity)]):
+        yield position, identity
+
+  def _scan_sorted(self, dataset_id, namespace, query):
+    """Yield the positions and keys of the results in the query's order.
+
+    All the results are found and sorted,
+    and kept for any later requests for the same query.
+    """
+    cache_key = (dataset_id, namespace, query.shape)
+    positions = self._sorted_results.get(cache_key)
+
+    if positions is None:
+      positions = []
+      seen = set()
+      for identity in self._get_candidates(dataset_id, namespace, query):
+        if identity in seen:
+          continue
+        seen.add(identity)
+
+        entity_pb = self._entities[(dataset_id, identity)]
+        if query.matches(entity_pb):
+          position = query.get_position(entity_pb)
+          if position is not None:
+            positions.append(position)
+
+      # Sort by each order in turn, from the last to the first,
+      # relying on each sort keeping the order of equal positions.
+      positions.sort(key=operator.itemgetter(-1))
+      for index in reversed(range(len(query.orders))):
+        positions.sort(key=operator.itemgetter(index),
+                       reverse=query.orders[index][1])
+
+      self._sorted_results[cache_key] = positions
+
+    start = 0
+    if query.start is not None:
+      # Find the first position after the cursor.
+      low, high = 0, len(positions)
+      while low < high:
+        middle = (low + high) // 2
+        if query.compare(positions[middle], query.start) <= 0:
+          low = middle + 1
+        else:
+          high = middle
+      start = low
+
+    for position in itertools.islice(positions, start, None):
+      yield position, position[-1]
+
+  def _get_candidates(self, dataset_id, namespace, query):
+    """Get the keys of entities which might match a query."""
+    for name, operator_enum, ordering in query.filters:
+      if (name != _KEY_PROPERTY and query.kind and
+          operator_enum == datastore_pb.PropertyFilter.EQUAL):
+        entries = self._index((dataset_id, namespace, query.kind, name)).entries()
+        index = bisect.bisect_left(entries, (ordering,))
+        return [identity for _, identity in
+                itertools.takewhile(lambda entry: entry[0] == ordering,
+                                    itertools.islice(entries, index, None))]
+
+    return self._get_kind_entries(dataset_id, namespace, query.kind)
+
+  def _get_kind_entries(self, dataset_id, namespace, kind):
+    if kind:
+      return self._index((dataset_id, namespace, kind)).entries()
+
+    # Kindless queries cover every entity in the namespace.
+    return sorted(identity for entity_dataset_id, identity in self._entities
+                  if entity_dataset_id == dataset_id and
+                  identity[0] == namespace)
+
+
+class _Index(object):
+  """A list of index entries, sorted when it's next read.
+
+  Removed entries are remembered and only dropped
+  when the index is next read.
+  """
+
+  def __init__(self):
+    self._entries = []
+    self._removed = set()
+    self._sorted = True
+
+  def add(self, entry):
+    if entry in self._removed:
+      # The entry was never dropped from the list.
+      self._removed.discard(entry)
+      return
+
+    if self._sorted and self._entries and entry < self._entries[-1]:
+      self._sorted = False
+    self._entries.append(entry)
+
+  def remove(self, entry):
+    self._removed.add(entry)
+
+  def entries(self):
+    if self._removed:
+      self._entries = [entry for entry in self._entries
+                       if entry not in self._removed]
+      self._removed.clear()
+
+    if not self._sorted:
+      self._entries.sort()
+      self._sorted = True
+
+    return self._entries
+
+
+class _ParsedQuery(object):
+  """The parts of a Query protobuf needed to run it."""
+
+  def __init__(self, query_pb):
+    if len(query_pb.kind) > 1:
+      raise _bad_request('Only one kind can be queried at a time.')
+    self.kind = query_pb.kind[0].name if query_pb.kind else None
+
+    self.filters = []
+    if query_pb.HasField('filter'):
+      self._add_filter(query_pb.filter)
+
+    inequalities = set(name for name, operator_enum, _ in self.filters
+                       if operator_enum not in (
+                           datastore_pb.PropertyFilter.EQUAL,
+                           datastore_pb.PropertyFilter.HAS_ANCESTOR))
+    if len(inequalities) > 1:
+      raise _bad_request('Inequality filters are only allowed on one property.')
+
+    self.orders = [(order_pb.property.name,
+                    order_pb.direction == datastore_pb.PropertyOrder.DESCENDING)
+                   for order_pb in query_pb.order]
+
+    # Grouped results are sorted by the grouped properties first,
+    # so each group's entities are next to each other.
+    self.group_by = [property_ref.name for property_ref in query_pb.group_by]
+    if self.group_by:
+      sorted_names = [name for name, _ in self.orders]
+      self.orders = [(name, False) for name in self.group_by
+                     if name not in sorted_names] + self.orders
+      leading = [name for name, _ in self.orders[:len(self.group_by)]]
+      if set(leading) != set(self.group_by):
+        raise _bad_request('The grouped properties must be sorted first.')
+
+    if inequalities:
+      inequality = inequalities.pop()
+      if not self.orders:
+        self.orders = [(inequality, False)]
+      elif self.orders[0][0] != inequality:
+        raise _bad_request('The property with an inequality filter '
+                           'must be sorted first.')
+
+    self.projection = [expression.property.name
+                       for expression in query_pb.projection]
+
+    if self.projection == [_KEY_PROPERTY]:
+      self.result_type = datastore_pb.EntityResult.KEY_ONLY
+    elif self.projection:
+      self.result_type = datastore_pb.EntityResult.PROJECTION
+    else:
+      self.result_type = datastore_pb.EntityResult.FULL
+
+    # Results in key order can be read straight from an index.
+    self.key_ordered = (self.orders in ([], [(_KEY_PROPERTY, False)]) and
+                        not self.group_by)
+    if self.key_ordered:
+      self.orders = []
+
+    self.start = _parse_cursor(query_pb.start_cursor)
+    self.end = _parse_cursor(query_pb.end_cursor)
+    self.offset = query_pb.offset
+    self.limit = query_pb.limit
+
+    # The parts of the query which decide the results and their order.
+    shape_pb = datastore_pb.Query()
+    shape_pb.CopyFrom(query_pb)
+    for field in ('start_cursor', 'end_cursor', 'offset', 'limit'):
+      shape_pb.ClearField(field)
+    self.shape = shape_pb.SerializeToString()
+
+  def _add_filter(self, filter_pb):
+    if filter_pb.HasField('composite_filter'):
+      for sub_filter_pb in filter_pb.composite_filter.filter:
+        self._add_filter(sub_filter_pb)
+    elif filter_pb.HasField('property_filter'):
+      property_filter = filter_pb.property_filter
+      if (property_filter.operator == datastore_pb.PropertyFilter.HAS_ANCESTOR
+          and not property_filter.value.HasField('key_value')):
+        raise _bad_request('Ancestor filters need a key value.')
+      self.filters.append((property_filter.property.name,
+                           property_filter.operator,
+                           helpers.get_value_ordering(property_filter.value)))
+
+  def _get_matching_values(self, entity_pb, name):
+    """Get the values of a property matching all its inequality filters."""
+    values = _get_values(entity_pb, name)
+    for filter_name, operator_enum, ordering in self.filters:
+      if filter_name == name and operator_enum in _COMPARISONS:
+        if operator_enum != datastore_pb.PropertyFilter.EQUAL:
+          compare = _COMPARISONS[operator_enum]
+          values = [value for value in values if compare(value, ordering)]
+    return values
+
+  def matches(self, entity_pb):
+    """Whether an entity matches the query's filters and projection."""
+    for name, operator_enum, ordering in self.filters:
+      if operator_enum == datastore_pb.PropertyFilter.HAS_ANCESTOR:
+        identity = helpers.get_key_identity(entity_pb.key)
+        if identity[:len(ordering[1])] != ordering[1]:
+          return False
+      elif operator_enum == datastore_pb.PropertyFilter.EQUAL:
+        if ordering not in _get_values(entity_pb, name):
+          return False
+      # A single value has to match all the inequality filters.
+      elif not self._get_matching_values(entity_pb, name):
+        return False
+
+    # Only entities with every projected property are returned.
+    for name in self.projection:
+      if name != _KEY_PROPERTY and not _get_values(entity_pb, name):
+        return False
+
+    return True
+
+  def get_position(self, entity_pb):
+    """Get where an entity sorts among the results.
+
+    This is the value of each property sorted by
+    (for lists, the smallest, or largest when sorting in descending order),
+    followed by the key.
+    Entities without a value for each of them aren't results of the query.
+    """
+    position = []
+    for name, descending in self.orders:
+      values = self._get_matching_values(entity_pb, name)
+      if not values:
+        return None
+      position.append(max(values) if descending else min(values))
+    position.append(helpers.get_key_identity(entity_pb.key))
+    return tuple(position)
+
+  def compare(self, position, other):
+    """Compare two positions in the order of the query's results."""
+    for index, (_, descending) in enumerate(self.orders):
+      result = cmp(position[index], other[index])
+      if result:
+        return -result if descending else result
+    return cmp(position[-1], other[-1])
+
+  def add_result(self, batch, entity_pb):
+    result_pb = batch.entity_result.add().entity
+    if self.result_type == datastore_pb.EntityResult.FULL:
+      result_pb.CopyFrom(entity_pb)
+      return
+
+    result_pb.key.CopyFrom(entity_pb.key)
+    for name in self.projection:
+      if name == _KEY_PROPERTY:
+        continue
+      for property_pb in entity_pb.property:
+        if property_pb.name == name:
+          value_pb = property_pb.value
+          result_property = result_pb.property.add()
+          result_property.name = name
+          result_property.value.CopyFrom(
+              value_pb.list_value[0] if value_pb.list_value else value_pb)
+          break
+
+
+def _get_values(entity_pb, name):
+  """Get the orderings of the indexed values of a property of an entity."""
+  if name == _KEY_PROPERTY:
+    return [(6, helpers.get_key_identity(entity_pb.key))]
+
+  for property_pb in entity_pb.property:
+    if property_pb.name == name:
+      return [helpers.get_value_ordering(value_pb)
+              for value_pb in _get_indexed_values(property_pb.value)]
+  return []
+
+
+def _get_indexed_values(value_pb):
+  """Get the values (or a list's values) which are indexed."""
+  if value_pb.list_value:
+    value_pbs = value_pb.list_value
+  else:
+    value_pbs = [value_pb]
+
+  return [v for v in value_pbs
+          if not (v.HasField('indexed') and not v.indexed) and
+          not v.HasField('entity_value')]
+
+
+def _get_index_entries(dataset_id, entity_pb):
+  """Get the index entries for an entity.
+
+  :rtype: list of tuples
+  :returns: ``(index_key, entry)`` pairs:
+            the key alone in the kind's index,
+            and ``(value, key)`` in the index of each property.
+  """
+  identity = helpers.get_key_identity(entity_pb.key)
+  namespace = entity_pb.key.partition_id.namespace
+  kind = entity_pb.key.path_element[-1].kind
+
+  entries = [((dataset_id, namespace, kind), identity)]
+  for property_pb in entity_pb.property:
+    index_key = (dataset_id, namespace, kind, property_pb.name)
+    orderings = set(helpers.get_value_ordering(value_pb)
+                    for value_pb in _get_indexed_values(property_pb.value))
+    entries.extend((index_key, (ordering, identity)) for ordering in orderings)
+  return entries
+
+
+def _parse_cursor(cursor):
+  """Get the position a cursor points to (see :func:`_ParsedQuery.get_position`)."""
+  if not cursor:
+    return None
+
+  try:
+    position = ast.literal_eval(cursor)
+  except (SyntaxError, ValueError):
+    position = None
+  if not isinstance(position, tuple) or not position:
+    raise _bad_request('Invalid cursor.')
+  return position
+
+
+def _is_partial(key_pb):
+  element = key_pb.path_element[-1]
+  return not (element.HasField('id') or element.HasField('name'))
+
+
+def _check_complete(key_pb):
+  if not key_pb.path_element or _is_partial(key_pb):
+    raise _bad_request('Keys must be complete.')
+
+
+def _bad_request(message):
+  return exceptions.make_request_error(400, message)
+
+
+class InMemoryConnection(Connection):
+  """A connection to an :class:`InMemoryDatastore`.
+
+  This can be used anywhere a
+  :class:`gclouddatastore.connection.Connection` can::
+
+    >>> datastore = InMemoryDatastore()
+    >>> dataset = InMemoryConnection(datastore).dataset('dataset-id')
+
+  :type datastore: :class:`InMemoryDatastore`
+  :param datastore: The datastore to send requests to.
+                    If not provided, a new (empty) datastore is created.
+
+  :param kwargs: Any other arguments are passed along to the
+                 :class:`gclouddatastore.connection.Connection` initializer
+                 (ie, ``max_workers`` or ``retry_policy``).
+  """
+
+  def __init__(self, datastore=None, **kwargs):
+    super(InMemoryConnection, self).__init__(**kwargs)
+    if datastore is None:
+      datastore = InMemoryDatastore()
+    self._datastore = datastore
+
+  def datastore(self):
+    """Get the datastore this connection sends requests to.
+
+    :rtype: :class:`InMemoryDatastore`
+    """
+    return self._datastore
+
+  def _request(self, dataset_id, method, data):
+    return self._datastore.handle(dataset_id, method, data)
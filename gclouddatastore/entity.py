@@ -15,6 +15,7 @@ with extras built in that allow you to
 delete or persist the data stored on the entity.
 """
 
+import collections
 from datetime import datetime
 
 from gclouddatastore import datastore_v1_pb2 as datastore_pb
@@ -150,6 +151,20 @@ class Entity(dict):
 
     return entity
 
+  def to_protobuf(self):
+    """Convert the entity to a protobuf.
+
+    :rtype: :class:`gclouddatastore.datastore_v1_pb2.Entity`
+    :returns: The protobuf representing the entity.
+    """
+
+    # This is here to avoid circular imports.
+    from gclouddatastore import helpers
+
+    entity_pb = datastore_pb.Entity()
+    helpers.set_entity_protobuf(entity_pb, self.key().to_protobuf(), self)
+    return entity_pb
+
   def reload(self):
     """Reloads the contents of this entity from the datastore.
 
@@ -164,10 +179,10 @@ class Entity(dict):
     """
 
     # Note that you must have a valid key, otherwise this makes no sense.
-    entity = self.dataset().get_entities(self.key().to_protobuf())
+    entity = self.dataset().get_entity(self.key())
 
     # TODO(jjg): Raise an error if something dumb happens.
-    if entity:
+    if entity is not None:
       self.update(entity)
     return self
 
@@ -179,7 +194,7 @@ class Entity(dict):
     """
     key_pb = self.dataset().connection().save_entity(
         dataset_id=self.dataset().id(), key_pb=self.key().to_protobuf(),
-        properties=dict(self))
+        properties=dict(self.iteritems()))
 
     # If we are in a transaction and the current entity needs an
     # automatically assigned ID, tell the transaction where to put that.
@@ -193,8 +208,22 @@ class Entity(dict):
       key = self.key().path(updated_key.path())
       self.key(key)
 
+    if not self.key().is_partial():
+      self.dataset()._uncache_key_pbs([self.key().to_protobuf()])
+
     return self
 
+  def save_async(self):
+    """Save the entity in the Cloud Datastore in the background.
+
+    This runs :func:`save` on one of the connection's worker threads
+    (see :func:`gclouddatastore.connection.Connection.submit`).
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the entity with a possibly updated Key.
+    """
+    return self.dataset().connection().submit(self.save)
+
   def delete(self):
     """Delete the entity in the Cloud Datastore.
 
@@ -203,8 +232,10 @@ class Entity(dict):
       on the entity. Whatever is stored remotely using the key on the entity
       will be deleted.
     """
+    key_pb = self.key().to_protobuf()
     self.dataset().connection().delete_entity(
-        dataset_id=self.dataset().id(), key_pb=self.key().to_protobuf())
+        dataset_id=self.dataset().id(), key_pb=key_pb)
+    self.dataset()._uncache_key_pbs([key_pb])
 
   def __repr__(self):
     # TODO: Make sure that this makes sense.
@@ -213,3 +244,125 @@ class Entity(dict):
       return '<Entity%s %s>' % (self.key().path(), super(Entity, self).__repr__())
     else:
       return '<Entity %s>' % (super(Entity, self).__repr__())
+
+
+class LazyEntity(collections.MutableMapping):
+  """An entity which decodes its properties only as they're used.
+
+  Decoding every property of a large entity
+  is wasteful when only a couple of them are read.
+  A lazy entity keeps the property protobufs it was built from
+  and decodes each one the first time it's accessed::
+
+    >>> entity = LazyEntity.from_protobuf(entity_pb)
+    >>> entity['name']  # Only this property is decoded.
+    'JJ'
+
+  It has the same methods as an :class:`Entity`
+  and works anywhere a mapping does
+  (``dict(entity)``, ``other.update(entity)``, ``f(**entity)``, ...),
+  but it isn't a ``dict`` itself,
+  so use :func:`to_dict` for anything needing a real dictionary
+  (like ``json.dumps``)
+  or :func:`materialize` for the equivalent :class:`Entity`.
+
+  Use :func:`gclouddatastore.dataset.Dataset` with ``lazy=True``
+  to get lazy entities from lookups and queries.
+  """
+
+  def __init__(self, dataset=None, kind=None):
+    self._entity = Entity(dataset=dataset, kind=kind)
+    self._undecoded = {}
+
+  @classmethod
+  def from_key(cls, key):
+    return cls().key(key)
+
+  @classmethod
+  def from_protobuf(cls, pb, dataset=None):
+    entity = cls.from_key(Key.from_protobuf(pb.key, dataset=dataset))
+    entity._undecoded = dict((p.name, p) for p in pb.property)
+    return entity
+
+  def _decode(self, name):
+    # This is here to avoid circular imports.
+    from gclouddatastore import helpers
+
+    value = helpers.get_value_from_protobuf(self._undecoded.pop(name))
+    self._entity[name] = value
+    return value
+
+  def materialize(self):
+    """Decode all of the properties not yet decoded.
+
+    :rtype: :class:`Entity`
+    :returns: The plain entity holding the decoded properties
+              (which this lazy entity keeps using).
+    """
+    for name in self._undecoded.keys():
+      self._decode(name)
+    return self._entity
+
+  def to_dict(self):
+    """Get all of the properties as a dictionary.
+
+    :rtype: dict
+    """
+    return dict(self.materialize())
+
+  def key(self, key=None):
+    if key:
+      self._entity.key(key)
+      return self
+    return self._entity.key()
+
+  def kind(self):
+    return self._entity.kind()
+
+  def dataset(self):
+    return self._entity.dataset()
+
+  def to_protobuf(self):
+    return self.materialize().to_protobuf()
+
+  def reload(self):
+    self.materialize().reload()
+    return self
+
+  def save(self):
+    self.materialize().save()
+    return self
+
+  def save_async(self):
+    return self.dataset().connection().submit(self.save)
+
+  def delete(self):
+    self._entity.delete()
+
+  def __getitem__(self, name):
+    if name in self._undecoded:
+      return self._decode(name)
+    return self._entity[name]
+
+  def __setitem__(self, name, value):
+    self._undecoded.pop(name, None)
+    self._entity[name] = value
+
+  def __delitem__(self, name):
+    if name in self._undecoded:
+      del self._undecoded[name]
+    else:
+      del self._entity[name]
+
+  def __contains__(self, name):
+    return name in self._undecoded or name in self._entity
+
+  def __iter__(self):
+    # Listing the names first means decoding while iterating is safe.
+    return iter(self._entity.keys() + self._undecoded.keys())
+
+  def __len__(self):
+    return len(self._entity) + len(self._undecoded)
+
+  def __repr__(self):
+    return repr(self.materialize())
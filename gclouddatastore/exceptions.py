@@ -0,0 +1,90 @@
+"""Errors raised when talking to the Cloud Datastore API."""
+
+
+class Error(Exception):
+  """The base class for errors raised by this library."""
+
+
+class RequestError(Error):
+  """An API request came back with a status other than 200 OK.
+
+  :type status: integer
+  :param status: The HTTP status code of the response.
+
+  :type content: string
+  :param content: The body of the response.
+
+  :type method: string
+  :param method: The API method called (ie, ``lookup``, ``commit``, ...).
+  """
+
+  def __init__(self, status, content, method=None):
+    super(RequestError, self).__init__(
+        'Request failed with status %s. Error was: %s' % (status, content))
+    self.status = status
+    self.content = content
+    self.method = method
+
+
+class TransientError(RequestError):
+  """A request failed in a way that might succeed if it's tried again.
+
+  This covers server errors, throttling and contention.
+  """
+
+  STATUSES = frozenset([408, 409, 429, 500, 502, 503, 504])
+  """The HTTP status codes considered transient."""
+
+
+class PartialFailureError(Error):
+  """Some of the requests making up a bulk operation failed.
+
+  Large bulk operations are split into several requests,
+  which succeed or fail independently.
+  Whatever the successful requests did has been done,
+  and only the items listed in :attr:`errors` need to be tried again.
+
+  :type results: list
+  :param results: One result per item, as the operation would have returned,
+                  with ``None`` for each item that failed.
+
+  :type errors: dict
+  :param errors: A mapping of the index of each item that failed
+                 to the error raised by the request it was part of.
+  """
+
+  def __init__(self, results, errors):
+    indexes = sorted(errors)
+    super(PartialFailureError, self).__init__(
+        '%d of %d items failed (indexes %s). First error was: %s' % (
+            len(indexes), len(results), indexes, errors[indexes[0]]))
+    self.results = results
+    self.errors = errors
+
+  def failed_indexes(self):
+    """Get the indexes of the items that failed.
+
+    :rtype: list of integers
+    """
+    return sorted(self.errors)
+
+
+def make_request_error(status, content, method=None):
+  """Build the right type of error for a failed request.
+
+  :type status: integer
+  :param status: The HTTP status code of the response.
+
+  :type content: string
+  :param content: The body of the response.
+
+  :type method: string
+  :param method: The API method called.
+
+  :rtype: :class:`RequestError`
+  :returns: A :class:`TransientError` if the status is transient,
+            otherwise a plain :class:`RequestError`.
+  """
+  if status in TransientError.STATUSES:
+    return TransientError(status, content, method=method)
+  return RequestError(status, content, method=method)
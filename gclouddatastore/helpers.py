@@ -1,11 +1,112 @@
 """Helper methods for dealing with Cloud Datastore's Protobuf API."""
 from datetime import datetime
+from datetime import timedelta
 
 import pytz
 
 from gclouddatastore.key import Key
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=pytz.utc)
+
+
+def _datetime_to_microseconds(val):
+  """Convert a datetime to microseconds since the epoch.
+
+  Naive datetimes are assumed to be in UTC.
+  """
+  if val.tzinfo:
+    delta = val - _EPOCH
+  else:
+    delta = val - _EPOCH.replace(tzinfo=None)
+  return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _microseconds_to_datetime(microseconds):
+  """Convert microseconds since the epoch to a datetime (in UTC)."""
+  return _EPOCH + timedelta(microseconds=microseconds)
+
+
+# Maps Python types to the Value attribute they're stored in,
+# and a function converting them to what's stored (or None if nothing
+# needs converting).
+_ENCODERS = {
+    bool: ('boolean_value', None),
+    int: ('integer_value', None),
+    long: ('integer_value', None),
+    float: ('double_value', None),
+    str: ('string_value', None),
+    unicode: ('string_value', None),
+    basestring: ('string_value', None),
+    datetime: ('timestamp_microseconds_value', _datetime_to_microseconds),
+    Key: ('key_value', Key.to_protobuf),
+    list: ('list_value', None),
+    tuple: ('list_value', None),
+    }
+
+# Encoders looked up for each type seen so far,
+# including subclasses of the types above.
+_encoder_cache = dict(_ENCODERS)
+
+# Maps Value attributes to a function converting what's stored
+# to a Python value (or None if nothing needs converting).
+# Any fields not here (like ``indexed`` and ``meaning``) are ignored.
+_DECODERS = {
+    'boolean_value': None,
+    'integer_value': None,
+    'double_value': None,
+    'string_value': None,
+    'blob_value': None,
+    'blob_key_value': None,
+    'timestamp_microseconds_value': _microseconds_to_datetime,
+    'key_value': Key.from_protobuf,
+    'list_value': lambda value_pbs: [_decode_value(v) for v in value_pbs],
+    }
+
+
+def register_type(value_type, attr, to_value=None):
+  """Register how values of a type should be stored.
+
+  Values of any subclass of ``value_type``
+  are stored the same way (unless they're registered themselves).
+  For example, to store :class:`decimal.Decimal` values as strings::
+
+    >>> register_type(decimal.Decimal, 'string_value', str)
+
+  The values come back as whatever the attribute decodes to
+  (in this case, a string).
+
+  :type value_type: type
+  :param value_type: The type of value.
+
+  :type attr: string
+  :param attr: The Value protobuf attribute to store the values in.
+
+  :type to_value: callable
+  :param to_value: Converts a value to what's stored in the attribute.
+                   If ``None``, values are stored as they are.
+  """
+  if attr not in _DECODERS:
+    raise ValueError('Unknown Value attribute: %s' % attr)
+
+  _ENCODERS[value_type] = (attr, to_value)
+  _encoder_cache.clear()
+  _encoder_cache.update(_ENCODERS)
+
+
+def _get_encoder(value_type):
+  """Find the encoder for a type, falling back to its base classes."""
+  encoder = _encoder_cache.get(value_type)
+  if encoder is None:
+    for base in value_type.__mro__[1:]:
+      if base in _ENCODERS:
+        encoder = _encoder_cache[value_type] = _ENCODERS[base]
+        break
+    else:
+      raise ValueError('Unsupported value type: %s' % value_type.__name__)
+  return encoder
+
+
 def get_protobuf_attribute_and_value(val):
   """Given a value, return the protobuf attribute name and proper value.
 
@@ -28,27 +129,81 @@ def get_protobuf_attribute_and_value(val):
   >>> get_protobuf_attribute_and_value('my_string')
   ('string_value', 'my_string')
 
+  Other types can be added with :func:`register_type`.
+
   :type val: `datetime.datetime`, :class:`gclouddatastore.key.Key`,
-             bool, float, integer, string
+             bool, float, integer, string, list
   :param val: The value to be scrutinized.
 
   :returns: A tuple of the attribute name and proper value type.
   """
+  attr, to_value = _get_encoder(type(val))
+  if to_value:
+    val = to_value(val)
+  return attr, val
+
+
+def set_protobuf_value(value_pb, val):
+  """Set the proper attribute on a Value protobuf for the value provided.
+
+  Scalar values can simply be assigned to the protobuf attribute,
+  however message values (like a :class:`gclouddatastore.key.Key`)
+  have to be copied in, and lists have each of their items added.
+
+  :type value_pb: :class:`gclouddatastore.datastore_v1_pb2.Value`
+  :param value_pb: The Value protobuf to update.
+
+  :type val: `datetime.datetime`, :class:`gclouddatastore.key.Key`,
+             bool, float, integer, string, list
+  :param val: The value to set.
+  """
+  attr, to_value = _get_encoder(type(val))
+  if to_value:
+    val = to_value(val)
+
+  if attr == 'key_value':
+    value_pb.key_value.CopyFrom(val)
+  elif attr == 'list_value':
+    for item in val:
+      set_protobuf_value(value_pb.list_value.add(), item)
+  else:
+    setattr(value_pb, attr, val)
+
+
+def set_entity_protobuf(entity_pb, key_pb, properties):
+  """Fill in an Entity protobuf with a key and properties.
+
+  This is the one place entities are encoded,
+  whether they're being saved or just converted.
+
+  :type entity_pb: :class:`gclouddatastore.datastore_v1_pb2.Entity`
+  :param entity_pb: The (empty) Entity protobuf to fill in.
+
+  :type key_pb: :class:`gclouddatastore.datastore_v1_pb2.Key`
+  :param key_pb: The key of the entity.
+
+  :type properties: dict
+  :param properties: The properties of the entity.
+  """
+  entity_pb.key.CopyFrom(key_pb)
 
-  if isinstance(val, datetime):
-    name, value = 'timestamp_microseconds', time.mktime(val.timetuple())
-  elif isinstance(val, Key):
-    name, value = 'key', val.to_protobuf()
-  elif isinstance(val, bool):
-    name, value = 'boolean', val
-  elif isinstance(val, float):
-    name, value = 'double', val
-  elif isinstance(val, (int, long)):
-    name, value = 'integer', val
-  elif isinstance(val, basestring):
-    name, value = 'string', val
+  for name, value in properties.iteritems():
+    property_pb = entity_pb.property.add()
+    property_pb.name = name
+    set_protobuf_value(property_pb.value, value)
 
-  return name + '_value', value
+
+def _decode_value(value_pb):
+  """Get the Python value stored in a Value protobuf."""
+  for field, val in value_pb.ListFields():
+    if field.name in _DECODERS:
+      from_value = _DECODERS[field.name]
+      if from_value:
+        return from_value(val)
+      return val
+
+  # TODO(jjg): Should we raise a ValueError here?
+  return None
 
 
 def get_value_from_protobuf(pb):
@@ -66,26 +221,158 @@ def get_value_from_protobuf(pb):
 
   :returns: The value provided by the Protobuf.
   """
+  return _decode_value(pb.value)
+
 
-  if pb.value.HasField('timestamp_microseconds_value'):
-    timestamp = pb.value.timestamp_microseconds_value / 1e6
-    return datetime.fromtimestamp(timestamp).replace(tzinfo=pytz.utc)
+def get_key_ordering(key_pb):
+  """Get a value that sorts Key protobufs in the same order as the datastore.
 
-  elif pb.value.HasField('key_value'):
-    return Key.from_protobuf(pb.value.key_value)
+  Keys are ordered by their path elements, one element at a time,
+  comparing first the kind and then the ID or name
+  (where IDs always come before names).
+  This means that a parent key sorts before its children.
 
-  elif pb.value.HasField('boolean_value'):
-    return pb.value.boolean_value
+  >>> sorted(key_pbs, key=get_key_ordering)
+  [<Key protobufs in datastore order>]
 
-  elif pb.value.HasField('double_value'):
-    return pb.value.double_value
+  :type key_pb: :class:`gclouddatastore.datastore_v1_pb2.Key`
+  :param key_pb: The Key protobuf.
 
-  elif pb.value.HasField('integer_value'):
-    return pb.value.integer_value
+  :rtype: tuple
+  :returns: A tuple which compares the way the key would in the datastore.
+  """
+  ordering = []
+  for element in key_pb.path_element:
+    if element.HasField('id'):
+      ordering.append((element.kind, 0, element.id))
+    else:
+      ordering.append((element.kind, 1, element.name))
+  return tuple(ordering)
 
-  elif pb.value.HasField('string_value'):
-    return pb.value.string_value
 
-  else:
-    # TODO(jjg): Should we raise a ValueError here?
-    return None
+def get_key_identity(key_pb):
+  """Get a hashable value identifying a Key protobuf.
+
+  This ignores the dataset ID,
+  which the API doesn't always return in the same form it was given.
+
+  :type key_pb: :class:`gclouddatastore.datastore_v1_pb2.Key`
+  :param key_pb: The Key protobuf.
+
+  :rtype: tuple
+  :returns: The namespace followed by the key's ordering
+            (see :func:`get_key_ordering`).
+  """
+  return (key_pb.partition_id.namespace,) + get_key_ordering(key_pb)
+
+
+# The rank of each type of value in the datastore's ordering,
+# where integers and timestamps are compared with each other.
+_VALUE_RANKS = (
+    ('integer_value', 1),
+    ('timestamp_microseconds_value', 1),
+    ('boolean_value', 2),
+    ('blob_value', 3),
+    ('blob_key_value', 3),
+    ('string_value', 4),
+    ('double_value', 5),
+    ('key_value', 6),
+    )
+
+
+def get_value_ordering(value_pb, descending=False):
+  """Get a value that sorts Value protobufs in the same order as the datastore.
+
+  Values of different types are ordered by type:
+  nulls, then integers and timestamps, booleans, blobs, strings,
+  floats and finally keys.
+  A list is ordered by its smallest value
+  (or its largest, when sorting in descending order).
+
+  >>> sorted(value_pbs, key=get_value_ordering)
+  [<Value protobufs in datastore order>]
+
+  :type value_pb: :class:`gclouddatastore.datastore_v1_pb2.Value`
+  :param value_pb: The Value protobuf.
+
+  :type descending: bool
+  :param descending: Whether the values are being sorted in descending order.
+
+  :rtype: tuple
+  :returns: A tuple which compares the way the value would in the datastore.
+  """
+  if value_pb.list_value:
+    orderings = [get_value_ordering(v) for v in value_pb.list_value]
+    return max(orderings) if descending else min(orderings)
+
+  for attr, rank in _VALUE_RANKS:
+    if value_pb.HasField(attr):
+      val = getattr(value_pb, attr)
+      if attr == 'key_value':
+        val = get_key_identity(val)
+      elif attr == 'string_value':
+        val = val.encode('utf-8')
+      return (rank, val)
+
+  return (0,)
+
+
+def encode_varint(value):
+  """Encode a non-negative integer as a protobuf varint.
+
+  :type value: integer
+  :param value: The value to encode.
+
+  :rtype: string
+  :returns: The encoded bytes.
+  """
+  if value < 0x80:
+    return chr(value)
+
+  encoded = []
+  while value > 0x7f:
+    encoded.append(chr(0x80 | (value & 0x7f)))
+    value >>= 7
+  encoded.append(chr(value))
+  return ''.join(encoded)
+
+
+def encode_bytes_field(number, data):
+  """Encode a length-delimited protobuf field.
+
+  Messages, strings and bytes are all encoded this way,
+  so this can be used to add an already serialized message
+  to another one without parsing and copying it::
+
+    >>> request = encode_bytes_field(3, key_pb.SerializeToString())
+    >>> datastore_pb.LookupRequest.FromString(request).key[0] == key_pb
+    True
+
+  :type number: integer
+  :param number: The field number.
+
+  :type data: string
+  :param data: The serialized value of the field.
+
+  :rtype: string
+  :returns: The encoded field.
+  """
+  return encode_varint(number << 3 | 2) + encode_varint(len(data)) + data
+
+
+def encode_varint_field(number, value):
+  """Encode an integer protobuf field.
+
+  Since the last value of a scalar field wins when parsing,
+  this can be appended to a serialized message to override the field.
+
+  :type number: integer
+  :param number: The field number.
+
+  :type value: integer
+  :param value: The (non-negative) value of the field.
+
+  :rtype: string
+  :returns: The encoded field.
+  """
+  return encode_varint(number << 3) + encode_varint(value)
@@ -1,4 +1,3 @@
-import copy
 from itertools import izip
 
 from gclouddatastore import datastore_v1_pb2 as datastore_pb
@@ -6,51 +5,92 @@ from gclouddatastore.dataset import Dataset
 
 
 class Key(object):
-  # TODO: Determine if this really should be immutable.
   """
   An immutable representation of a datastore Key.
+
+  Each of the setters (like :func:`kind` and :func:`id`)
+  returns a new Key rather than changing the existing one,
+  which means keys can be safely shared,
+  and can be used as dictionary keys or in sets::
+
+    >>> key = Key.from_path('Person', 1234, dataset=dataset)
+    >>> key == Key(dataset=dataset).kind('Person').id(1234)
+    True
+    >>> len(set([key, key.kind('Person')]))
+    1
+
+  The path is stored as a tuple of ``(kind, id_or_name)`` pairs,
+  with ``None`` as the ID or name of a partial key.
   """
 
+  __slots__ = ('_dataset', '_namespace', '_pairs', '_pb', '_serialized')
+
   def __init__(self, dataset=None, namespace=None, path=None):
     self._dataset = dataset
     self._namespace = namespace
-    self._path = path or [{'kind': ''}]
+    self._pairs = _get_pairs(path or [{'kind': ''}])
+    self._pb = None
+    self._serialized = None
 
-  def _clone(self):
-    """Duplicates the Key.
+  @classmethod
+  def _from_pairs(cls, pairs, dataset=None, namespace=None):
+    """Build a Key straight from a tuple of ``(kind, id_or_name)`` pairs."""
+    key = cls.__new__(cls)
+    key._dataset = dataset
+    key._namespace = namespace
+    key._pairs = pairs
+    key._pb = None
+    key._serialized = None
+    return key
 
-    We make a shallow copy of the :class:`gclouddatastore.dataset.Dataset`
-    because it holds a reference an authenticated connection,
-    which we don't want to lose.
-    """
-    clone = copy.deepcopy(self)
-    clone._dataset = self._dataset  # Make a shallow copy of the Dataset.
-    return clone
+  def _replace(self, dataset=None, namespace=None, pairs=None):
+    """Get a copy of the Key with some of its parts replaced."""
+    return self._from_pairs(pairs or self._pairs,
+                            dataset=dataset or self._dataset,
+                            namespace=namespace or self._namespace)
+
+  def _replace_last(self, kind, id_or_name):
+    return self._replace(pairs=self._pairs[:-1] + ((kind, id_or_name),))
+
+  def __copy__(self):
+    # Keys are immutable, so there's no need to copy them.
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
 
   @classmethod
   def from_protobuf(cls, pb, dataset=None):
-    path = []
+    pairs = []
     for element in pb.path_element:
-      element_dict = {'kind': element.kind}
-
       if element.HasField('id'):
-        element_dict['id'] = element.id
-
+        pairs.append((element.kind, element.id))
       elif element.HasField('name'):
-        element_dict['name'] = element.name
-
-      path.append(element_dict)
+        pairs.append((element.kind, element.name))
+      else:
+        pairs.append((element.kind, None))
 
     if not dataset:
       dataset = Dataset(id=pb.partition_id.dataset_id)
 
-    return cls(path=path, dataset=dataset)
+    return cls._from_pairs(tuple(pairs), dataset=dataset,
+                           namespace=pb.partition_id.namespace or None)
 
   def to_protobuf(self):
+    """Get the protobuf representing the Key.
+
+    The protobuf is built once and then reused,
+    so it shouldn't be modified.
+
+    :rtype: :class:`gclouddatastore.datastore_v1_pb2.Key`
+    """
+    if self._pb is not None:
+      return self._pb
+
     key = datastore_pb.Key()
 
     # Apparently 's~' is a prefix for High-Replication and is necessary here.
-    dataset_id = self.dataset().id()
+    dataset_id = self.dataset() and self.dataset().id()
     if dataset_id:
       if not dataset_id.startswith('s~'):
         dataset_id = 's~' + dataset_id
@@ -60,89 +100,133 @@ class Key(object):
     if self._namespace:
       key.partition_id.namespace = self._namespace
 
-    for item in self.path():
+    for kind, id_or_name in self._pairs:
       element = key.path_element.add()
-      if 'kind' in item:
-        element.kind = item['kind']
-      if 'id' in item:
-        element.id = item['id']
-      if 'name' in item:
-        element.name = item['name']
+      if kind:
+        element.kind = kind
+      if isinstance(id_or_name, basestring):
+        element.name = id_or_name
+      elif id_or_name is not None:
+        element.id = id_or_name
 
+    self._pb = key
     return key
 
+  def to_protobuf_string(self):
+    """Get the serialized protobuf representing the Key.
+
+    Like the protobuf, this is built once and then reused.
+
+    :rtype: string
+    """
+    if self._serialized is None:
+      self._serialized = self.to_protobuf().SerializeToString()
+    return self._serialized
+
   @classmethod
   def from_path(cls, *args, **kwargs):
-    path = []
     items = iter(args)
+    pairs = tuple(izip(items, items))
 
-    for kind, id_or_name in izip(items, items):
-      entry = {'kind': kind}
-      if isinstance(id_or_name, basestring):
-        entry['name'] = id_or_name
-      else:
-        entry['id'] = id_or_name
-      path.append(entry)
+    # A trailing kind on its own makes a partial key.
+    if len(args) % 2:
+      pairs += ((args[-1], None),)
 
-    kwargs['path'] = path
-    return cls(**kwargs)
+    return cls._from_pairs(pairs or (('', None),), **kwargs)
 
   def is_partial(self):
     return (self.id_or_name() is None)
 
   def dataset(self, dataset=None):
     if dataset:
-      clone = self._clone()
-      clone._dataset = dataset
-      return clone
+      return self._replace(dataset=dataset)
     else:
       return self._dataset
 
   def namespace(self, namespace=None):
     if namespace:
-      clone = self._clone()
-      clone._namespace = namespace
-      return clone
+      return self._replace(namespace=namespace)
     else:
       return self._namespace
 
   def path(self, path=None):
+    """Get or set the path of the Key.
+
+    For backwards compatibility, the path is a list of dictionaries
+    (each with a ``kind`` and possibly an ``id`` or ``name``).
+    Changing the list returned doesn't change the Key.
+    """
     if path:
-      clone = self._clone()
-      clone._path = path
-      return clone
-    else:
-      return self._path
+      return self._replace(pairs=_get_pairs(path))
+
+    path = []
+    for kind, id_or_name in self._pairs:
+      element = {'kind': kind}
+      if isinstance(id_or_name, basestring):
+        element['name'] = id_or_name
+      elif id_or_name is not None:
+        element['id'] = id_or_name
+      path.append(element)
+    return path
 
   def kind(self, kind=None):
     if kind:
-      clone = self._clone()
-      clone._path[-1]['kind'] = kind
-      return clone
-    elif self.path():
-      return self._path[-1]['kind']
+      return self._replace_last(kind, self._pairs[-1][1])
+    else:
+      return self._pairs[-1][0]
 
   def id(self, id=None):
     if id:
-      clone = self._clone()
-      clone._path[-1]['id'] = id
-      return clone
-    elif self.path():
-      return self._path[-1].get('id')
+      return self._replace_last(self._pairs[-1][0], id)
+
+    id_or_name = self._pairs[-1][1]
+    if not isinstance(id_or_name, basestring):
+      return id_or_name
 
   def name(self, name=None):
     if name:
-      clone = self._clone()
-      clone._path[-1]['name'] = name
-      return clone
-    elif self.path():
-      return self._path[-1].get('name')
+      return self._replace_last(self._pairs[-1][0], name)
+
+    id_or_name = self._pairs[-1][1]
+    if isinstance(id_or_name, basestring):
+      return id_or_name
 
   def id_or_name(self):
-    return self.id() or self.name()
+    return self._pairs[-1][1] or None
 
   def parent(self):
     raise NotImplementedError
 
+  def _identity(self):
+    dataset_id = self._dataset and self._dataset.id()
+    if dataset_id and dataset_id.startswith('s~'):
+      dataset_id = dataset_id[2:]
+    return (dataset_id or None, self._namespace or None, self._pairs)
+
+  def __eq__(self, other):
+    if not isinstance(other, Key):
+      return NotImplemented
+    return self._identity() == other._identity()
+
+  def __ne__(self, other):
+    if not isinstance(other, Key):
+      return NotImplemented
+    return self._identity() != other._identity()
+
+  def __hash__(self):
+    return hash(self._identity())
+
   def __repr__(self):
     return '<Key%s>' % self.path()
+
+
+def _get_pairs(path):
+  """Convert a path (a list of dictionaries) into ``(kind, id_or_name)`` pairs."""
+  pairs = []
+  for element in path:
+    if element.get('id'):
+      id_or_name = element['id']
+    else:
+      id_or_name = element.get('name')
+    pairs.append((element.get('kind', ''), id_or_name))
+  return tuple(pairs)
@@ -0,0 +1,171 @@
+"""A pool of reusable HTTP transports.
+
+:class:`httplib2.Http` objects keep their connections alive between
+requests, however they aren't safe to share between threads.
+The :class:`HttpPool` hands out one transport per request
+and takes it back afterwards,
+so concurrent requests each get their own transport
+without paying for a new connection (and TLS handshake) every time.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+
+class HttpPool(object):
+  """A bounded pool of HTTP transports, checked out for each request.
+
+  You typically won't use this directly,
+  as each :class:`gclouddatastore.connection.Connection`
+  owns one of these.
+
+    >>> pool = HttpPool(httplib2.Http, max_size=10)
+    >>> with pool.transport('www.googleapis.com') as http:
+    ...   http.request(...)
+
+  :type factory: callable
+  :param factory: Called with no arguments to build a new transport
+                  when there are no idle ones available.
+
+  :type max_size: integer
+  :param max_size: The maximum number of idle transports to keep around.
+                   Transports returned to a full pool are closed.
+
+  :type max_per_host: integer
+  :param max_per_host: The maximum number of transports checked out
+                       for a single host at any one time.
+                       Checking out more than that blocks
+                       until one is returned.
+                       If ``None``, there is no limit.
+
+  :type idle_timeout: integer
+  :param idle_timeout: The number of seconds a transport can sit idle
+                       before it is closed rather than reused.
+                       If ``None``, idle transports never expire.
+  """
+
+  def __init__(self, factory, max_size=10, max_per_host=None,
+               idle_timeout=None):
+    self._factory = factory
+    self._max_size = max_size
+    self._max_per_host = max_per_host
+    self._idle_timeout = idle_timeout
+    self._lock = threading.Lock()
+    self._idle = collections.defaultdict(list)
+    self._idle_count = 0
+    self._host_limits = {}
+
+  def _host_limit(self, host):
+    with self._lock:
+      if host not in self._host_limits:
+        self._host_limits[host] = threading.BoundedSemaphore(
+            self._max_per_host)
+      return self._host_limits[host]
+
+  def idle_count(self):
+    """Get the number of idle transports in the pool.
+
+    :rtype: integer
+    :returns: The number of transports waiting to be reused.
+    """
+    return self._idle_count
+
+  def checkout(self, host):
+    """Take a transport for the given host out of the pool.
+
+    The most recently used idle transport is reused if there is one,
+    otherwise a new transport is built.
+    Every transport checked out must be returned with :func:`checkin`.
+
+    :type host: string
+    :param host: The host the transport will be talking to.
+
+    :returns: A transport (typically a :class:`httplib2.Http`).
+    """
+    if self._max_per_host:
+      self._host_limit(host).acquire()
+
+    expired = []
+    http = None
+    with self._lock:
+      idle = self._idle[host]
+      while idle and not http:
+        candidate, last_used = idle.pop()
+        self._idle_count -= 1
+        if self._idle_timeout and time.time() - last_used > self._idle_timeout:
+          expired.append(candidate)
+        else:
+          http = candidate
+
+    for candidate in expired:
+      _close(candidate)
+
+    if not http:
+      try:
+        http = self._factory()
+      except Exception:
+        if self._max_per_host:
+          self._host_limit(host).release()
+        raise
+
+    return http
+
+  def checkin(self, host, http, reuse=True):
+    """Return a transport to the pool.
+
+    :type host: string
+    :param host: The host the transport was checked out for.
+
+    :param http: The transport being returned.
+
+    :type reuse: bool
+    :param reuse: Whether the transport can be handed out again.
+                  Transports left in a bad state (for example, after an
+                  error mid-request) should be returned with ``False``.
+    """
+    with self._lock:
+      if reuse and self._idle_count < self._max_size:
+        self._idle[host].append((http, time.time()))
+        self._idle_count += 1
+        http = None
+
+    if http:
+      _close(http)
+
+    if self._max_per_host:
+      self._host_limit(host).release()
+
+  @contextlib.contextmanager
+  def transport(self, host):
+    """Check out a transport for the duration of a ``with`` block.
+
+    :type host: string
+    :param host: The host the transport will be talking to.
+    """
+    http = self.checkout(host)
+    try:
+      yield http
+    except Exception:
+      self.checkin(host, http, reuse=False)
+      raise
+    else:
+      self.checkin(host, http)
+
+  def close(self):
+    """Close all of the idle transports in the pool."""
+    with self._lock:
+      idle = [http for transports in self._idle.values()
+              for http, _ in transports]
+      self._idle.clear()
+      self._idle_count = 0
+
+    for http in idle:
+      _close(http)
+
+
+def _close(http):
+  """Close any open connections held by an :class:`httplib2.Http`."""
+  for connection in getattr(http, 'connections', {}).values():
+    connection.close()
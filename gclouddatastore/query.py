@@ -1,12 +1,14 @@
 import copy
+import heapq
+import itertools
+import Queue
+import sys
+import threading
 
 from gclouddatastore import datastore_v1_pb2 as datastore_pb
 from gclouddatastore import helpers
-from gclouddatastore.entity import Entity
 
 
-# TODO: Figure out how to properly handle namespaces.
-
 class Query(object):
   """A Query against the Cloud Datastore.
 
@@ -40,6 +42,9 @@ class Query(object):
 
   :type dataset: :class:`gclouddatastore.dataset.Dataset`
   :param dataset: The dataset to query.
+
+  :type namespace: string
+  :param namespace: The namespace to query.
   """
 
   OPERATORS = {
@@ -51,26 +56,133 @@ class Query(object):
       }
   """Mapping of operator strings and their protobuf equivalents."""
 
-  def __init__(self, kind=None, dataset=None):
+  INEQUALITY_OPERATORS = frozenset([
+      datastore_pb.PropertyFilter.LESS_THAN,
+      datastore_pb.PropertyFilter.LESS_THAN_OR_EQUAL,
+      datastore_pb.PropertyFilter.GREATER_THAN,
+      datastore_pb.PropertyFilter.GREATER_THAN_OR_EQUAL,
+      ])
+  """The protobuf operators which are inequality filters."""
+
+  MAX_SUBQUERIES = 30
+  """The most sub-queries an ``IN``, ``!=`` or OR filter can expand into."""
+
+  AGGREGATIONS = {
+      'first': datastore_pb.PropertyExpression.FIRST,
+      }
+  """Mapping of aggregation function names and their protobuf equivalents."""
+
+  KEY_PROPERTY = '__key__'
+  """The special property projected to get only the keys of entities."""
+
+  SCATTER_OVERSAMPLING = 32
+  """The number of keys sampled per shard when splitting a parallel scan."""
+
+  def __init__(self, kind=None, dataset=None, namespace=None):
     self._dataset = dataset
-    self._pb = datastore_pb.Query()
+    self._namespace = namespace
+    self._kinds = (kind,) if kind else ()
+    self._filters = ()
+    self._disjunctions = ()
+    self._projection = ()
+    self._group_by = ()
+    self._orders = ()
+    self._start_cursor = None
+    self._end_cursor = None
+    self._limit = 0
+    self._pb = None
+    self._serialized = None
 
-    if kind:
-      self._pb.kind.add().name = kind
+  def _replace(self, **parts):
+    """Get a copy of the Query with some of its parts replaced.
 
-  def _clone(self):
-    # TODO(jjg): Double check that this makes sense...
-    clone = copy.deepcopy(self)
-    clone._dataset = self._dataset  # Shallow copy the dataset.
+    Each part of a query (like its kinds and filters) is immutable,
+    so the copy can share everything that isn't being replaced.
+    The copy is compiled to a protobuf again when it's needed.
+    """
+    clone = copy.copy(self)
+    clone._pb = clone._serialized = None
+    for name, value in parts.iteritems():
+      setattr(clone, '_' + name, value)
     return clone
 
   def to_protobuf(self):
     """Convert the :class:`Query` instance to a :class:`gclouddatastore.datastore_v1_pb2.Query`.
 
+    The protobuf is only built the first time this is called.
+    Since queries are immutable,
+    the protobuf returned shouldn't be modified.
+
     :rtype: :class:`gclouddatstore.datastore_v1_pb2.Query`
     :returns: A Query protobuf that can be sent to the protobuf API.
     """
-    return self._pb
+    if self._pb is not None:
+      return self._pb
+
+    if self._disjunctions:
+      raise ValueError('A query with IN, != or OR filters runs as several '
+                       'sub-queries, and has no single protobuf.')
+
+    query_pb = datastore_pb.Query()
+
+    for kind in self._kinds:
+      query_pb.kind.add().name = kind
+
+    for projected in self._projection:
+      property_name, aggregation = self._parse_projection(projected)
+      expression = query_pb.projection.add()
+      expression.property.name = property_name
+      if aggregation:
+        expression.aggregation_function = self.AGGREGATIONS[aggregation]
+
+    for property_name in self._group_by:
+      query_pb.group_by.add().name = property_name
+
+    for property_name, descending in self._orders:
+      order_pb = query_pb.order.add()
+      order_pb.property.name = property_name
+      if descending:
+        order_pb.direction = datastore_pb.PropertyOrder.DESCENDING
+      else:
+        order_pb.direction = datastore_pb.PropertyOrder.ASCENDING
+
+    if self._filters:
+      # Build a composite filter AND'd together.
+      composite_filter = query_pb.filter.composite_filter
+      composite_filter.operator = datastore_pb.CompositeFilter.AND
+
+      for property_name, operator, value in self._filters:
+        property_filter = composite_filter.filter.add().property_filter
+        property_filter.property.name = property_name
+        property_filter.operator = operator
+        helpers.set_protobuf_value(property_filter.value, value)
+
+    if self._start_cursor:
+      query_pb.start_cursor = self._start_cursor
+
+    if self._end_cursor:
+      query_pb.end_cursor = self._end_cursor
+
+    if self._limit:
+      query_pb.limit = self._limit
+
+    self._pb = query_pb
+    return query_pb
+
+  def to_protobuf_string(self):
+    """Get the serialized Query protobuf.
+
+    The query is only serialized the first time this is called,
+    so running the same query many times
+    (or paging through its results)
+    doesn't serialize it over and over.
+
+    :rtype: string
+    :returns: The serialized :class:`gclouddatastore.datastore_v1_pb2.Query`.
+    """
+    if self._serialized is None:
+      self._serialized = self.to_protobuf().SerializeToString()
+    return self._serialized
 
   def filter(self, expression, value):
     """Filter the query based on an expression and a value.
@@ -95,42 +207,185 @@ class Query(object):
 
       >>> query = Query('Person').filter('name =', 'James').filter('age >', 50)
 
+    The datastore itself doesn't support ``IN`` and ``!=`` filters,
+    so these are run as several sub-queries
+    (one for each value of an ``IN``,
+    and one either side of the value of a ``!=``)
+    whose results are merged together (see :func:`iter`)::
+
+      >>> query = Query('Person').filter('status IN', ['new', 'active'])
+      >>> query = Query('Person').filter('status !=', 'deleted')
+
     :type expression: string
     :param expression: An expression of a property and an operator (ie, ``=``).
 
     :type value: integer, string, boolean, float, None, datetime
-    :param value: The value to filter on.
+    :param value: The value to filter on
+                  (or a list of values for an ``IN`` filter).
 
     :rtype: :class:`Query`
     :returns: A Query filtered by the expression and value provided.
     """
-    clone = self._clone()
+    alternatives = self._parse_filter(expression, value)
+    if len(alternatives) == 1:
+      return self._replace(filters=self._filters + alternatives)
+    return self._replace(disjunctions=self._disjunctions + (alternatives,))
+
+  def filter_any(self, *filters):
+    """Filter the query to entities matching any of several filters.
+
+    Each filter is an ``(expression, value)`` pair,
+    just like the arguments to :func:`filter`,
+    and the query is run as one sub-query per filter::
+
+      >>> query = Query('Person').filter_any(('age <', 18), ('age >', 65))
+
+    Filters added with :func:`filter` still apply to every result,
+    so this is an OR nested inside the other filters' AND.
+
+    :type filters: ``(expression, value)`` tuples
+    :param filters: The filters to match any of.
+
+    :rtype: :class:`Query`
+    :returns: A Query filtered by any of the filters provided.
+    """
+    alternatives = ()
+    for expression, value in filters:
+      alternatives += self._parse_filter(expression, value)
 
+    if not alternatives:
+      raise ValueError('At least one filter is required.')
+
+    return self._replace(disjunctions=self._disjunctions + (alternatives,))
+
+  def _parse_filter(self, expression, value):
+    """Parse a filter into the alternatives any result has to match.
+
+    :rtype: tuple
+    :returns: ``(property_name, operator, value)`` tuples,
+              with only one for filters the datastore supports.
+    """
     # Take an expression like 'property >=', and parse it into useful pieces.
-    property_name, operator = None, None
     expression = expression.strip()
 
-    for operator_string in self.OPERATORS:
+    parts = expression.rsplit(None, 1)
+    if len(parts) == 2 and parts[1].upper() == 'IN':
+      values = tuple(value)
+      if not values:
+        raise ValueError('An IN filter needs at least one value.')
+      equal = self.OPERATORS['=']
+      return tuple((parts[0], equal, val) for val in values)
+
+    if expression.endswith('!='):
+      property_name = expression[:-2].strip()
+      if not property_name:
+        raise ValueError('Invalid expression: "%s"' % expression)
+      return ((property_name, self.OPERATORS['<'], value),
+              (property_name, self.OPERATORS['>'], value))
+
+    property_name, operator = None, None
+
+    # Check the longest operators first, so '>=' isn't mistaken for '='.
+    for operator_string in sorted(self.OPERATORS, key=len, reverse=True):
       if expression.endswith(operator_string):
         operator = self.OPERATORS[operator_string]
         property_name = expression[0:-len(operator_string)].strip()
+        break
 
     if not operator or not property_name:
       raise ValueError('Invalid expression: "%s"' % expression)
 
-    # Build a composite filter AND'd together.
-    composite_filter = clone._pb.filter.composite_filter
-    composite_filter.operator = datastore_pb.CompositeFilter.AND
+    return ((property_name, operator, value),)
 
-    # Add the specific filter
-    property_filter = composite_filter.filter.add().property_filter
-    property_filter.property.name = property_name
-    property_filter.operator = operator
+  def _get_subqueries(self):
+    """Expand any ``IN``, ``!=`` and OR filters into simple queries.
 
-    # Set the value to filter on based on the type.
-    attr_name, pb_value = helpers.get_protobuf_attribute_and_value(value)
-    setattr(property_filter.value, attr_name, pb_value)
-    return clone
+    Each sub-query picks one alternative from each of the disjunctions,
+    so together they match exactly the entities this Query does
+    (though an entity can match more than one of them).
+
+    :rtype: list of :class:`Query`
+    """
+    if not self._disjunctions:
+      return [self]
+
+    if self._start_cursor or self._end_cursor:
+      raise ValueError('A cursor only applies to a single query, so cannot '
+                       'be used with IN, != or OR filters.')
+
+    count = 1
+    for alternatives in self._disjunctions:
+      count *= len(alternatives)
+    if count > self.MAX_SUBQUERIES:
+      raise ValueError('This query would need %d sub-queries (the most '
+                       'allowed is %d).' % (count, self.MAX_SUBQUERIES))
+
+    return [self._replace(filters=self._filters + choice, disjunctions=())
+            for choice in itertools.product(*self._disjunctions)]
+
+  def _get_merge_orders(self, queries):
+    """Get the order the results of several queries are merged in.
+
+    Results are sorted by the Query's sort orders (see :func:`order`)
+    and then by key.
+    Without any sort orders, the datastore returns results
+    ordered by the property with an inequality filter (if any)
+    and then by key,
+    and all the queries must agree on that order to be merged.
+
+    :rtype: list of ``(property_name, descending)`` tuples
+    """
+    if self._orders:
+      return list(self._orders)
+
+    inequality_properties = set()
+    for query in queries:
+      inequality_properties.add(frozenset(
+          property_name for property_name, operator, _ in query._filters
+          if operator in self.INEQUALITY_OPERATORS and
+          property_name != self.KEY_PROPERTY))
+
+    if len(inequality_properties) > 1:
+      raise ValueError('The sub-queries have inequality filters '
+                       'on different properties, so cannot be merged.')
+
+    return [(property_name, False)
+            for property_name in sorted(inequality_properties.pop())]
+
+  def _project_merge_orders(self, orders):
+    """Get a clone of the Query which returns the properties it's merged by.
+
+    Keys-only and projection queries only return the properties projected,
+    but merging their results needs the values they're sorted by.
+    Any missing sort properties are added to the projection
+    (and left out of the results, see :class:`MergedIterator`).
+
+    :type orders: list of ``(property_name, descending)`` tuples
+    :param orders: The order the results are merged in
+                   (see :func:`_get_merge_orders`).
+
+    :rtype: :class:`Query`
+    """
+    if not self._projection:
+      return self
+
+    projected = set()
+    if not self.is_keys_only():
+      projected.update(self._parse_projection(p)[0] for p in self._projection)
+
+    missing = tuple(property_name for property_name, _ in orders
+                    if property_name != self.KEY_PROPERTY and
+                    property_name not in projected)
+    if not missing:
+      return self
+
+    if self._group_by:
+      raise ValueError('The results of grouped queries can only be merged '
+                       'by properties they return.')
+
+    if self.is_keys_only():
+      return self._replace(projection=missing)
+    return self._replace(projection=self._projection + missing)
 
   def kind(self, *kinds):
     """Get or set the Kind of the Query.
@@ -144,20 +399,20 @@ class Query(object):
     :type kinds: string
     :param kinds: The entity kinds for which to query.
 
-    :rtype: string or :class:`Query`
-    :returns: If no arguments, returns the kind.
+    :rtype: list of :class:`gclouddatastore.datastore_v1_pb2.KindExpression`
+            or :class:`Query`
+    :returns: If no arguments, returns the kinds
+              (as they'd appear in the protobuf).
               If a kind is provided, returns a clone of the :class:`Query`
               with those kinds set.
     """
     # TODO: Do we want this to be additive?
-    #       If not, clear the _pb.kind attribute.
+    #       If not, replace the kinds rather than adding to them.
     if kinds:
-      clone = self._clone()
-      for kind in kinds:
-        clone._pb.kind.add().name = kind
-      return clone
+      return self._replace(kinds=self._kinds + kinds)
     else:
-      return self._pb.kind
+      # Queries with disjunctions have no protobuf to read this from.
+      return [datastore_pb.KindExpression(name=kind) for kind in self._kinds]
 
   def limit(self, limit=None):
     """Get or set the limit of the Query.
@@ -177,11 +432,57 @@ class Query(object):
               with that limit set.
     """
     if limit:
-      clone = self._clone()
-      clone._pb.limit = limit
-      return clone
+      return self._replace(limit=limit)
+    else:
+      return self._limit
+
+  def start(self, cursor=None):
+    """Get or set the cursor the Query starts from.
+
+    Cursors come from :func:`Iterator.cursor`,
+    so a long scan can be picked up where it left off::
+
+      >>> iterator = query.iter()
+      >>> for entity in iterator:
+      ...   export(entity)
+      ...   save_progress(iterator.cursor())
+      >>> # Later, after a crash:
+      >>> for entity in query.start(load_progress()):
+      ...   export(entity)
+
+    See :class:`gclouddatastore.checkpoint.Checkpoint`
+    for saving progress to a file.
+
+    :type cursor: string
+    :param cursor: The cursor to start from.
+
+    :rtype: string, None, or :class:`Query`
+    :returns: If no arguments, returns the current start cursor.
+              If a cursor is provided, returns a clone of the :class:`Query`
+              starting from it.
+    """
+    if cursor:
+      return self._replace(start_cursor=cursor)
+    else:
+      return self._start_cursor
+
+  def end(self, cursor=None):
+    """Get or set the cursor the Query ends at.
+
+    Results from this cursor onwards aren't returned.
+
+    :type cursor: string
+    :param cursor: The cursor to end at.
+
+    :rtype: string, None, or :class:`Query`
+    :returns: If no arguments, returns the current end cursor.
+              If a cursor is provided, returns a clone of the :class:`Query`
+              ending at it.
+    """
+    if cursor:
+      return self._replace(end_cursor=cursor)
     else:
-      return self._pb.limit
+      return self._end_cursor
 
   def dataset(self, dataset=None):
     """Get or set the :class:`gclouddatastore.dataset.Dataset` for this Query.
@@ -201,12 +502,364 @@ class Query(object):
               with that dataset set.
     """
     if dataset:
-      clone = self._clone()
-      clone._dataset = dataset
-      return clone
+      return self._replace(dataset=dataset)
     else:
       return self._dataset
 
+  def namespace(self, namespace=None):
+    """Get or set the namespace of the Query.
+
+    This is a hybrid getter / setter, used as::
+
+      >>> query = Query('Person')
+      >>> query = query.namespace('customer-1')  # Set the namespace.
+      >>> query.namespace()  # Get the current namespace.
+      'customer-1'
+
+    To run the same query across several namespaces,
+    see :class:`MultiQuery`.
+
+    :rtype: string, None, or :class:`Query`
+    :returns: If no arguments, returns the current namespace.
+              If a namespace is provided, returns a clone of the :class:`Query`
+              with that namespace set.
+    """
+    if namespace:
+      return self._replace(namespace=namespace)
+    else:
+      return self._namespace
+
+  def order(self, *properties):
+    """Get or set the sort orders of the Query.
+
+    Each property is sorted in ascending order,
+    unless its name is prefixed with a ``-``::
+
+      >>> query = Query('Person').order('-age', 'name')
+      >>> query.order()
+      ('-age', 'name')
+
+    Results with equal values for all the properties
+    are sorted by key.
+
+    .. note::
+      Like :func:`kind`, this is an **additive** operation,
+      so ``.order('a').order('b')`` sorts by ``a`` and then ``b``.
+
+    :type properties: string
+    :param properties: The names of the properties to sort by.
+
+    :rtype: tuple of strings or :class:`Query`
+    :returns: If no arguments, returns the current sort orders.
+              If properties are provided, returns a clone of the :class:`Query`
+              sorted by them.
+    """
+    if not properties:
+      return tuple(('-' if descending else '') + property_name
+                   for property_name, descending in self._orders)
+
+    orders = []
+    for order in properties:
+      descending = order.startswith('-')
+      property_name = order[1:] if descending else order
+      if not property_name:
+        raise ValueError('Invalid sort order: "%s"' % order)
+      orders.append((property_name, descending))
+
+    return self._replace(orders=self._orders + tuple(orders))
+
+  def keys_only(self):
+    """Get a clone of the Query which only returns keys.
+
+    The datastore then returns just the key of each entity
+    (which is much less to send and to decode)
+    and the results are :class:`gclouddatastore.key.Key` objects::
+
+      >>> query = dataset.query('Person').filter('age >', 50)
+      >>> query.keys_only().fetch()
+      [<Key object>, <Key object>, ...]
+
+    :rtype: :class:`Query`
+    :returns: A Query returning keys rather than entities.
+    """
+    return self._replace(projection=(self.KEY_PROPERTY,))
+
+  def is_keys_only(self):
+    """Whether the Query only returns keys (see :func:`keys_only`).
+
+    :rtype: bool
+    """
+    return self._projection == (self.KEY_PROPERTY,)
+
+  def projection(self, *properties):
+    """Get or set the properties returned by the Query.
+
+    The datastore then returns only those properties of each entity,
+    and the results are :class:`Row` objects
+    rather than full entities::
+
+      >>> query = dataset.query('Person').projection('name', 'age')
+      >>> for row in query:
+      ...   print row.key(), row['name'], row['age']
+
+    Only indexed properties can be projected.
+
+    When grouping results (see :func:`group_by`),
+    properties not being grouped by
+    must be aggregated using one of ``AGGREGATIONS``,
+    by passing a ``(property, aggregation)`` tuple::
+
+      >>> query = dataset.query('Person').group_by('city')
+      >>> query.projection('city', ('name', 'first')).fetch()
+      [<Row ...>, <Row ...>, ...]
+
+    :type properties: string or tuple
+    :param properties: The names of the properties to return
+                       (or tuples of a name and an aggregation function).
+
+    :rtype: tuple of strings or :class:`Query`
+    :returns: If no arguments, returns the properties being projected.
+              If properties are provided, returns a clone of the
+              :class:`Query` projecting those properties.
+    """
+    if properties:
+      for projected in properties:
+        self._parse_projection(projected)
+      return self._replace(projection=properties)
+    else:
+      return self._projection
+
+  def _parse_projection(self, projected):
+    """Split a projected property into its name and aggregation function.
+
+    :type projected: string or tuple
+    :param projected: A property name,
+                      or a tuple of a property name and an aggregation.
+
+    :rtype: tuple
+    :returns: The property name and the aggregation (or ``None``).
+    """
+    if isinstance(projected, basestring):
+      return projected, None
+
+    property_name, aggregation = projected
+    if aggregation not in self.AGGREGATIONS:
+      raise ValueError('Invalid aggregation: "%s"' % aggregation)
+    return property_name, aggregation
+
+  def group_by(self, *properties):
+    """Get or set the properties the results are grouped by.
+
+    The datastore returns one result for each distinct combination
+    of values of these properties,
+    which is a lot less to page through than every entity
+    when only the distinct values are wanted::
+
+      >>> query = dataset.query('Person').group_by('city')
+      >>> cities = [row['city'] for row in query.projection('city')]
+
+    The results are paged through like those of any other query.
+
+    :type properties: string
+    :param properties: The names of the properties to group by.
+
+    :rtype: tuple of strings or :class:`Query`
+    :returns: If no arguments, returns the properties being grouped by.
+              If properties are provided, returns a clone of the
+              :class:`Query` grouped by those properties.
+    """
+    if properties:
+      return self._replace(group_by=properties)
+    else:
+      return self._group_by
+
+  def _get_result_factory(self):
+    """Get the function converting each entity protobuf into a result.
+
+    Depending on the projection, the results of the query are
+    :class:`gclouddatastore.key.Key`, :class:`Row`
+    or :class:`gclouddatastore.entity.Entity` objects.
+    """
+    # This import is here to avoid circular references.
+    from gclouddatastore.key import Key
+
+    dataset = self.dataset()
+
+    if self.is_keys_only():
+      return lambda entity_pb: Key.from_protobuf(entity_pb.key, dataset=dataset)
+
+    if self._projection:
+      names = tuple(self._parse_projection(projected)[0]
+                    for projected in self._projection)
+      indexes = dict((name, index) for index, name in enumerate(names))
+      return lambda entity_pb: Row.from_protobuf(entity_pb, names, indexes,
+                                                 dataset=dataset)
+
+    return dataset._entity_from_protobuf
+
+  def iter(self, limit=None, prefetch=0):
+    """Get an :class:`Iterator` over the results of this Query.
+
+    Rather than loading every matching entity into memory,
+    the iterator pages through the results
+    one batch at a time,
+    following the cursor returned with each batch::
+
+      >>> query = dataset.query('Person')
+      >>> for person in query.iter():
+      ...   print person['name']
+
+    Iterating over the Query directly does the same thing::
+
+      >>> for person in query:
+      ...   print person['name']
+
+    If you do some work with each entity,
+    you can have the next batches requested in the background
+    while you work through the current one::
+
+      >>> for person in query.iter(prefetch=2):
+      ...   do_some_work(person)
+
+    :type limit: integer
+    :param limit: An optional limit to apply temporarily to this query.
+
+    :type prefetch: integer
+    :param prefetch: The number of batches to fetch ahead
+                     on a background thread.
+                     By default batches are only fetched when needed.
+
+    A query with ``IN``, ``!=`` or OR filters
+    (see :func:`filter` and :func:`filter_any`)
+    runs each of its sub-queries concurrently,
+    and returns a :class:`MergedIterator` instead.
+
+    :rtype: :class:`Iterator`
+    :returns: An iterator yielding :class:`gclouddatastore.entity.Entity`
+              objects as each batch arrives
+              (or keys or rows, see :func:`keys_only`
+              and :func:`projection`).
+    """
+    if self._disjunctions:
+      queries = self._get_subqueries()
+      return MergedIterator(queries, self._get_merge_orders(queries),
+                            limit=limit or self.limit())
+
+    return Iterator(self, limit=limit, prefetch=prefetch)
+
+  def __iter__(self):
+    return iter(self.iter())
+
+  def _key_split_points(self, shards):
+    """Sample the keys of this Query's kind to split it into shards.
+
+    This relies on the ``__scatter__`` property
+    which the datastore sets on a small random sample of entities.
+    Sorting a handful of those keys
+    gives split points that divide the key space
+    into roughly equally sized ranges.
+
+    :type shards: integer
+    :param shards: The number of ranges wanted.
+
+    :rtype: list of :class:`gclouddatastore.key.Key`
+    :returns: Up to ``shards - 1`` sorted, distinct keys.
+    """
+    # This import is here to avoid circular references.
+    from gclouddatastore.key import Key
+
+    scatter_pb = datastore_pb.Query()
+    for kind in self.to_protobuf().kind:
+      scatter_pb.kind.add().CopyFrom(kind)
+    scatter_pb.projection.add().property.name = self.KEY_PROPERTY
+    scatter_pb.order.add().property.name = '__scatter__'
+    scatter_pb.limit = shards * self.SCATTER_OVERSAMPLING
+
+    entity_pbs = self.dataset().connection().run_query(
+        dataset_id=self.dataset().id(), query_pb=scatter_pb,
+        namespace=self.namespace())
+    key_pbs = sorted([entity_pb.key for entity_pb in entity_pbs],
+                     key=helpers.get_key_ordering)
+
+    if not key_pbs:
+      return []
+
+    split_pbs = []
+    for shard in range(1, shards):
+      key_pb = key_pbs[shard * len(key_pbs) // shards]
+      if (not split_pbs or helpers.get_key_ordering(key_pb) !=
+          helpers.get_key_ordering(split_pbs[-1])):
+        split_pbs.append(key_pb)
+
+    return [Key.from_protobuf(key_pb, dataset=self.dataset())
+            for key_pb in split_pbs]
+
+  def parallel_scan(self, shards=4, prefetch=1):
+    """Scan over the results of this Query using several concurrent queries.
+
+    The key space of the Query's kind is split into (up to) ``shards``
+    disjoint ranges using ``__key__`` filters,
+    and each range is iterated over on its own thread.
+    Entities are yielded as soon as any of the shards returns them,
+    so the results come back in no particular order::
+
+      >>> query = dataset.query('Person')
+      >>> for person in query.parallel_scan(shards=8):
+      ...   reindex(person)
+
+    Since the ranges are built from ``__key__`` inequality filters,
+    the Query can't have inequality filters on any other property,
+    can't have a limit
+    and can't have any sort orders
+    (the datastore requires ``__key__`` to be the first sort order
+    of a query with a ``__key__`` inequality filter).
+
+    :type shards: integer
+    :param shards: The number of ranges to scan concurrently.
+
+    :type prefetch: integer
+    :param prefetch: The number of batches buffered for each shard
+                     (at least one).
+
+    :rtype: iterator of :class:`gclouddatastore.entity.Entity`
+    :returns: The entities matching this query's criteria.
+    """
+    if self.limit():
+      raise ValueError('Cannot run a parallel scan over a query with a limit.')
+
+    if self._disjunctions:
+      raise ValueError('Cannot run a parallel scan over a query '
+                       'with IN, != or OR filters.')
+
+    if self._orders:
+      raise ValueError('Cannot run a parallel scan over a sorted query.')
+
+    if self._start_cursor or self._end_cursor:
+      raise ValueError('Cannot run a parallel scan over a query with cursors.')
+
+    # A buffer size of zero would make the queue unbounded.
+    if prefetch < 1:
+      raise ValueError('A parallel scan must prefetch at least one batch.')
+
+    split_points = self._key_split_points(shards)
+    boundaries = [None] + split_points + [None]
+
+    iterators = []
+    for lower, upper in zip(boundaries, boundaries[1:]):
+      shard = self
+      if lower:
+        shard = shard.filter('__key__ >=', lower)
+      if upper:
+        shard = shard.filter('__key__ <', upper)
+      iterators.append(Iterator(shard))
+
+    batches = _iter_in_background([i._batches for i in iterators],
+                                  len(iterators) * prefetch)
+
+    from_protobuf = self._get_result_factory()
+    return (from_protobuf(entity_pb)
+            for entity_pbs, _ in batches for entity_pb in entity_pbs)
+
   def fetch(self, limit=None):
     """Executes the Query and returns all matching entities.
 
@@ -236,12 +889,508 @@ class Query(object):
     :rtype: list of :class:`gclouddatastore.entity.Entity`'s
     :returns: The list of entities matching this query's criteria.
     """
-    clone = self
+    return list(self.iter(limit=limit))
 
-    if limit:
-      clone = self.limit(limit)
+  def fetch_async(self, limit=None):
+    """Executes the Query in the background.
 
-    entity_pbs = self.dataset().connection().run_query(
-        query_pb=clone.to_protobuf(), dataset_id=self.dataset().id())
+    This runs :func:`fetch` on one of the connection's worker threads
+    (see :func:`gclouddatastore.connection.Connection.submit`),
+    so several queries can be run at once::
+
+      >>> results = [query.fetch_async() for query in queries]
+      >>> entities = [result.get() for result in results]
+
+    :type limit: integer
+    :param limit: An optional limit to apply temporarily to this query.
+
+    :rtype: :class:`multiprocessing.pool.AsyncResult`
+    :returns: A handle on the list of entities matching this query.
+    """
+    return self.dataset().connection().submit(self.fetch, limit=limit)
+
+
+class Iterator(object):
+  """An iterator over the results of a :class:`Query`.
+
+  The Cloud Datastore returns query results in batches,
+  each with a cursor pointing to where the batch ended.
+  This class follows those cursors lazily,
+  requesting the next batch only once the current one is used up,
+  so that only a single batch is held in memory at a time.
+
+  You typically won't construct this directly,
+  but instead use :func:`Query.iter`
+  or iterate over a :class:`Query`.
+
+  :type query: :class:`Query`
+  :param query: The query to run.
+
+  :type limit: integer
+  :param limit: An optional limit overriding the one set on the query.
+
+  :type prefetch: integer
+  :param prefetch: The number of batches to fetch ahead on a worker thread.
+                   While one batch is being consumed,
+                   the request for the next is already in flight,
+                   and at most this many fetched batches are buffered.
+                   If zero, batches are fetched on demand.
+  """
+
+  def __init__(self, query, limit=None, prefetch=0):
+    self._query = query
+    self._limit = limit or query.limit() or None
+    self._prefetch = prefetch
+    self._cursor = None
+    self._count = 0
+    self._more_results = True
+    # Where the results returned so far end,
+    # as of the last batch that was returned in full.
+    self._returned_cursor = query.start()
+    self._returned_count = 0
+
+  def cursor(self):
+    """Get a cursor to resume the query from.
+
+    Cursors are only returned at the end of each batch,
+    so this points just after the last batch
+    whose results have all been returned.
+    Resuming from it (see :func:`Query.start`)
+    never skips a result,
+    but can return again the results of the batch being iterated over.
+
+    :rtype: string
+    :returns: The cursor, or the query's start cursor
+              if no batch has been returned yet.
+    """
+    return self._returned_cursor
+
+  def count(self):
+    """Get the number of results up to :func:`cursor`.
+
+    :rtype: integer
+    """
+    return self._returned_count
+
+  def more_results(self):
+    """Whether there may be more results to fetch.
+
+    :rtype: bool
+    :returns: False once the final batch has been fetched.
+    """
+    return self._more_results
+
+  def next_batch(self):
+    """Fetch the next batch of results from the Cloud Datastore.
+
+    :rtype: list of :class:`gclouddatastore.datastore_v1_pb2.Entity`
+    :returns: The entity protobufs in the next batch.
+    """
+    # Rather than copying the query to change its cursor and limit,
+    # the new values are added to the end of the serialized query
+    # (where they take precedence over any values already set).
+    query_pb = self._query.to_protobuf_string()
+
+    if self._cursor:
+      query_pb += helpers.encode_bytes_field(
+          datastore_pb.Query.START_CURSOR_FIELD_NUMBER, self._cursor)
+
+    if self._limit:
+      query_pb += helpers.encode_varint_field(
+          datastore_pb.Query.LIMIT_FIELD_NUMBER, self._limit - self._count)
+
+    dataset = self._query.dataset()
+    batch = dataset.connection().run_query_batch(
+        dataset_id=dataset.id(), query_pb=query_pb,
+        namespace=self._query.namespace())
+
+    entity_pbs = [result.entity for result in batch.entity_result]
+    self._count += len(entity_pbs)
+    self._cursor = batch.end_cursor
+
+    # Without a cursor to continue from there is no way to get more results.
+    self._more_results = bool(
+        batch.more_results == datastore_pb.QueryResultBatch.NOT_FINISHED and
+        self._cursor and
+        (not self._limit or self._count < self._limit))
+
+    return entity_pbs
+
+  def _batches(self):
+    """Yield each batch of entity protobufs along with its end cursor."""
+    while self._more_results:
+      entity_pbs = self.next_batch()
+      yield entity_pbs, self._cursor
+
+  def __iter__(self):
+    if self._prefetch:
+      batches = _iter_in_background([self._batches], self._prefetch)
+    else:
+      batches = self._batches()
+
+    from_protobuf = self._query._get_result_factory()
+    for entity_pbs, cursor in batches:
+      for entity_pb in entity_pbs:
+        yield from_protobuf(entity_pb)
+      self._returned_cursor = cursor
+      self._returned_count += len(entity_pbs)
+
+
+class MergedIterator(object):
+  """An iterator over the merged results of several queries.
+
+  The first batch of every query is fetched concurrently
+  (on the connection's worker threads),
+  and after that each query is paged through as its results are used.
+  Results are merged in order, one at a time,
+  so only about a batch per query is held in memory,
+  and any entity returned by more than one query
+  is only returned the first time.
+
+  You typically won't construct this directly,
+  but instead use :func:`Query.iter`
+  on a query with ``IN``, ``!=`` or OR filters.
+
+  :type queries: list of :class:`Query`
+  :param queries: The queries to run.
+                  Results are returned as the first query would return them
+                  (as entities, keys or rows).
+
+  :type orders: list of ``(property_name, descending)`` tuples
+  :param orders: The order every query returns its results in,
+                 ahead of the order by key.
+
+  :type limit: integer
+  :param limit: The most results to return altogether.
+
+  :type dedupe: bool
+  :param dedupe: Whether to skip entities already returned.
+                 This keeps the key of every entity returned in memory,
+                 so should be turned off
+                 if the queries can't return the same entities.
+                 It's always on if the queries had to be changed
+                 to return the properties they're sorted by,
+                 since a projected list property
+                 returns an entity once for each of its values.
+  """
+
+  def __init__(self, queries, orders=(), limit=None, dedupe=True):
+    queries = list(queries)
+    self._orders = list(orders)
+    self._limit = limit or None
+
+    # Results are built as the queries would have returned them,
+    # leaving out any properties added to sort them by.
+    self._from_protobuf = None
+    if queries:
+      self._from_protobuf = queries[0]._get_result_factory()
+
+    self._queries = [query._project_merge_orders(self._orders)
+                     for query in queries]
+    self._dedupe = dedupe or any(
+        merged is not query for merged, query in zip(self._queries, queries))
+
+  def _get_sort_key(self, entity_pb):
+    """Get a value ordering an entity protobuf among the merged results."""
+    values = dict((property_pb.name, property_pb.value)
+                  for property_pb in entity_pb.property)
+
+    sort_key = []
+    for property_name, descending in self._orders:
+      if property_name == Query.KEY_PROPERTY:
+        ordering = (helpers.get_key_identity(entity_pb.key),)
+      elif property_name in values:
+        ordering = helpers.get_value_ordering(values[property_name],
+                                              descending=descending)
+      else:
+        ordering = (0,)
+      sort_key.append(_Descending(ordering) if descending else ordering)
+
+    sort_key.append(helpers.get_key_identity(entity_pb.key))
+    return sort_key
+
+  def _streams(self):
+    """Start every query, returning a stream of entity protobufs for each."""
+    # Each query gets its own iterator
+    # (limited to the overall limit, since that's all that could be needed).
+    iterators = [Iterator(query, limit=self._limit) for query in self._queries]
+
+    connection = self._queries[0].dataset().connection()
+    first_batches = connection._map(lambda iterator: iterator.next_batch(),
+                                    iterators)
+
+    return [self._decorate(index, iterator, batch) for index, (iterator, batch)
+            in enumerate(zip(iterators, first_batches))]
+
+  def _decorate(self, index, iterator, batch):
+    # The index breaks ties, so the protobufs are never compared.
+    while True:
+      for entity_pb in batch:
+        yield self._get_sort_key(entity_pb), index, entity_pb
+      if not iterator.more_results():
+        return
+      batch = iterator.next_batch()
+
+  def __iter__(self):
+    if not self._queries:
+      return
+
+    from_protobuf = self._from_protobuf
+    seen = set()
+    count = 0
+
+    for _, _, entity_pb in heapq.merge(*self._streams()):
+      if self._dedupe:
+        identity = helpers.get_key_identity(entity_pb.key)
+        if identity in seen:
+          continue
+        seen.add(identity)
+
+      yield from_protobuf(entity_pb)
+      count += 1
+      if self._limit and count >= self._limit:
+        return
+
+
+class MultiQuery(object):
+  """A :class:`Query` run across several namespaces at once.
+
+  The query is run in every namespace concurrently,
+  and the results are merged into a single stream
+  in the query's sort order (see :func:`Query.order`)::
+
+    >>> query = dataset.query('Invoice').order('-created')
+    >>> for invoice in MultiQuery(query, customer_namespaces).iter(limit=100):
+    ...   print invoice.key().namespace(), invoice['created']
+
+  Only about a batch of results per namespace is held in memory at a time.
+
+  :type query: :class:`Query`
+  :param query: The query to run.
+
+  :type namespaces: list of strings
+  :param namespaces: The namespaces to run the query in.
+  """
+
+  def __init__(self, query, namespaces):
+    self._query = query
+    self._namespaces = list(namespaces)
+
+  def queries(self):
+    """Get the queries run in each of the namespaces.
+
+    :rtype: list of :class:`Query`
+    """
+    return [query.namespace(namespace) for namespace in self._namespaces
+            for query in self._query._get_subqueries()]
+
+  def iter(self, limit=None):
+    """Get an iterator over the merged results.
+
+    :type limit: integer
+    :param limit: An optional limit overriding the one set on the query.
+
+    :rtype: :class:`MergedIterator`
+    """
+    queries = self.queries()
+    return MergedIterator(queries, self._query._get_merge_orders(queries),
+                          limit=limit or self._query.limit(),
+                          dedupe=bool(self._query._disjunctions))
+
+  def __iter__(self):
+    return iter(self.iter())
+
+  def fetch(self, limit=None):
+    """Run the query in every namespace and return all the results.
+
+    :type limit: integer
+    :param limit: An optional limit overriding the one set on the query.
+
+    :rtype: list of :class:`gclouddatastore.entity.Entity`
+    """
+    return list(self.iter(limit=limit))
+
+
+class _Descending(object):
+  """Wraps a value to reverse the order it sorts in."""
+
+  __slots__ = ('value',)
+
+  def __init__(self, value):
+    self.value = value
+
+  def __lt__(self, other):
+    return other.value < self.value
+
+  def __eq__(self, other):
+    return self.value == other.value
+
+
+class Row(object):
+  """A result of a projection query (see :func:`Query.projection`).
+
+  Rows hold just the key and the projected properties of an entity,
+  which are accessed like those of a dictionary::
+
+    >>> row = dataset.query('Person').projection('name').fetch(1)[0]
+    >>> row['name']
+    'JJ'
+    >>> row.key()
+    <Key[{'kind': 'Person', 'id': 1234}]>
+
+  Rows are read-only, and much cheaper to build than entities.
+  """
+
+  __slots__ = ('_key', '_indexes', '_values')
+
+  def __init__(self, key, names, values):
+    self._key = key
+    self._indexes = dict((name, index) for index, name in enumerate(names))
+    self._values = tuple(values)
+
+  @classmethod
+  def from_protobuf(cls, pb, names, indexes, dataset=None):
+    """Build a row from an entity protobuf.
+
+    :type pb: :class:`gclouddatastore.datastore_v1_pb2.Entity`
+    :param pb: The (partial) entity returned by the projection query.
+
+    :type names: tuple of strings
+    :param names: The names of the projected properties.
+
+    :type indexes: dict
+    :param indexes: The position of each name in ``names``
+                    (shared between all rows of a query).
+
+    :type dataset: :class:`gclouddatastore.dataset.Dataset`
+    :param dataset: The dataset the entity belongs to.
+
+    :rtype: :class:`Row`
+    """
+    # This import is here to avoid circular references.
+    from gclouddatastore.key import Key
+
+    values = [None] * len(names)
+    for property_pb in pb.property:
+      index = indexes.get(property_pb.name)
+      if index is not None:
+        values[index] = helpers.get_value_from_protobuf(property_pb)
+
+    row = cls.__new__(cls)
+    row._key = Key.from_protobuf(pb.key, dataset=dataset)
+    row._indexes = indexes
+    row._values = tuple(values)
+    return row
+
+  def key(self):
+    """Get the key of the entity the row came from.
+
+    :rtype: :class:`gclouddatastore.key.Key`
+    """
+    return self._key
+
+  def keys(self):
+    """Get the names of the properties in the row.
+
+    :rtype: list of strings
+    """
+    return sorted(self._indexes, key=self._indexes.get)
+
+  def values(self):
+    """Get the values of the properties, in the same order as :func:`keys`.
+
+    :rtype: list
+    """
+    return list(self._values)
+
+  def get(self, name, default=None):
+    index = self._indexes.get(name)
+    if index is None:
+      return default
+    return self._values[index]
+
+  def to_dict(self):
+    """Convert the row to a dictionary of property names and values.
+
+    :rtype: dict
+    """
+    return dict(zip(self.keys(), self._values))
+
+  def __getitem__(self, name):
+    return self._values[self._indexes[name]]
+
+  def __contains__(self, name):
+    return name in self._indexes
+
+  def __iter__(self):
+    return iter(self.keys())
+
+  def __len__(self):
+    return len(self._values)
+
+  def __eq__(self, other):
+    if not isinstance(other, Row):
+      return NotImplemented
+    return (self._key, self.to_dict()) == (other._key, other.to_dict())
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return '<Row%s %r>' % (self._key.path(), self.to_dict())
+
+
+def _iter_in_background(producers, buffer_size):
+  """Run each producer on its own thread, yielding items as they arrive.
+
+  Items are passed through a queue holding at most ``buffer_size`` items,
+  so a producer blocks once it gets too far ahead of the consumer.
+  Any exception raised by a producer is re-raised in the consumer,
+  and the producers stop if the consumer stops iterating.
+
+  :type producers: list of callables
+  :param producers: Callables each returning an iterable of items.
+
+  :type buffer_size: integer
+  :param buffer_size: The maximum number of items to buffer.
+  """
+  buffer = Queue.Queue(maxsize=buffer_size)
+  stopped = threading.Event()
+  done = object()
+
+  def put(item):
+    # Don't block forever if the consumer has gone away.
+    while not stopped.is_set():
+      try:
+        buffer.put(item, timeout=0.1)
+        return
+      except Queue.Full:
+        pass
+
+  def run(producer):
+    try:
+      for item in producer():
+        if stopped.is_set():
+          break
+        put((item, None))
+    except Exception:
+      put((None, sys.exc_info()))
+    put((done, None))
+
+  for producer in producers:
+    worker = threading.Thread(target=run, args=(producer,))
+    worker.daemon = True
+    worker.start()
 
-    return [Entity.from_protobuf(entity) for entity in entity_pbs]
+  try:
+    remaining = len(producers)
+    while remaining:
+      item, exc_info = buffer.get()
+      if exc_info:
+        raise exc_info[0], exc_info[1], exc_info[2]
+      elif item is done:
+        remaining -= 1
+      else:
+        yield item
+  finally:
+    stopped.set()
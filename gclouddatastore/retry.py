@@ -0,0 +1,115 @@
+"""Retrying failed requests with exponential backoff.
+
+When lots of clients retry a failed request at the same moment,
+the retries themselves can overload the service again.
+A :class:`RetryPolicy` spaces out retries
+with exponentially growing (and randomly jittered) delays
+so that they spread out over time.
+"""
+
+import httplib
+import random
+import socket
+import time
+
+from gclouddatastore.exceptions import TransientError
+
+
+class RetryPolicy(object):
+  """A policy for retrying a request that failed with a transient error.
+
+  Requests are retried when they raise a
+  :class:`gclouddatastore.exceptions.TransientError`
+  or a network error.
+  The delay before each retry grows exponentially,
+  starting from ``initial_delay``
+  and multiplying by ``multiplier`` each time, up to ``max_delay``::
+
+    >>> policy = RetryPolicy(max_attempts=5, initial_delay=0.1, deadline=10)
+    >>> policy.call(lambda: connection.lookup('dataset-id', key_pbs))
+
+  You typically won't call this yourself,
+  but instead give a policy to a
+  :class:`gclouddatastore.connection.Connection`.
+
+  :type max_attempts: integer
+  :param max_attempts: The maximum number of times to try the request
+                       (including the first try).
+
+  :type initial_delay: float
+  :param initial_delay: The number of seconds to wait before the first retry.
+
+  :type max_delay: float
+  :param max_delay: The longest to ever wait between tries.
+
+  :type multiplier: float
+  :param multiplier: How much to grow the delay after each retry.
+
+  :type jitter: bool
+  :param jitter: If True, wait a random amount of time
+                 between zero and the delay ("full jitter")
+                 rather than exactly the delay.
+
+  :type deadline: float
+  :param deadline: The number of seconds after the first try
+                   beyond which no more retries are started.
+                   If ``None``, only ``max_attempts`` applies.
+  """
+
+  RETRY_ERRORS = (TransientError, socket.error, httplib.HTTPException)
+  """The types of errors that are retried."""
+
+  def __init__(self, max_attempts=5, initial_delay=0.1, max_delay=10.0,
+               multiplier=2.0, jitter=True, deadline=None):
+    self.max_attempts = max_attempts
+    self.initial_delay = initial_delay
+    self.max_delay = max_delay
+    self.multiplier = multiplier
+    self.jitter = jitter
+    self.deadline = deadline
+
+  def delays(self):
+    """Get the delays to wait before each retry.
+
+    :rtype: generator of floats
+    :returns: The number of seconds to wait before each retry,
+              one for each attempt after the first.
+    """
+    delay = self.initial_delay
+    for _ in range(self.max_attempts - 1):
+      if self.jitter:
+        yield random.uniform(0, delay)
+      else:
+        yield delay
+      delay = min(delay * self.multiplier, self.max_delay)
+
+  def call(self, func, sleep=time.sleep):
+    """Call a function, retrying it according to this policy.
+
+    :type func: callable
+    :param func: The function to call, with no arguments.
+
+    :type sleep: callable
+    :param sleep: The function used to wait between tries.
+
+    :returns: Whatever the function returns.
+
+    :raises: The last error raised by the function
+             if it fails on every try
+             (or with an error that isn't retried).
+    """
+    started = time.time()
+    delays = self.delays()
+
+    while True:
+      try:
+        return func()
+      except self.RETRY_ERRORS:
+        delay = next(delays, None)
+        if delay is None:
+          raise
+        if self.deadline is not None and (
+            time.time() + delay - started > self.deadline):
+          raise
+
+      sleep(delay)
@@ -0,0 +1,255 @@
+"""A local HTTP server standing in for the Cloud Datastore API.
+
+The server accepts the same protobuf requests as the real API
+(``POST /datastore/v1beta2/datasets/{dataset_id}/{method}``)
+and answers them from an
+:class:`gclouddatastore.emulator.InMemoryDatastore`.
+Latency and errors can be added to every request,
+which makes it a realistic target for benchmarking
+connection pooling, retries and batching::
+
+  $ python -m gclouddatastore.server --port 8081 --latency 0.02 --error-rate 0.01
+
+Point a connection at it with ``api_base_url``::
+
+  >>> connection = Connection(api_base_url='http://localhost:8081')
+
+Or run it in the background from Python (ie, in a test)::
+
+  >>> with DatastoreServer(latency=0.01) as server:
+  ...   connection = Connection(api_base_url=server.url())
+"""
+
+import argparse
+import BaseHTTPServer
+import random
+import re
+import socket
+import SocketServer
+import sys
+import threading
+import time
+
+from gclouddatastore import exceptions
+from gclouddatastore.connection import Connection
+from gclouddatastore.emulator import InMemoryDatastore
+
+
+_PATH = re.compile(r'^/datastore/(?P<api_version>[^/]+)'
+                   r'/datasets/(?P<dataset_id>[^/]+)/(?P<method>\w+)$')
+
+
+class DatastoreServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """An HTTP server answering API requests from an in-memory datastore.
+
+  Each request is handled on its own thread,
+  and connections are kept alive between requests
+  (just like the real API).
+
+  :type address: tuple
+  :param address: The ``(host, port)`` to listen on.
+                  By default, a free port on ``localhost`` is picked.
+
+  :type datastore: :class:`gclouddatastore.emulator.InMemoryDatastore`
+  :param datastore: The datastore to answer requests from.
+                    If not provided, a new (empty) datastore is created.
+
+  :type latency: float
+  :param latency: The number of seconds to wait before answering each request.
+
+  :type jitter: float
+  :param jitter: The most extra seconds (picked at random)
+                 to wait before answering each request.
+
+  :type error_rate: float
+  :param error_rate: The fraction of requests (between 0 and 1)
+                     which fail with ``error_status``
+                     without being carried out.
+
+  :type error_status: integer
+  :param error_status: The HTTP status code of injected errors.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, address=('localhost', 0), datastore=None, latency=0,
+               jitter=0, error_rate=0, error_status=503):
+    BaseHTTPServer.HTTPServer.__init__(self, address, _RequestHandler)
+    if datastore is None:
+      datastore = InMemoryDatastore()
+    self._datastore = datastore
+    self._latency = latency
+    self._jitter = jitter
+    self._error_rate = error_rate
+    self._error_status = error_status
+    self._random = random.Random()
+    self._lock = threading.Lock()
+    self._thread = None
+    self._connections = set()
+    self.request_counts = {}
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.stop()
+
+  def url(self):
+    """Get the base URL to give a connection as its ``api_base_url``.
+
+    :rtype: string
+    """
+    host, port = self.server_address[:2]
+    return 'http://%s:%d' % (host, port)
+
+  def datastore(self):
+    """Get the datastore requests are answered from.
+
+    :rtype: :class:`gclouddatastore.emulator.InMemoryDatastore`
+    """
+    return self._datastore
+
+  def start(self):
+    """Start serving requests on a background thread.
+
+    :rtype: :class:`DatastoreServer`
+    :returns: The server itself.
+    """
+    self._thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+    self._thread.daemon = True
+    self._thread.start()
+    return self
+
+  def stop(self):
+    """Stop serving requests and close the server's socket.
+
+    Any connections still open are closed too.
+    """
+    if self._thread:
+      self.shutdown()
+      self._thread.join()
+      self._thread = None
+
+    with self._lock:
+      connections = list(self._connections)
+    for connection in connections:
+      try:
+        connection.shutdown(socket.SHUT_RDWR)
+      except socket.error:
+        pass
+
+    self.server_close()
+
+  def process_request(self, request, client_address):
+    with self._lock:
+      self._connections.add(request)
+    SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+  def shutdown_request(self, request):
+    with self._lock:
+      self._connections.discard(request)
+    BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+  def handle_error(self, request, client_address):
+    # Clients closing kept-alive connections isn't worth reporting.
+    if not isinstance(sys.exc_info()[1], socket.error):
+      BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+  def handle_api_request(self, dataset_id, method, data):
+    """Answer a request to the API, adding any latency and errors.
+
+    :type dataset_id: string
+    :param dataset_id: The ID of the dataset the request is for.
+
+    :type method: string
+    :param method: The API method called (ie, ``lookup``, ``runQuery``, ...).
+
+    :type data: string
+    :param data: The serialized request protobuf.
+
+    :rtype: tuple
+    :returns: The HTTP status code and the response body.
+    """
+    with self._lock:
+      self.request_counts[method] = self.request_counts.get(method, 0) + 1
+      delay = self._latency + self._random.uniform(0, self._jitter)
+      fail = self._random.random() < self._error_rate
+
+    if delay:
+      time.sleep(delay)
+
+    if fail:
+      return self._error_status, 'Injected error.'
+
+    try:
+      return 200, self._datastore.handle(dataset_id, method, data)
+    except exceptions.RequestError as e:
+      return e.status, e.content
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Handles the HTTP side of each API request."""
+
+  protocol_version = 'HTTP/1.1'
+
+  def do_POST(self):
+    data = self.rfile.read(int(self.headers.getheader('Content-Length', 0)))
+
+    match = _PATH.match(self.path)
+    if not match or match.group('api_version') != Connection.API_VERSION:
+      self._respond(404, 'Not found: %s' % self.path)
+    elif self.headers.gettype() != 'application/x-protobuf':
+      self._respond(415, 'Requests must be application/x-protobuf.')
+    else:
+      status, content = self.server.handle_api_request(
+          match.group('dataset_id'), match.group('method'), data)
+      self._respond(status, content)
+
+  def _respond(self, status, content):
+    self.send_response(status)
+    if status == 200:
+      self.send_header('Content-Type', 'application/x-protobuf')
+    else:
+      self.send_header('Content-Type', 'text/plain')
+    self.send_header('Content-Length', str(len(content)))
+    self.end_headers()
+    self.wfile.write(content)
+
+  def log_message(self, format, *args):
+    # Logging every request would slow down benchmarks.
+    pass
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Serve the Cloud Datastore API from memory.')
+  parser.add_argument('--host', default='localhost')
+  parser.add_argument('--port', type=int, default=8081)
+  parser.add_argument('--latency', type=float, default=0,
+                      help='Seconds to wait before answering each request.')
+  parser.add_argument('--jitter', type=float, default=0,
+                      help='Most extra seconds to wait, picked at random.')
+  parser.add_argument('--error-rate', type=float, default=0,
+                      help='Fraction of requests failing with --error-status.')
+  parser.add_argument('--error-status', type=int, default=503)
+  parser.add_argument('--batch-size', type=int, default=500,
+                      help='Most results returned for each query request.')
+  args = parser.parse_args(argv)
+
+  server = DatastoreServer(
+      (args.host, args.port),
+      datastore=InMemoryDatastore(batch_size=args.batch_size),
+      latency=args.latency, jitter=args.jitter,
+      error_rate=args.error_rate, error_status=args.error_status)
+  print 'Serving the Cloud Datastore API at %s' % server.url()
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+
+if __name__ == '__main__':
+  main()
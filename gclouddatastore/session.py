@@ -0,0 +1,144 @@
+"""Sessions remembering the entities already looked up.
+
+Code handling a single request often looks up the same key
+from several places.
+Inside a :class:`Session`,
+:func:`gclouddatastore.dataset.Dataset.get_entities`
+keeps every entity it finds (or doesn't find) in an identity map,
+so each key is looked up at most once
+and every lookup of a key returns the same
+:class:`gclouddatastore.entity.Entity` object::
+
+  >>> with dataset.session():
+  ...   user = dataset.get_entity(user_key)  # Looked up in the datastore.
+  ...   dataset.get_entity(user_key) is user  # Served from the session.
+  True
+
+Lookups can also be put off with :func:`Session.get_entity_later`,
+so that the keys asked for in several places
+are all looked up together in one request.
+"""
+
+from gclouddatastore import helpers
+
+
+class Session(object):
+  """An identity map of keys to entities for a single unit of work.
+
+  You typically won't construct this directly,
+  but instead use :func:`gclouddatastore.dataset.Dataset.session`.
+
+  A session only applies to the thread that entered it,
+  and everything it holds is discarded when it's exited.
+  Saving or deleting an entity removes it from the session,
+  and sessions are bypassed inside transactions
+  (which must always read from the datastore).
+
+  :type dataset: :class:`gclouddatastore.dataset.Dataset`
+  :param dataset: The dataset to look up entities in.
+  """
+
+  def __init__(self, dataset):
+    self._dataset = dataset
+    self._entities = {}
+    self._pending = {}
+    self._previous = None
+
+  def __enter__(self):
+    self._previous = self._dataset._session()
+    self._dataset._set_session(self)
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self._dataset._set_session(self._previous)
+    self._entities.clear()
+    self._pending.clear()
+
+  def __len__(self):
+    return len(self._entities)
+
+  def get_entities(self, keys):
+    """Get the entities for several keys, looking up any not seen yet.
+
+    Any keys waiting to be looked up
+    (see :func:`get_entity_later`) are looked up at the same time.
+
+    :type keys: list of :class:`gclouddatastore.key.Key`
+    :param keys: The keys of the entities to get.
+
+    :rtype: list of :class:`gclouddatastore.entity.Entity`
+    :returns: One result per key,
+              with ``None`` for any entity that doesn't exist.
+    """
+    key_pbs = [key.to_protobuf() for key in keys]
+    identities = [helpers.get_key_identity(key_pb) for key_pb in key_pbs]
+
+    for identity, key in zip(identities, keys):
+      if identity not in self._entities:
+        self._pending[identity] = key
+
+    if self._pending:
+      pending, self._pending = self._pending, {}
+      entities = self._dataset._lookup_entities(pending.values())
+      self._entities.update(zip(pending.keys(), entities))
+
+    return [self._entities[identity] for identity in identities]
+
+  def get_entity_later(self, key):
+    """Ask for an entity without looking it up yet.
+
+    The key is looked up (along with any other keys waiting)
+    the first time any of the handles are resolved::
+
+      >>> user = session.get_entity_later(user_key)
+      >>> account = session.get_entity_later(account_key)
+      >>> user.get()  # Looks up both keys in one request.
+      <Entity object>
+      >>> account.get()  # Already looked up.
+      <Entity object>
+
+    :type key: :class:`gclouddatastore.key.Key`
+    :param key: The key of the entity to get.
+
+    :rtype: :class:`PendingEntity`
+    :returns: A handle on the entity.
+    """
+    identity = helpers.get_key_identity(key.to_protobuf())
+    if identity not in self._entities:
+      self._pending[identity] = key
+    return PendingEntity(self, key)
+
+  def forget(self, key_pbs):
+    """Remove entities from the session.
+
+    :type key_pbs: list of :class:`gclouddatastore.datastore_v1_pb2.Key`
+    :param key_pbs: The keys of the entities to remove.
+    """
+    for key_pb in key_pbs:
+      self._entities.pop(helpers.get_key_identity(key_pb), None)
+
+
+class PendingEntity(object):
+  """A handle on an entity which might not have been looked up yet.
+
+  See :func:`Session.get_entity_later`.
+  """
+
+  def __init__(self, session, key):
+    self._session = session
+    self._key = key
+
+  def key(self):
+    """Get the key of the entity.
+
+    :rtype: :class:`gclouddatastore.key.Key`
+    """
+    return self._key
+
+  def get(self):
+    """Get the entity, looking it up if it hasn't been already.
+
+    :rtype: :class:`gclouddatastore.entity.Entity`
+    :returns: The entity, or ``None`` if it doesn't exist.
+    """
+    return self._session.get_entities([self._key])[0]
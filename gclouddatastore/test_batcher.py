@@ -0,0 +1,127 @@
+import time
+
+import unittest2
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore.batcher import Batcher
+from gclouddatastore.key import Key
+from gclouddatastore.test_connection import FakeConnection
+
+
+class FailingConnection(FakeConnection):
+
+  def commit(self, dataset_id, mutation_pb):
+    raise ValueError('Commit failed.')
+
+
+class SlowFirstCommitConnection(FakeConnection):
+
+  def commit(self, dataset_id, mutation_pb):
+    if not self.__dict__.setdefault('committed', []):
+      time.sleep(0.05)
+    self.committed.append(mutation_pb.upsert[0].property[0].value)
+    return super(SlowFirstCommitConnection, self).commit(dataset_id,
+                                                         mutation_pb)
+
+
+class NoAutoIdsConnection(FakeConnection):
+
+  def commit(self, dataset_id, mutation_pb):
+    return datastore_pb.MutationResult()
+
+
+class TestBatcher(unittest2.TestCase):
+
+  def test_flushes_on_close(self):
+    connection = FakeConnection()
+    dataset = connection.dataset('id')
+    entity = dataset.entity('Thing')
+
+    with dataset.batcher() as batcher:
+      saved = batcher.save(entity)
+      deleted = batcher.delete(Key.from_path('Thing', 1, dataset=dataset))
+      self.assertFalse(saved.done())
+
+    self.assertIs(entity, saved.result(timeout=5))
+    self.assertFalse(entity.key().is_partial())
+    self.assertEqual(1, deleted.result(timeout=5).id())
+
+    self.assertEqual(1, len(connection.requests))
+    mutation = connection.requests[0][1].mutation
+    self.assertEqual(1, len(mutation.insert_auto_id))
+    self.assertEqual(1, len(mutation.delete))
+
+  def test_coalesces_operations_on_the_same_key(self):
+    connection = FakeConnection()
+    dataset = connection.dataset('id')
+    key = Key.from_path('Thing', 1, dataset=dataset)
+    entity = dataset.entity('Thing').key(key)
+
+    with dataset.batcher() as batcher:
+      entity['n'] = 1
+      first = batcher.save(entity)
+      entity['n'] = 2
+      second = batcher.save(entity)
+      other = batcher.save(dataset.entity('Thing').key(key.id(2)))
+      deleted = batcher.delete(key.id(2))
+
+    mutation = connection.requests[0][1].mutation
+    self.assertEqual([1], [e.key.path_element[0].id for e in mutation.upsert])
+    self.assertEqual(2, mutation.upsert[0].property[0].value.integer_value)
+    self.assertEqual([2], [k.path_element[0].id for k in mutation.delete])
+    for future in (first, second, other, deleted):
+      self.assertTrue(future.done())
+
+  def test_flushes_on_count(self):
+    connection = FakeConnection()
+    dataset = connection.dataset('id')
+    batcher = Batcher(dataset, max_mutations=2, max_latency=60)
+    futures = [batcher.save(dataset.entity('Thing')) for i in range(3)]
+
+    futures[1].result(timeout=5)
+    self.assertFalse(futures[2].done())
+    batcher.close()
+    self.assertEqual(2, len(connection.requests))
+
+  def test_flushes_on_latency(self):
+    dataset = FakeConnection().dataset('id')
+    batcher = Batcher(dataset, max_latency=0.01)
+    future = batcher.save(dataset.entity('Thing'))
+    time.sleep(0.01)
+    self.assertFalse(future.result(timeout=5).key().is_partial())
+    batcher.close()
+
+  def test_commit_errors_fail_the_batch(self):
+    dataset = FailingConnection().dataset('id')
+    with dataset.batcher() as batcher:
+      futures = [batcher.save(dataset.entity('Thing')) for i in range(2)]
+
+    for future in futures:
+      self.assertIsInstance(future.exception(timeout=5), ValueError)
+      with self.assertRaises(ValueError):
+        future.result()
+
+  def test_writes_to_a_key_are_committed_in_order(self):
+    connection = SlowFirstCommitConnection()
+    dataset = connection.dataset('id')
+    entity = dataset.entity('Thing').key(Key.from_path('Thing', 1,
+                                                        dataset=dataset))
+    with Batcher(dataset, max_mutations=1) as batcher:
+      for n in (1, 2):
+        entity['n'] = n
+        batcher.save(entity)
+
+    self.assertEqual([1, 2], [v.integer_value for v in connection.committed])
+
+  def test_errors_after_committing_fail_the_batch(self):
+    dataset = NoAutoIdsConnection().dataset('id')
+    with dataset.batcher() as batcher:
+      future = batcher.save(dataset.entity('Thing'))
+    self.assertIsInstance(future.exception(timeout=5), StopIteration)
+
+  def test_closed_batcher(self):
+    dataset = FakeConnection().dataset('id')
+    batcher = dataset.batcher()
+    batcher.close()
+    with self.assertRaises(ValueError):
+      batcher.save(dataset.entity('Thing'))
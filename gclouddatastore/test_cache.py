@@ -0,0 +1,153 @@
+import unittest2
+
+from gclouddatastore.cache import LRUCache
+from gclouddatastore.cache import LocalMemcacheClient
+from gclouddatastore.cache import MemcacheCache
+from gclouddatastore.key import Key
+from gclouddatastore.test_connection import FakeConnection
+
+
+class TestLRUCache(unittest2.TestCase):
+
+  def test_evicts_least_recently_used(self):
+    cache = LRUCache(max_entries=2)
+    cache.set_multi({'a': '1', 'b': '2'})
+    cache.get_multi(['a'])
+    cache.set_multi({'c': '3'})
+
+    self.assertEqual({'a': '1', 'c': '3'}, cache.get_multi(['a', 'b', 'c']))
+    self.assertEqual({'hits': 3, 'misses': 1, 'evictions': 1}, cache.stats())
+
+  def test_tombstones_count_as_misses(self):
+    cache = LRUCache()
+    cache.set_multi({'a': '1', 'b': LRUCache._TOMBSTONE})
+    cache.get_multi(['a', 'b', 'c'])
+    self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0}, cache.stats())
+
+  def test_evicts_by_size(self):
+    cache = LRUCache(max_bytes=10)
+    cache.set_multi({'a': '1234', 'b': '1234'})
+    cache.set_multi({'c': '1234'})
+    self.assertEqual(['b', 'c'], sorted(cache.get_multi(['a', 'b', 'c'])))
+
+  def test_add_only_fills_missing_entries(self):
+    cache = LRUCache()
+    cache.set_multi({'a': '1'})
+    cache.set_multi({'b': '2'}, ttl=-1)
+    cache.add_multi({'a': 'stale', 'b': '3', 'c': '4'})
+    self.assertEqual({'a': '1', 'b': '3', 'c': '4'},
+                     cache.get_multi(['a', 'b', 'c']))
+
+  def test_expires_entries(self):
+    cache = LRUCache()
+    cache.set_multi({'a': '1'}, ttl=-1)
+    self.assertEqual({}, cache.get_multi(['a']))
+    self.assertEqual(0, len(cache))
+
+
+class TestDatasetCache(unittest2.TestCase):
+
+  def setUp(self):
+    self.connection = FakeConnection()
+    self.cache = LRUCache(kind_ttls={'Uncached': 0})
+    self.dataset = self.connection.dataset('id', cache=self.cache)
+
+  def _lookups(self):
+    return [r for method, r in self.connection.__dict__.get('requests', [])
+            if method == 'lookup']
+
+  def test_get_entities_reads_through(self):
+    keys = [Key.from_path('Thing', i, dataset=self.dataset) for i in (1, 2, 7)]
+    self.dataset.get_entities(keys[:1])
+    entities = self.dataset.get_entities(keys, aligned=True)
+
+    self.assertEqual([1, 2, None],
+                     [e.key().id() if e is not None else None for e in entities])
+    self.assertEqual([1, 2], [len(r.key) for r in self._lookups()])
+    self.assertEqual(1, self.cache.stats()['hits'])
+
+  def test_writes_invalidate(self):
+    cache = LRUCache(tombstone_ttl=0)
+    dataset = self.connection.dataset('id', cache=cache)
+    key = Key.from_path('Thing', 1, dataset=dataset)
+    entity = dataset.get_entity(key)
+    dataset.get_entity(key)
+    self.assertEqual(1, len(self._lookups()))
+
+    entity['name'] = 'changed'
+    entity.save()
+    dataset.get_entity(key)
+    self.assertEqual(2, len(self._lookups()))
+
+    dataset.delete_entities([key])
+    dataset.get_entity(key)
+    dataset.get_entity(key)
+    self.assertEqual(3, len(self._lookups()))
+
+  def test_lookups_before_a_write_are_not_cached(self):
+    entity = self.dataset.get_entity(Key.from_path('Thing', 1,
+                                                   dataset=self.dataset))
+    stale_pb = entity.to_protobuf()
+    self.cache.delete_key_pbs([stale_pb.key])
+
+    # A lookup made before the write finishes after it.
+    self.cache.add_entity_pbs([stale_pb])
+    self.assertEqual([None], self.cache.get_entity_pbs([stale_pb.key]))
+
+  def test_kind_ttl_of_zero_disables_caching(self):
+    key = Key.from_path('Uncached', 1, dataset=self.dataset)
+    self.dataset.get_entity(key)
+    self.dataset.get_entity(key)
+    self.assertEqual(2, len(self._lookups()))
+
+  def test_bypassed_in_transactions(self):
+    key = Key.from_path('Thing', 1, dataset=self.dataset)
+    self.dataset.get_entity(key)
+    self.connection.transaction(self.dataset.transaction())
+    try:
+      self.dataset.get_entity(key)
+    finally:
+      self.connection.transaction(None)
+    self.assertEqual(2, len(self._lookups()))
+
+
+class TestMemcacheCache(unittest2.TestCase):
+
+  def setUp(self):
+    self.client = LocalMemcacheClient()
+    self.cache = MemcacheCache(self.client, prefix='test:')
+
+  def test_hashes_keys(self):
+    self.cache.set_multi({'a key': 'value'})
+    self.assertEqual({'a key': 'value'}, self.cache.get_multi(['a key', 'b']))
+    memcache_key, = self.client._values.keys()
+    self.assertTrue(memcache_key.startswith('test:'))
+    self.assertNotIn(' ', memcache_key)
+
+  def test_add_keeps_existing_values(self):
+    self.cache.set_multi({'a': '1'})
+    self.cache.add_multi({'a': 'stale', 'b': '2'})
+    self.assertEqual({'a': '1', 'b': '2'}, self.cache.get_multi(['a', 'b']))
+
+  def test_shared_between_datasets(self):
+    writer = FakeConnection().dataset('id', cache=self.cache)
+    reader_connection = FakeConnection()
+    reader = reader_connection.dataset('id', cache=self.cache)
+
+    key = Key.from_path('Thing', 1, dataset=writer)
+    writer.get_entity(key)
+    self.assertIsNotNone(reader.get_entity(key))
+    self.assertNotIn('requests', reader_connection.__dict__)
+
+    writer.delete_entities([key])
+    reader.get_entity(key)
+    self.assertEqual(1, len(reader_connection.requests))
+
+  def test_batcher_invalidates(self):
+    dataset = FakeConnection().dataset('id', cache=self.cache)
+    entity = dataset.get_entity(Key.from_path('Thing', 3, dataset=dataset))
+    with dataset.batcher() as batcher:
+      batcher.save(entity)
+
+    self.assertEqual([None], self.cache.get_entity_pbs(
+        [entity.key().to_protobuf()]))
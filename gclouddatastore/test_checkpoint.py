@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from gclouddatastore.checkpoint import Checkpoint
+from gclouddatastore.dataset import Dataset
+from gclouddatastore.test_query import FakeFilterConnection
+
+
+class TestCheckpoint(unittest2.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.temp_dir, 'checkpoint.json')
+    connection = FakeFilterConnection(dict((id, {}) for id in range(1, 6)))
+    self.query = Dataset('test', connection=connection).query('Thing')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def test_save_and_load(self):
+    checkpoint = Checkpoint(self.path)
+    self.assertEqual((None, 0), checkpoint.load())
+    checkpoint.save('\x00\xffcursor', 12)
+    self.assertEqual(('\x00\xffcursor', 12), checkpoint.load())
+    self.assertEqual(['checkpoint.json'], os.listdir(self.temp_dir))
+    checkpoint.clear()
+    self.assertEqual((None, 0), checkpoint.load())
+
+  def test_resumes_after_failure(self):
+    checkpoint = Checkpoint(self.path, interval=0)
+    seen = []
+    with self.assertRaises(RuntimeError):
+      for entity in checkpoint.iter(self.query):
+        if entity.key().id() == 3:
+          raise RuntimeError('Crashed.')
+        seen.append(entity.key().id())
+
+    self.assertEqual(2, checkpoint.load()[1])
+    seen.extend(entity.key().id() for entity in checkpoint.iter(self.query))
+    self.assertEqual([1, 2, 3, 4, 5], seen)
+    self.assertEqual(5, checkpoint.load()[1])
+    self.assertEqual([], list(checkpoint.iter(self.query)))
+
+  def test_limit_spans_runs(self):
+    checkpoint = Checkpoint(self.path, interval=0)
+    for entity in checkpoint.iter(self.query, limit=3):
+      if entity.key().id() == 2:
+        break
+
+    self.assertEqual([2, 3], [e.key().id()
+                              for e in checkpoint.iter(self.query, limit=3)])
+
+  def test_saves_at_interval(self):
+    checkpoint = Checkpoint(self.path, interval=10)
+    checkpoint._clock = lambda: 0
+    for entity in checkpoint.iter(self.query):
+      self.assertFalse(os.path.exists(self.path))
+    self.assertEqual(5, checkpoint.load()[1])
@@ -0,0 +1,296 @@
+import threading
+
+import unittest2
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore.connection import AsyncConnection
+from gclouddatastore.connection import Connection
+from gclouddatastore.dataset import Dataset
+from gclouddatastore.exceptions import PartialFailureError
+from gclouddatastore.exceptions import RequestError
+from gclouddatastore.exceptions import TransientError
+from gclouddatastore.key import Key
+from gclouddatastore.retry import RetryPolicy
+
+
+class FakeRPCMixin(object):
+  """Answers lookups with the requested keys, based on their IDs.
+
+  IDs divisible by 5 are deferred the first time they're asked for,
+  and IDs divisible by 7 are missing.
+  """
+
+  def _rpc(self, dataset_id, method, request_pb, response_pb_cls):
+    if method == 'lookup':
+      request_pb = datastore_pb.LookupRequest.FromString(request_pb)
+    self.__dict__.setdefault('requests', []).append((method, request_pb))
+    response = response_pb_cls()
+    if method == 'lookup':
+      # The API doesn't promise to return entities in any particular order.
+      for key_pb in reversed(request_pb.key):
+        id = key_pb.path_element[-1].id
+        deferred = self.__dict__.setdefault('deferred', set())
+        if id and id % 5 == 0 and id not in deferred:
+          deferred.add(id)
+          response.deferred.add().CopyFrom(key_pb)
+        elif id % 7:
+          response.found.add().entity.key.CopyFrom(key_pb)
+        else:
+          response.missing.add().entity.key.CopyFrom(key_pb)
+    elif method == 'commit':
+      response.mutation_result.index_updates = 0
+      for entity_pb in request_pb.mutation.insert_auto_id:
+        key_pb = response.mutation_result.insert_auto_id_key.add()
+        key_pb.CopyFrom(entity_pb.key)
+        key_pb.path_element[-1].id = len(self.requests)
+    return response
+
+
+class FakeConnection(FakeRPCMixin, Connection):
+  pass
+
+
+class FakeAsyncConnection(FakeRPCMixin, AsyncConnection):
+  pass
+
+
+class TestConnection(unittest2.TestCase):
+
+  def test_build_api_url(self):
+    self.assertEqual(
+        'https://www.googleapis.com/datastore/v1beta2/datasets/id/lookup',
+        Connection.build_api_url('id', 'lookup'))
+
+  def test_submit(self):
+    connection = Connection()
+    result = connection.submit(lambda a, b=0: a + b, 1, b=2)
+    self.assertEqual(3, result.get(timeout=5))
+
+  def test_transaction_is_per_thread(self):
+    connection = Connection()
+    transaction = object()
+    connection.transaction(transaction)
+    try:
+      seen = []
+      thread = threading.Thread(
+          target=lambda: seen.append(connection.transaction()))
+      thread.start()
+      thread.join()
+      self.assertEqual([None], seen)
+
+      # Work submitted from this thread runs inside its transaction.
+      self.assertIs(transaction,
+                    connection.submit(connection.transaction).get(timeout=5))
+    finally:
+      connection.transaction(None)
+
+    self.assertIsNone(connection.submit(connection.transaction).get(timeout=5))
+
+  def test_lookup_chunks_keys_and_keeps_order(self):
+    connection = FakeConnection()
+    connection.MAX_LOOKUP_KEYS = 10
+    dataset = connection.dataset('id')
+    key_pbs = [Key.from_path('Thing', i, dataset=dataset).to_protobuf()
+               for i in range(1, 26)]
+    entity_pbs = connection.lookup('id', key_pbs)
+
+    # Each chunk also has its deferred keys looked up again.
+    self.assertEqual([10, 10, 5, 2, 2, 1],
+                     sorted([len(r.key) for _, r in connection.requests],
+                            reverse=True))
+    self.assertEqual([i for i in range(1, 26) if i % 7],
+                     [e.key.path_element[0].id for e in entity_pbs])
+
+  def test_lookup_chunks_by_size(self):
+    connection = FakeConnection()
+    connection.MAX_REQUEST_BYTES = 100
+    dataset = connection.dataset('id')
+    key_pbs = [Key.from_path('Thing', 'x' * 40, dataset=dataset).to_protobuf()
+               for i in range(3)]
+    connection.lookup('id', key_pbs)
+    self.assertEqual(3, len(connection.requests))
+
+  def test_lookup_retries_deferred_keys(self):
+    connection = FakeConnection()
+    dataset = connection.dataset('id')
+    key_pbs = [Key.from_path('Thing', i, dataset=dataset).to_protobuf()
+               for i in (4, 5, 6, 10)]
+    entity_pbs = connection.lookup('id', key_pbs)
+
+    self.assertEqual([4, 5, 6, 10],
+                     [e.key.path_element[0].id for e in entity_pbs])
+    self.assertEqual(2, len(connection.requests))
+    self.assertEqual(2, len(connection.requests[1][1].key))
+
+  def test_lookup_aligned(self):
+    connection = FakeConnection()
+    dataset = connection.dataset('id')
+    keys = [Key.from_path('Thing', i, dataset=dataset) for i in (6, 7, 8)]
+    entities = dataset.get_entities(keys, aligned=True)
+
+    self.assertEqual(3, len(entities))
+    self.assertEqual(6, entities[0].key().id())
+    self.assertEqual(None, entities[1])
+    self.assertEqual(8, entities[2].key().id())
+
+
+class FakeHttp(object):
+  """Responds to each request with the next of the given statuses."""
+
+  def __init__(self, *statuses):
+    self.statuses = list(statuses)
+
+  def request(self, uri, method, headers, body):
+    status = self.statuses.pop(0)
+    return {'status': str(status)}, ''
+
+
+class FakeHttpConnection(Connection):
+
+  def __init__(self, http, **kwargs):
+    super(FakeHttpConnection, self).__init__(**kwargs)
+    self._fake_http = http
+
+  def _build_http(self):
+    return self._fake_http
+
+
+class TestRetries(unittest2.TestCase):
+
+  def setUp(self):
+    self.no_wait = RetryPolicy(initial_delay=0)
+    self.key_pb = Key.from_path('Thing', 1, dataset=Dataset('id')).to_protobuf()
+
+  def test_request_errors_are_typed(self):
+    connection = FakeHttpConnection(FakeHttp(404))
+    with self.assertRaises(RequestError) as context:
+      connection.lookup('id', [self.key_pb])
+    self.assertEqual(404, context.exception.status)
+    self.assertEqual('lookup', context.exception.method)
+
+  def test_idempotent_requests_are_retried(self):
+    http = FakeHttp(503, 500, 200)
+    connection = FakeHttpConnection(http, retry_policy=self.no_wait)
+    self.assertEqual([], connection.lookup('id', [self.key_pb]))
+    self.assertEqual([], http.statuses)
+
+  def test_auto_id_commits_are_not_retried(self):
+    http = FakeHttp(503, 200)
+    connection = FakeHttpConnection(http, retry_policy=self.no_wait)
+    mutation = datastore_pb.Mutation()
+    mutation.insert_auto_id.add().key.CopyFrom(self.key_pb)
+    with self.assertRaises(TransientError):
+      connection.commit('id', mutation)
+
+  def test_retry_policy_per_method(self):
+    http = FakeHttp(503, 200)
+    connection = FakeHttpConnection(http,
+                                    retry_policy={'commit': self.no_wait})
+    mutation = datastore_pb.Mutation()
+    mutation.insert_auto_id.add().key.CopyFrom(self.key_pb)
+    connection.commit('id', mutation)
+    self.assertEqual([], http.statuses)
+
+
+class TestAsyncConnection(unittest2.TestCase):
+
+  def test_lookup_async(self):
+    connection = FakeAsyncConnection()
+    key_pb = Key.from_path('Thing', 1, dataset=connection.dataset('id')).to_protobuf()
+    entity_pb = connection.lookup_async('id', key_pb).get(timeout=5)
+    self.assertEqual(1, entity_pb.key.path_element[0].id)
+
+  def test_lookup_async_aligned(self):
+    connection = FakeAsyncConnection()
+    dataset = connection.dataset('id')
+    key_pbs = [Key.from_path('Thing', id, dataset=dataset).to_protobuf()
+               for id in (7, 1)]
+    entity_pbs = connection.lookup_async('id', key_pbs, aligned=True).get(
+        timeout=5)
+    self.assertIsNone(entity_pbs[0])
+    self.assertEqual(1, entity_pbs[1].key.path_element[0].id)
+
+  def test_close_stops_workers(self):
+    connection = FakeAsyncConnection()
+    before = threading.active_count()
+    connection.submit(lambda: None).get(timeout=5)
+    self.assertGreater(threading.active_count(), before)
+
+    connection.close()
+    self.assertEqual(before, threading.active_count())
+    # New workers are started if the connection is used again.
+    self.assertEqual(1, connection.submit(lambda: 1).get(timeout=5))
+    connection.close()
+
+  def test_get_entities_async(self):
+    connection = FakeAsyncConnection()
+    dataset = connection.dataset('id')
+    keys = [Key.from_path('Thing', 1, dataset=dataset),
+            Key.from_path('Thing', 2, dataset=dataset)]
+    entities = dataset.get_entities_async(keys).get(timeout=5)
+    self.assertEqual([1, 2], [e.key().id() for e in entities])
+
+
+class TestBulkMutations(unittest2.TestCase):
+
+  def test_put_entities(self):
+    connection = FakeConnection()
+    connection.MAX_MUTATIONS = 2
+    dataset = connection.dataset('id')
+    entities = [dataset.entity('Thing') for i in range(5)]
+    entities[1].key(entities[1].key().id(1234))
+    for i, entity in enumerate(entities):
+      entity['n'] = i
+
+    self.assertEqual(entities, dataset.put_entities(entities))
+    self.assertEqual(3, len(connection.requests))
+    self.assertEqual(1234, entities[1].key().id())
+    self.assertFalse([e for e in entities if e.key().is_partial()])
+
+    for _, request in connection.requests:
+      self.assertEqual(datastore_pb.CommitRequest.NON_TRANSACTIONAL,
+                       request.mode)
+
+  def test_put_entities_partial_failure(self):
+    class FailingConnection(FakeConnection):
+      def _rpc(self, dataset_id, method, request_pb, response_pb_cls):
+        names = [e.key.path_element[-1].name
+                 for e in request_pb.mutation.upsert]
+        if 'fail' in names:
+          raise RequestError(400, 'Bad entity', method=method)
+        return super(FailingConnection, self)._rpc(
+            dataset_id, method, request_pb, response_pb_cls)
+
+    connection = FailingConnection()
+    connection.MAX_MUTATIONS = 2
+    dataset = connection.dataset('id')
+    entities = [dataset.entity('Thing') for i in range(5)]
+    entities[2].key(entities[2].key().name('fail'))
+
+    with self.assertRaises(PartialFailureError) as context:
+      dataset.put_entities(entities)
+
+    self.assertEqual([2, 3], context.exception.failed_indexes())
+    self.assertEqual(
+        [False, False, True, True, False],
+        [e.key().is_partial() or e.key().name() == 'fail' for e in entities])
+
+  def test_put_entities_in_transaction(self):
+    connection = FakeConnection()
+    dataset = connection.dataset('id')
+    entities = [dataset.entity('Thing') for i in range(3)]
+
+    transaction = dataset.transaction()
+    connection.transaction(transaction)
+    dataset.put_entities(entities)
+    self.assertEqual(0, len(getattr(connection, 'requests', [])))
+    self.assertEqual(3, len(transaction.mutation().insert_auto_id))
+
+  def test_delete_entities(self):
+    connection = FakeConnection()
+    connection.MAX_MUTATIONS = 2
+    dataset = connection.dataset('id')
+    dataset.delete_entities([Key.from_path('Thing', i, dataset=dataset)
+                             for i in range(1, 6)])
+    self.assertEqual([1, 2, 2], sorted(len(r.mutation.delete)
+                                       for _, r in connection.requests))
@@ -0,0 +1,162 @@
+import unittest2
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore import exceptions
+from gclouddatastore.emulator import InMemoryConnection
+from gclouddatastore.emulator import InMemoryDatastore
+from gclouddatastore.key import Key
+
+
+class TestInMemoryDatastore(unittest2.TestCase):
+
+  def setUp(self):
+    self.datastore = InMemoryDatastore(batch_size=2)
+    self.dataset = InMemoryConnection(self.datastore).dataset('test')
+    self.people = []
+    for id, name, age, tags in ((1, 'Ada', 36, ['math']),
+                                (2, 'Bob', 25, ['art', 'math']),
+                                (3, 'Cy', 25, None),
+                                (4, 'Di', 52, ['art'])):
+      person = Key.from_path('Person', id, dataset=self.dataset)
+      person = self.dataset.entity('Person').key(person)
+      person.update({'name': name, 'age': age})
+      if tags:
+        person['tags'] = tags
+      self.people.append(person.save())
+
+  def _ids(self, query):
+    return [entity.key().id() for entity in query]
+
+  def test_lookup_and_delete(self):
+    key = self.people[0].key()
+    self.assertEqual('Ada', self.dataset.get_entity(key)['name'])
+    self.people[0].delete()
+    self.assertIsNone(self.dataset.get_entity(key))
+    self.assertEqual(3, len(self.datastore))
+
+  def test_auto_ids_dont_clash(self):
+    entity = self.dataset.entity('Person')
+    entity['name'] = 'Ed'
+    self.assertEqual(5, entity.save().key().id())
+
+  def test_filters_and_orders(self):
+    query = self.dataset.query('Person')
+    self.assertEqual([1, 2, 3, 4], self._ids(query))
+    self.assertEqual([2, 3], self._ids(query.filter('age =', 25)))
+    self.assertEqual([2, 3, 1], self._ids(query.filter('age <', 50)))
+    self.assertEqual([2, 4], self._ids(query.filter('tags =', 'art')))
+    self.assertEqual([1, 4], self._ids(query.filter('age IN', [36, 52, 99])))
+    self.assertEqual([4, 1, 2, 3], self._ids(query.order('-age')))
+    # Lists sort by their smallest value.
+    self.assertEqual([2, 4, 1], self._ids(query.order('tags')))
+    self.assertEqual([3, 2, 1], self._ids(
+        query.filter('age <', 40).order('age', '-name')))
+    self.assertEqual([2, 3], self._ids(
+        query.filter('__key__ >', self.people[0].key())
+             .filter('__key__ <', self.people[3].key())))
+
+  def test_limits_and_cursors(self):
+    query = self.dataset.query('Person').order('-age')
+    self.assertEqual([4, 1, 2], self._ids(query.limit(3)))
+
+    # Each batch holds two results, so the cursor is after the first two.
+    iterator = query.iter()
+    entities = iter(iterator)
+    self.assertEqual([4, 1, 2], [entities.next().key().id() for _ in range(3)])
+    self.assertEqual([2, 3], self._ids(query.start(iterator.cursor())))
+
+    batch = self.dataset.connection().run_query_batch(
+        'test', query.to_protobuf())
+    self.assertEqual(datastore_pb.QueryResultBatch.NOT_FINISHED,
+                     batch.more_results)
+    self.assertEqual([2, 3], self._ids(query.start(batch.end_cursor).limit(2)))
+
+  def test_projection_and_group_by(self):
+    query = self.dataset.query('Person')
+    self.assertEqual([1, 2, 3, 4], [k.id() for k in query.keys_only()])
+    rows = query.projection('age').order('age').fetch()
+    self.assertEqual([25, 25, 36, 52], [row['age'] for row in rows])
+    rows = query.projection('age').group_by('age').order('age').fetch()
+    self.assertEqual([25, 36, 52], [row['age'] for row in rows])
+
+  def test_group_by_across_batches(self):
+    for id, city in enumerate('abcabcabc', 10):
+      place = self.dataset.entity('Place').key(
+          Key.from_path('Place', id, dataset=self.dataset))
+      place['city'] = city
+      place.save()
+
+    # Each batch holds two results, so the groups span several batches.
+    query = self.dataset.query('Place').projection('city').group_by('city')
+    self.assertEqual(['a', 'b', 'c'], [row['city'] for row in query])
+    rows = query.order('-city').fetch()
+    self.assertEqual(['c', 'b', 'a'], [row['city'] for row in rows])
+    with self.assertRaises(exceptions.RequestError):
+      query.order('__key__', 'city').fetch()
+
+  def test_merged_keys_only_and_projection_orders(self):
+    query = self.dataset.query('Person').filter('age IN', [25, 36, 52])
+    keys = query.keys_only().order('-age')
+    self.assertEqual([4, 1, 2, 3], [key.id() for key in keys])
+    self.assertEqual([4, 1], [key.id() for key in keys.fetch(2)])
+    self.assertEqual([2, 3, 4], [key.id() for key in self.dataset.query(
+        'Person').keys_only().filter('age !=', 36)])
+
+    rows = query.projection('name').order('-age').fetch()
+    self.assertEqual([{'name': name} for name in ('Di', 'Ada', 'Bob', 'Cy')],
+                     [row.to_dict() for row in rows])
+
+    # A list property is returned once for each of its values.
+    keys = self.dataset.query('Person').keys_only().filter(
+        'name IN', ['Ada', 'Bob', 'Di']).order('tags')
+    self.assertEqual([2, 4, 1], [key.id() for key in keys])
+
+  def test_invalid_queries(self):
+    query = self.dataset.query('Person')
+    with self.assertRaises(exceptions.RequestError):
+      query.filter('age <', 30).filter('name >', 'A').fetch()
+    with self.assertRaises(exceptions.RequestError):
+      query.filter('age <', 30).order('name').fetch()
+    with self.assertRaises(exceptions.RequestError):
+      query.start('not a cursor').fetch()
+
+  def test_transaction_conflicts(self):
+    key_pb = self.people[0].key().to_protobuf()
+    transaction = datastore_pb.BeginTransactionResponse.FromString(
+        self.datastore.handle('test', 'beginTransaction', '')).transaction
+
+    lookup = datastore_pb.LookupRequest()
+    lookup.read_options.transaction = transaction
+    lookup.key.add().CopyFrom(key_pb)
+    self.datastore.handle('test', 'lookup', lookup.SerializeToString())
+
+    self.people[0].update({'age': 37})
+    self.people[0].save()
+
+    commit = datastore_pb.CommitRequest(
+        mode=datastore_pb.CommitRequest.TRANSACTIONAL, transaction=transaction)
+    commit.mutation.delete.add().CopyFrom(key_pb)
+    with self.assertRaises(exceptions.TransientError):
+      self.datastore.handle('test', 'commit', commit.SerializeToString())
+    self.assertEqual(37, self.dataset.get_entity(self.people[0].key())['age'])
+
+  def test_transactional_reads_conflict(self):
+    other = InMemoryConnection(self.datastore).dataset('test')
+    with self.assertRaises(exceptions.TransientError):
+      with self.dataset.transaction():
+        person = self.dataset.get_entity(self.people[0].key())
+        # Another client changes the entity after the transaction read it.
+        changed = other.get_entity(self.people[0].key())
+        changed['age'] = 37
+        changed.save()
+        person['age'] = 40
+        person.save()
+    self.assertEqual(37, self.dataset.get_entity(self.people[0].key())['age'])
+
+  def test_transaction_commit(self):
+    with self.dataset.transaction():
+      entity = self.dataset.entity('Person')
+      entity['name'] = 'Ed'
+      entity.save()
+      self.people[0].delete()
+    self.assertEqual([2, 3, 4, 5], self._ids(self.dataset.query('Person')))
@@ -1,7 +1,14 @@
+import json
+
 import unittest2
 
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore.connection import Connection
 from gclouddatastore.dataset import Dataset
+from gclouddatastore.emulator import InMemoryConnection
+from gclouddatastore.emulator import InMemoryDatastore
 from gclouddatastore.entity import Entity
+from gclouddatastore.entity import LazyEntity
 from gclouddatastore.key import Key
 
 
@@ -25,3 +32,70 @@ class TestEntity(unittest2.TestCase):
     self.assertEqual('TestKind', entity.key().kind())
     self.assertEqual(entity.key().kind(), entity.kind())
     self.assertEqual(1234, entity.key().id())
+
+  def test_to_protobuf_matches_saved_entity(self):
+    key = Key(dataset=Dataset('test-dataset')).kind('TestKind').id(1234)
+    entity = Entity.from_key(key)
+    entity['names'] = ['JJ', 'Ada']
+    entity['owner'] = key.id(1)
+
+    saved_pb = Connection()._add_entity_to_mutation(
+        datastore_pb.Mutation(), key.to_protobuf(), dict(entity.iteritems()))
+    self.assertEqual(saved_pb, entity.to_protobuf())
+
+
+class TestLazyEntity(unittest2.TestCase):
+
+  def setUp(self):
+    entity = Entity.from_key(Key(dataset=Dataset('test')).kind('Thing').id(1))
+    entity['name'] = 'JJ'
+    entity['age'] = 20
+    self.entity_pb = entity.to_protobuf()
+
+  def test_decodes_on_access(self):
+    entity = LazyEntity.from_protobuf(self.entity_pb)
+    self.assertEqual(2, len(entity))
+    self.assertIn('age', entity)
+    self.assertEqual('JJ', entity['name'])
+    self.assertEqual(['age'], entity._undecoded.keys())
+    self.assertEqual(['age', 'name'], sorted(entity))
+
+  def test_converts_to_dict(self):
+    expected = {'age': 20, 'name': 'JJ'}
+    self.assertEqual(expected, dict(LazyEntity.from_protobuf(self.entity_pb)))
+    self.assertEqual(expected, (lambda **kwargs: kwargs)(
+        **LazyEntity.from_protobuf(self.entity_pb)))
+    self.assertEqual(expected, json.loads(json.dumps(
+        LazyEntity.from_protobuf(self.entity_pb).to_dict())))
+
+    entity = Entity()
+    entity.update(LazyEntity.from_protobuf(self.entity_pb))
+    self.assertEqual(expected, entity)
+    self.assertEqual(Entity.from_protobuf(self.entity_pb),
+                     LazyEntity.from_protobuf(self.entity_pb))
+
+  def test_setting_and_deleting(self):
+    entity = LazyEntity.from_protobuf(self.entity_pb)
+    entity['name'] = 'Ada'
+    del entity['age']
+    self.assertEqual({'name': 'Ada'}, dict(entity.iteritems()))
+    with self.assertRaises(KeyError):
+      entity['age']
+
+  def test_reload(self):
+    connection = InMemoryConnection(InMemoryDatastore())
+    dataset = connection.dataset('id', lazy=True)
+    stored = dataset.entity('Thing').key(Key.from_path('Thing', 1,
+                                                        dataset=dataset))
+    stored.update({'name': 'stored', 'age': 20})
+    stored.save()
+
+    entity = Entity.from_key(stored.key())
+    entity.update({'name': 'local', 'local': True})
+    self.assertEqual({'name': 'stored', 'age': 20, 'local': True},
+                     entity.reload())
+
+    lazy = dataset.get_entity(stored.key())
+    lazy['name'] = 'local'
+    self.assertIs(lazy, lazy.reload())
+    self.assertEqual('stored', lazy['name'])
@@ -0,0 +1,85 @@
+import datetime
+import decimal
+
+import pytz
+import unittest2
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore import helpers
+from gclouddatastore.dataset import Dataset
+from gclouddatastore.key import Key
+
+
+def _round_trip(val):
+  property_pb = datastore_pb.Property(name='property')
+  helpers.set_protobuf_value(property_pb.value, val)
+  return helpers.get_value_from_protobuf(property_pb)
+
+
+class TestValues(unittest2.TestCase):
+
+  def test_scalars(self):
+    for val in (True, 1234, 2 ** 40, 3.5, 'string', u'unicode'):
+      self.assertEqual(val, _round_trip(val))
+
+  def test_bool_is_not_integer(self):
+    self.assertEqual(('boolean_value', False),
+                     helpers.get_protobuf_attribute_and_value(False))
+
+  def test_timestamp(self):
+    val = datetime.datetime(2014, 1, 2, 3, 4, 5, 6789, tzinfo=pytz.utc)
+    self.assertEqual(
+        ('timestamp_microseconds_value', 1388631845006789),
+        helpers.get_protobuf_attribute_and_value(val))
+    self.assertEqual(val, _round_trip(val))
+    self.assertEqual(val, _round_trip(val.replace(tzinfo=None)))
+
+  def test_key(self):
+    key = Key.from_path('Thing', 1, dataset=Dataset('id'))
+    self.assertEqual(key.path(), _round_trip(key).path())
+
+  def test_list(self):
+    self.assertEqual([1, 'two', [3.0]], _round_trip((1, 'two', [3.0])))
+
+  def test_subclass_uses_base_encoder(self):
+
+    class Name(str):
+      pass
+
+    self.assertEqual(('string_value', 'JJ'),
+                     helpers.get_protobuf_attribute_and_value(Name('JJ')))
+
+  def test_register_type(self):
+    helpers.register_type(decimal.Decimal, 'string_value', str)
+    try:
+      self.assertEqual('1.50', _round_trip(decimal.Decimal('1.50')))
+    finally:
+      del helpers._ENCODERS[decimal.Decimal]
+      helpers._encoder_cache.pop(decimal.Decimal, None)
+
+    with self.assertRaises(ValueError):
+      helpers.register_type(decimal.Decimal, 'decimal_value')
+
+  def test_unsupported_type(self):
+    with self.assertRaises(ValueError):
+      helpers.set_protobuf_value(datastore_pb.Value(), object())
+
+  def test_unset_value(self):
+    self.assertIsNone(helpers.get_value_from_protobuf(datastore_pb.Property()))
+
+
+class TestEncoding(unittest2.TestCase):
+
+  def test_encode_bytes_field(self):
+    key_pb = Key.from_path('Thing', 1, dataset=Dataset('id')).to_protobuf()
+    request = helpers.encode_bytes_field(3, key_pb.SerializeToString()) * 2
+    self.assertEqual([key_pb, key_pb],
+                     list(datastore_pb.LookupRequest.FromString(request).key))
+
+  def test_appended_fields_take_precedence(self):
+    query_pb = datastore_pb.Query(limit=5, start_cursor='old')
+    query_pb = datastore_pb.Query.FromString(
+        query_pb.SerializeToString() +
+        helpers.encode_bytes_field(7, 'new') +
+        helpers.encode_varint_field(11, 300))
+    self.assertEqual(('new', 300), (query_pb.start_cursor, query_pb.limit))
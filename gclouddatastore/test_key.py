@@ -1,6 +1,7 @@
 import unittest2
 
-from key import Key
+from gclouddatastore.dataset import Dataset
+from gclouddatastore.key import Key
 
 
 class TestKey(unittest2.TestCase):
@@ -11,3 +12,42 @@ class TestKey(unittest2.TestCase):
     self.assertEqual('', key.kind())
     self.assertEqual(None, key.dataset())
     self.assertEqual(None, key.namespace())
+
+  def test_setters_return_new_keys(self):
+    key = Key().kind('Thing')
+    self.assertIsNot(key, key.id(1))
+    self.assertEqual(1, key.id(1).id())
+    self.assertIsNone(key.id())
+    self.assertTrue(key.is_partial())
+    self.assertEqual('x', key.name('x').id_or_name())
+
+  def test_path_is_compatible(self):
+    key = Key.from_path('Parent', 'p', 'Child', 2)
+    self.assertEqual([{'kind': 'Parent', 'name': 'p'},
+                      {'kind': 'Child', 'id': 2}], key.path())
+    self.assertEqual(key, Key(path=key.path()))
+    self.assertTrue(Key.from_path('Thing').is_partial())
+
+  def test_hashable(self):
+    dataset = Dataset('test')
+    keys = set([Key.from_path('Thing', 1, dataset=dataset),
+                Key(dataset=Dataset('s~test')).kind('Thing').id(1)])
+    self.assertEqual(1, len(keys))
+    self.assertNotEqual(Key.from_path('Thing', 1, dataset=dataset),
+                        Key.from_path('Thing', 1, dataset=dataset,
+                                      namespace='other'))
+
+  def test_protobuf_round_trip(self):
+    key = Key.from_path('Thing', 'x', dataset=Dataset('test'),
+                        namespace='ns')
+    key_pb = key.to_protobuf()
+    self.assertIs(key_pb, key.to_protobuf())
+    self.assertEqual('s~test', key_pb.partition_id.dataset_id)
+    self.assertEqual(key, Key.from_protobuf(key_pb))
+    self.assertEqual('ns', Key.from_protobuf(key_pb).namespace())
+
+  def test_serialized_once(self):
+    key = Key.from_path('Thing', 1, dataset=Dataset('test'))
+    serialized = key.to_protobuf_string()
+    self.assertIs(serialized, key.to_protobuf_string())
+    self.assertEqual(key.to_protobuf().SerializeToString(), serialized)
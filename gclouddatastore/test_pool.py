@@ -0,0 +1,57 @@
+import unittest2
+
+from gclouddatastore.pool import HttpPool
+
+
+class FakeHttp(object):
+
+  def __init__(self):
+    self.closed = False
+    self.connections = {'host': self}
+
+  def close(self):
+    self.closed = True
+
+
+class TestHttpPool(unittest2.TestCase):
+
+  def test_transport_is_reused(self):
+    pool = HttpPool(FakeHttp)
+    with pool.transport('host') as first:
+      pass
+    with pool.transport('host') as second:
+      pass
+    self.assertIs(first, second)
+    self.assertEqual(1, pool.idle_count())
+
+  def test_concurrent_checkouts_get_separate_transports(self):
+    pool = HttpPool(FakeHttp)
+    first = pool.checkout('host')
+    second = pool.checkout('host')
+    self.assertIsNot(first, second)
+
+  def test_full_pool_closes_returned_transports(self):
+    pool = HttpPool(FakeHttp, max_size=1)
+    first = pool.checkout('host')
+    second = pool.checkout('host')
+    pool.checkin('host', first)
+    pool.checkin('host', second)
+    self.assertFalse(first.closed)
+    self.assertTrue(second.closed)
+
+  def test_failed_transport_is_not_reused(self):
+    pool = HttpPool(FakeHttp)
+    with self.assertRaises(ValueError):
+      with pool.transport('host') as http:
+        raise ValueError
+    self.assertTrue(http.closed)
+    self.assertEqual(0, pool.idle_count())
+
+  def test_idle_timeout(self):
+    pool = HttpPool(FakeHttp, idle_timeout=-1)
+    with pool.transport('host') as first:
+      pass
+    with pool.transport('host') as second:
+      pass
+    self.assertIsNot(first, second)
+    self.assertTrue(first.closed)
@@ -0,0 +1,386 @@
+import unittest2
+
+from gclouddatastore import datastore_v1_pb2 as datastore_pb
+from gclouddatastore import helpers
+from gclouddatastore.connection import Connection
+from gclouddatastore.dataset import Dataset
+from gclouddatastore.entity import Entity
+from gclouddatastore.key import Key
+from gclouddatastore.query import MultiQuery
+from gclouddatastore.query import Query
+
+
+class FakeConnection(object):
+  """A connection returning canned batches of results, one per request."""
+
+  def __init__(self, batches):
+    self._batches = list(batches)
+    self.requests = []
+
+  def run_query_batch(self, dataset_id, query_pb, namespace=None):
+    self.requests.append(datastore_pb.Query.FromString(query_pb))
+    return self._batches.pop(0)
+
+
+class FakeScatterConnection(object):
+  """A connection returning scattered keys, then one entity per shard."""
+
+  def __init__(self, scatter_ids):
+    self._scatter_ids = scatter_ids
+    self.requests = []
+
+  def run_query(self, dataset_id, query_pb, namespace=None):
+    batch = _make_batch(self._scatter_ids, '',
+                        datastore_pb.QueryResultBatch.NO_MORE_RESULTS)
+    return [result.entity for result in batch.entity_result]
+
+  def run_query_batch(self, dataset_id, query_pb, namespace=None):
+    self.requests.append(datastore_pb.Query.FromString(query_pb))
+    return _make_batch([len(self.requests)], 'cursor',
+                       datastore_pb.QueryResultBatch.NO_MORE_RESULTS)
+
+
+class FakeFilterConnection(Connection):
+  """A connection running queries over a few entities, a result per batch.
+
+  Entities are given by ID, or by ``(namespace, id)``.
+  """
+
+  def __init__(self, entities):
+    super(FakeFilterConnection, self).__init__()
+    self._entity_pbs = []
+    for id, properties in sorted(entities.items()):
+      namespace, id = id if isinstance(id, tuple) else (None, id)
+      key = Key.from_path('Thing', id, dataset=Dataset('test'),
+                          namespace=namespace)
+      entity = Entity.from_key(key)
+      entity.update(properties)
+      self._entity_pbs.append(entity.to_protobuf())
+    self.requests = []
+
+  def _get_value(self, entity_pb, property_name):
+    for property_pb in entity_pb.property:
+      if property_pb.name == property_name:
+        return helpers.get_value_ordering(property_pb.value)
+
+  def _matches(self, entity_pb, property_filter):
+    values = dict((p.name, p.value) for p in entity_pb.property)
+    if property_filter.property.name not in values:
+      return False
+    value_pb = values[property_filter.property.name]
+    other = helpers.get_value_ordering(property_filter.value)
+    # A list matches if any of its values do.
+    for value_pb in value_pb.list_value or [value_pb]:
+      value = helpers.get_value_ordering(value_pb)
+      if {datastore_pb.PropertyFilter.EQUAL: value == other,
+          datastore_pb.PropertyFilter.LESS_THAN: value < other,
+          datastore_pb.PropertyFilter.GREATER_THAN: value > other,
+          }[property_filter.operator]:
+        return True
+    return False
+
+  def run_query_batch(self, dataset_id, query_pb, namespace=None):
+    query_pb = datastore_pb.Query.FromString(query_pb)
+    self.requests.append(query_pb)
+
+    filters = [f.property_filter for f in query_pb.filter.composite_filter.filter]
+    results = [e for e in self._entity_pbs
+               if e.key.partition_id.namespace == (namespace or '') and
+               all(self._matches(e, f) for f in filters)]
+
+    orders = [(o.property.name, o.direction == o.DESCENDING)
+              for o in query_pb.order]
+    orders = orders or [(f.property.name, False) for f in filters
+                        if f.operator != datastore_pb.PropertyFilter.EQUAL]
+    for property_name, descending in reversed(orders):
+      results.sort(key=lambda e: self._get_value(e, property_name),
+                   reverse=descending)
+
+    offset = int(query_pb.start_cursor or 0)
+    end = offset + 1
+    more_results = datastore_pb.QueryResultBatch.NOT_FINISHED
+    if (query_pb.limit and end - offset >= query_pb.limit or
+        end >= len(results)):
+      more_results = datastore_pb.QueryResultBatch.NO_MORE_RESULTS
+
+    batch = _make_batch([], str(end), more_results)
+    for entity_pb in results[offset:end]:
+      batch.entity_result.add().entity.CopyFrom(entity_pb)
+    return batch
+
+
+def _make_batch(ids, cursor, more_results):
+  batch = datastore_pb.QueryResultBatch()
+  batch.entity_result_type = datastore_pb.EntityResult.FULL
+  batch.more_results = more_results
+  batch.end_cursor = cursor
+  for id in ids:
+    entity_pb = batch.entity_result.add().entity
+    element = entity_pb.key.path_element.add()
+    element.kind = 'Thing'
+    element.id = id
+  return batch
+
+
+class TestQuery(unittest2.TestCase):
+
+  def test_iter_follows_cursors(self):
+    connection = FakeConnection([
+        _make_batch([1, 2], 'cursor-1', datastore_pb.QueryResultBatch.NOT_FINISHED),
+        _make_batch([3], 'cursor-2', datastore_pb.QueryResultBatch.NO_MORE_RESULTS),
+        ])
+    dataset = Dataset('test', connection=connection)
+    entities = list(dataset.query('Thing'))
+
+    self.assertEqual([1, 2, 3], [e.key().id() for e in entities])
+    self.assertIsInstance(entities[0], Entity)
+    self.assertFalse(connection.requests[0].HasField('start_cursor'))
+    self.assertEqual('cursor-1', connection.requests[1].start_cursor)
+
+  def test_iter_is_lazy(self):
+    connection = FakeConnection([
+        _make_batch([1, 2], 'cursor-1', datastore_pb.QueryResultBatch.NOT_FINISHED),
+        _make_batch([3], 'cursor-2', datastore_pb.QueryResultBatch.NO_MORE_RESULTS),
+        ])
+    iterator = iter(Dataset('test', connection=connection).query('Thing'))
+    iterator.next()
+    iterator.next()
+    self.assertEqual(1, len(connection.requests))
+
+  def test_fetch_limit_spans_batches(self):
+    connection = FakeConnection([
+        _make_batch([1, 2], 'cursor-1', datastore_pb.QueryResultBatch.NOT_FINISHED),
+        _make_batch([3], 'cursor-2', datastore_pb.QueryResultBatch.MORE_RESULTS_AFTER_LIMIT),
+        ])
+    query = Dataset('test', connection=connection).query('Thing')
+    entities = query.fetch(3)
+
+    self.assertEqual(3, len(entities))
+    self.assertEqual(3, connection.requests[0].limit)
+    self.assertEqual(1, connection.requests[1].limit)
+    self.assertEqual(0, query.limit())
+
+  def test_iter_prefetch(self):
+    connection = FakeConnection([
+        _make_batch([1, 2], 'cursor-1', datastore_pb.QueryResultBatch.NOT_FINISHED),
+        _make_batch([3, 4], 'cursor-2', datastore_pb.QueryResultBatch.NOT_FINISHED),
+        _make_batch([5], 'cursor-3', datastore_pb.QueryResultBatch.NO_MORE_RESULTS),
+        ])
+    query = Dataset('test', connection=connection).query('Thing')
+    entities = list(query.iter(prefetch=1))
+
+    self.assertEqual([1, 2, 3, 4, 5], [e.key().id() for e in entities])
+    self.assertEqual(['cursor-1', 'cursor-2'],
+                     [r.start_cursor for r in connection.requests[1:]])
+
+  def test_iter_prefetch_raises_errors(self):
+    connection = FakeConnection([
+        _make_batch([1], 'cursor-1', datastore_pb.QueryResultBatch.NOT_FINISHED),
+        ])
+    query = Dataset('test', connection=connection).query('Thing')
+    iterator = iter(query.iter(prefetch=2))
+    self.assertEqual(1, iterator.next().key().id())
+    # The fake connection has no second batch to give.
+    with self.assertRaises(IndexError):
+      iterator.next()
+
+  def test_parallel_scan_splits_key_range(self):
+    connection = FakeScatterConnection([9, 3, 12, 6, 1, 7])
+    query = Dataset('test', connection=connection).query('Thing')
+    entities = list(query.parallel_scan(shards=3))
+
+    self.assertEqual([1, 2, 3], sorted(e.key().id() for e in entities))
+
+    ranges = []
+    for query_pb in connection.requests:
+      filters = query_pb.filter.composite_filter.filter
+      ranges.append(sorted((f.property_filter.operator,
+                            f.property_filter.value.key_value.path_element[0].id)
+                           for f in filters))
+    self.assertItemsEqual([
+        [(datastore_pb.PropertyFilter.LESS_THAN, 6)],
+        [(datastore_pb.PropertyFilter.LESS_THAN, 9),
+         (datastore_pb.PropertyFilter.GREATER_THAN_OR_EQUAL, 6)],
+        [(datastore_pb.PropertyFilter.GREATER_THAN_OR_EQUAL, 9)],
+        ], ranges)
+
+  def test_parallel_scan_requires_no_limit(self):
+    query = Dataset('test', connection=FakeScatterConnection([])).query('Thing')
+    with self.assertRaises(ValueError):
+      query.limit(10).parallel_scan()
+
+  def test_parallel_scan_requires_bounded_prefetch(self):
+    query = Dataset('test', connection=FakeScatterConnection([])).query('Thing')
+    with self.assertRaises(ValueError):
+      query.parallel_scan(prefetch=0)
+
+  def test_serialized_once_per_query(self):
+    query = Query('Thing')
+    serialized = query.to_protobuf_string()
+    self.assertIs(serialized, query.to_protobuf_string())
+    self.assertNotEqual(serialized, query.limit(1).to_protobuf_string())
+
+  def test_builders_share_and_leave_original_alone(self):
+    query = Query('Thing').filter('age >=', 20)
+    filtered = query.filter('name =', 'JJ').limit(5)
+
+    self.assertEqual(1, len(query.to_protobuf().filter.composite_filter.filter))
+    self.assertEqual(0, query.limit())
+    filters = filtered.to_protobuf().filter.composite_filter.filter
+    self.assertEqual(['age', 'name'], [f.property_filter.property.name
+                                       for f in filters])
+    self.assertEqual(datastore_pb.PropertyFilter.GREATER_THAN_OR_EQUAL,
+                     filters[0].property_filter.operator)
+    self.assertIs(filtered.to_protobuf(), filtered.to_protobuf())
+
+  def test_keys_only(self):
+    connection = FakeConnection([
+        _make_batch([1, 2], '', datastore_pb.QueryResultBatch.NO_MORE_RESULTS),
+        ])
+    query = Dataset('test', connection=connection).query('Thing').keys_only()
+    keys = query.fetch()
+
+    self.assertTrue(query.is_keys_only())
+    self.assertEqual(['__key__'], [p.property.name for p in
+                                   connection.requests[0].projection])
+    self.assertIsInstance(keys[0], Key)
+    self.assertEqual([1, 2], [key.id() for key in keys])
+
+  def test_projection(self):
+    batch = _make_batch([1], '', datastore_pb.QueryResultBatch.NO_MORE_RESULTS)
+    property_pb = batch.entity_result[0].entity.property.add()
+    property_pb.name = 'name'
+    property_pb.value.string_value = 'JJ'
+
+    connection = FakeConnection([batch])
+    query = Dataset('test', connection=connection).query('Thing')
+    row, = query.projection('name', 'age').fetch()
+
+    self.assertEqual(('name', 'age'), query.projection('name', 'age').projection())
+    self.assertEqual(['name', 'age'], [p.property.name for p in
+                                       connection.requests[0].projection])
+    self.assertEqual(1, row.key().id())
+    self.assertEqual('JJ', row['name'])
+    self.assertIsNone(row['age'])
+    self.assertEqual({'name': 'JJ', 'age': None}, row.to_dict())
+
+  def test_group_by_with_aggregation(self):
+    batch = _make_batch([1], '', datastore_pb.QueryResultBatch.NO_MORE_RESULTS)
+    for name, value in (('city', 'Paris'), ('name', 'JJ')):
+      property_pb = batch.entity_result[0].entity.property.add()
+      property_pb.name = name
+      property_pb.value.string_value = value
+
+    connection = FakeConnection([batch])
+    query = Dataset('test', connection=connection).query('Person')
+    query = query.group_by('city').projection('city', ('name', 'first'))
+    row, = query.fetch()
+
+    query_pb = connection.requests[0]
+    self.assertEqual(['city'], [p.name for p in query_pb.group_by])
+    self.assertEqual(datastore_pb.PropertyExpression.FIRST,
+                     query_pb.projection[1].aggregation_function)
+    self.assertFalse(query_pb.projection[0].HasField('aggregation_function'))
+    self.assertEqual({'city': 'Paris', 'name': 'JJ'}, row.to_dict())
+
+    with self.assertRaises(ValueError):
+      query.projection(('name', 'sum'))
+
+  def test_in_filter_merges_sub_queries(self):
+    connection = FakeFilterConnection({
+        1: {'status': 'new'}, 2: {'status': 'done'}, 3: {'status': 'active'},
+        4: {'status': 'new'}, 5: {'status': 'active'},
+        })
+    query = Dataset('test', connection=connection).query('Thing')
+    query = query.filter('status IN', ['new', 'active', 'missing'])
+
+    self.assertEqual([1, 3, 4, 5], [e.key().id() for e in query])
+    self.assertEqual([1, 3], [e.key().id() for e in query.fetch(2)])
+    self.assertEqual(['active', 'missing', 'new'], sorted(
+        f.property_filter.value.string_value for r in connection.requests[:3]
+        for f in r.filter.composite_filter.filter))
+
+  def test_not_equal_and_or_filters_merge_in_order(self):
+    connection = FakeFilterConnection({
+        1: {'age': 30, 'tags': ['a', 'b']}, 2: {'age': 10, 'tags': ['b']},
+        3: {'age': 20, 'tags': ['a']}, 4: {'age': 40, 'tags': ['c']},
+        })
+    query = Dataset('test', connection=connection).query('Thing')
+
+    self.assertEqual([2, 3, 4], [e.key().id()
+                                 for e in query.filter('age !=', 30)])
+    self.assertEqual([1, 2, 4], [e.key().id() for e in query.filter_any(
+        ('tags =', 'b'), ('tags =', 'c'))])
+    self.assertEqual([2, 4], [e.key().id() for e in query.filter_any(
+        ('age <', 15), ('age >', 35))])
+
+  def test_disjunctive_query_limits(self):
+    query = Query('Thing').filter('a IN', range(6)).filter('b IN', range(6))
+    with self.assertRaises(ValueError):
+      query.fetch()
+    with self.assertRaises(ValueError):
+      query.to_protobuf()
+    self.assertEqual(['Thing'], [k.name for k in query.kind()])
+    with self.assertRaises(ValueError):
+      Query('Thing').filter('a IN', [])
+    with self.assertRaises(ValueError):
+      Query('Thing').filter_any(('a <', 1), ('b >', 2)).fetch()
+
+  def test_order(self):
+    query = Query('Thing').order('-age', 'name')
+    self.assertEqual(('-age', 'name'), query.order())
+    self.assertEqual([('age', datastore_pb.PropertyOrder.DESCENDING),
+                      ('name', datastore_pb.PropertyOrder.ASCENDING)],
+                     [(o.property.name, o.direction)
+                      for o in query.to_protobuf().order])
+    with self.assertRaises(ValueError):
+      query.order('-')
+
+  def test_ordered_in_filter_merges_in_order(self):
+    connection = FakeFilterConnection({
+        1: {'status': 'new', 'age': 30}, 2: {'status': 'active', 'age': 40},
+        3: {'status': 'new', 'age': 40}, 4: {'status': 'active', 'age': 20},
+        })
+    query = Dataset('test', connection=connection).query('Thing')
+    query = query.filter('status IN', ['new', 'active']).order('-age')
+    self.assertEqual([2, 3, 1, 4], [e.key().id() for e in query])
+
+  def test_multi_query_merges_namespaces(self):
+    connection = FakeFilterConnection({
+        ('a', 1): {'age': 30}, ('a', 2): {'age': 10},
+        ('b', 1): {'age': 20}, ('b', 2): {'age': 40},
+        ('c', 1): {'age': 50},
+        })
+    query = Dataset('test', connection=connection).query('Thing').order('age')
+    multi_query = MultiQuery(query, ['a', 'b'])
+
+    self.assertEqual([('a', 2), ('b', 1), ('a', 1), ('b', 2)],
+                     [(e.key().namespace(), e.key().id()) for e in multi_query])
+    self.assertEqual([10, 20], [e['age'] for e in multi_query.fetch(2)])
+    self.assertEqual(set(['a', 'b']), set(
+        query.namespace() for query in multi_query.queries()))
+    self.assertEqual([], MultiQuery(query, []).fetch())
+
+  def test_cursors(self):
+    query = Query('Thing').start('start').end('end')
+    self.assertEqual(('start', 'end'), (query.start(), query.end()))
+    self.assertEqual('start', query.to_protobuf().start_cursor)
+    self.assertEqual('end', query.to_protobuf().end_cursor)
+    with self.assertRaises(ValueError):
+      query.filter('a IN', [1, 2]).fetch()
+
+  def test_iterator_cursor_follows_returned_batches(self):
+    connection = FakeConnection([
+        _make_batch([1, 2], 'cursor-1', datastore_pb.QueryResultBatch.NOT_FINISHED),
+        _make_batch([3], 'cursor-2', datastore_pb.QueryResultBatch.NO_MORE_RESULTS),
+        ])
+    query = Dataset('test', connection=connection).query('Thing')
+    iterator = query.start('cursor-0').iter()
+    entities = iter(iterator)
+
+    self.assertEqual('cursor-0', iterator.cursor())
+    [entities.next() for _ in range(3)]
+    self.assertEqual(('cursor-1', 2), (iterator.cursor(), iterator.count()))
+    self.assertEqual([], list(entities))
+    self.assertEqual(('cursor-2', 3), (iterator.cursor(), iterator.count()))
+    self.assertEqual('cursor-0', connection.requests[0].start_cursor)
@@ -0,0 +1,59 @@
+import unittest2
+
+from gclouddatastore.exceptions import RequestError
+from gclouddatastore.exceptions import TransientError
+from gclouddatastore.retry import RetryPolicy
+
+
+class Flaky(object):
+  """A callable failing with the given errors before succeeding."""
+
+  def __init__(self, *errors):
+    self.errors = list(errors)
+    self.calls = 0
+
+  def __call__(self):
+    self.calls += 1
+    if self.errors:
+      raise self.errors.pop(0)
+    return 'ok'
+
+
+class TestRetryPolicy(unittest2.TestCase):
+
+  def test_delays_grow_exponentially(self):
+    policy = RetryPolicy(max_attempts=5, initial_delay=1, max_delay=5,
+                         jitter=False)
+    self.assertEqual([1, 2, 4, 5], list(policy.delays()))
+
+  def test_jittered_delays(self):
+    policy = RetryPolicy(max_attempts=20, initial_delay=1, max_delay=1)
+    for delay in policy.delays():
+      self.assertTrue(0 <= delay <= 1)
+
+  def test_retries_transient_errors(self):
+    sleeps = []
+    func = Flaky(TransientError(503, ''), TransientError(500, ''))
+    policy = RetryPolicy(jitter=False)
+    self.assertEqual('ok', policy.call(func, sleep=sleeps.append))
+    self.assertEqual(3, func.calls)
+    self.assertEqual([0.1, 0.2], sleeps)
+
+  def test_does_not_retry_other_errors(self):
+    func = Flaky(RequestError(400, 'bad request'))
+    with self.assertRaises(RequestError):
+      RetryPolicy().call(func, sleep=lambda delay: None)
+    self.assertEqual(1, func.calls)
+
+  def test_gives_up_after_max_attempts(self):
+    func = Flaky(*[TransientError(503, '')] * 3)
+    with self.assertRaises(TransientError):
+      RetryPolicy(max_attempts=3).call(func, sleep=lambda delay: None)
+    self.assertEqual(3, func.calls)
+
+  def test_gives_up_at_deadline(self):
+    func = Flaky(*[TransientError(503, '')] * 3)
+    policy = RetryPolicy(initial_delay=10, jitter=False, deadline=5)
+    with self.assertRaises(TransientError):
+      policy.call(func, sleep=lambda delay: None)
+    self.assertEqual(1, func.calls)
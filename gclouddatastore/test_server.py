@@ -0,0 +1,46 @@
+import httplib
+
+import unittest2
+
+from gclouddatastore import exceptions
+from gclouddatastore.connection import Connection
+from gclouddatastore.retry import RetryPolicy
+from gclouddatastore.server import DatastoreServer
+
+
+class TestDatastoreServer(unittest2.TestCase):
+
+  def test_round_trip(self):
+    with DatastoreServer() as server:
+      dataset = Connection(api_base_url=server.url()).dataset('test')
+      entity = dataset.entity('Thing')
+      entity['name'] = 'JJ'
+      entity = entity.save()
+
+      self.assertEqual('JJ', dataset.get_entity(entity.key())['name'])
+      self.assertEqual([entity.key()],
+                       [e.key() for e in dataset.query('Thing')])
+      self.assertEqual(1, len(server.datastore()))
+      self.assertEqual({'commit': 1, 'lookup': 1, 'runQuery': 1},
+                       server.request_counts)
+
+  def test_injected_errors_are_retried(self):
+    with DatastoreServer(error_rate=1) as server:
+      connection = Connection(
+          api_base_url=server.url(),
+          retry_policy=RetryPolicy(max_attempts=3, initial_delay=0))
+      with self.assertRaises(exceptions.TransientError):
+        connection.dataset('test').query('Thing').fetch()
+      self.assertEqual({'runQuery': 3}, server.request_counts)
+
+  def test_invalid_requests(self):
+    with DatastoreServer() as server:
+      http = httplib.HTTPConnection(*server.server_address[:2])
+      http.request('POST', '/datastore/v1beta2/datasets/test/nothing', 'x',
+                   {'Content-Type': 'application/x-protobuf'})
+      response = http.getresponse()
+      response.read()
+      self.assertEqual(404, response.status)
+      http.request('POST', '/datastore/v1beta2/datasets/test/lookup', 'x',
+                   {'Content-Type': 'application/json'})
+      self.assertEqual(415, http.getresponse().status)
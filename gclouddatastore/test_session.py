@@ -0,0 +1,62 @@
+import unittest2
+
+from gclouddatastore.key import Key
+from gclouddatastore.test_connection import FakeConnection
+
+
+class TestSession(unittest2.TestCase):
+
+  def setUp(self):
+    self.connection = FakeConnection()
+    self.dataset = self.connection.dataset('id')
+
+  def _lookups(self):
+    return [r for method, r in self.connection.__dict__.get('requests', [])
+            if method == 'lookup']
+
+  def _key(self, id):
+    return Key.from_path('Thing', id, dataset=self.dataset)
+
+  def test_identity_map(self):
+    with self.dataset.session() as session:
+      entity = self.dataset.get_entity(self._key(1))
+      self.assertIs(entity, self.dataset.get_entity(self._key(1)))
+      self.assertIsNone(self.dataset.get_entity(self._key(7)))
+      self.assertIsNone(self.dataset.get_entity(self._key(7)))
+      self.assertEqual(2, len(session))
+
+    self.assertEqual(2, len(self._lookups()))
+    self.assertEqual(0, len(session))
+    self.assertIsNot(entity, self.dataset.get_entity(self._key(1)))
+
+  def test_get_entity_later_batches_lookups(self):
+    with self.dataset.session() as session:
+      first = session.get_entity_later(self._key(1))
+      second = session.get_entity_later(self._key(2))
+      self.assertEqual([], self._lookups())
+
+      self.assertEqual(1, first.get().key().id())
+      self.assertEqual(2, second.get().key().id())
+
+    self.assertEqual([2], [len(r.key) for r in self._lookups()])
+
+  def test_save_and_delete_forget_entities(self):
+    with self.dataset.session():
+      entity = self.dataset.get_entity(self._key(1))
+      entity.save()
+      self.assertIsNot(entity, self.dataset.get_entity(self._key(1)))
+      entity.delete()
+      self.dataset.get_entity(self._key(1))
+
+    self.assertEqual(3, len(self._lookups()))
+
+  def test_bypassed_in_transactions(self):
+    with self.dataset.session():
+      self.dataset.get_entity(self._key(1))
+      self.connection.transaction(self.dataset.transaction())
+      try:
+        self.dataset.get_entity(self._key(1))
+      finally:
+        self.connection.transaction(None)
+
+    self.assertEqual(2, len(self._lookups()))
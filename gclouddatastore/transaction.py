@@ -199,6 +199,9 @@ class Transaction(object):
     This method is called automatically when entering a with statement,
     however it can be called explicitly
     if you don't want to use a context manager.
+
+    The transaction only becomes current on the calling thread,
+    so it should be committed (or rolled back) from that thread too.
     """
     self._id = self.connection().begin_transaction(self.dataset().id())
     self.connection().transaction(self)
@@ -227,23 +230,37 @@ class Transaction(object):
     - Sets the current connection's transaction reference to None.
     - Sets the current transaction's ID to None.
     - Updates paths for any keys that needed an automatically generated ID.
+    - Invalidates any cached entities that were written.
     """
     # It's possible that they called commit() already, in which case
     # we shouldn't do any committing of our own.
-    if self.connection().transaction():
-      result = self.connection().commit(self.dataset().id(), self.mutation())
-
-      # For any of the auto-id entities, make sure we update their keys.
-      for i, entity in enumerate(self._auto_id_entities):
-        key_pb = result.insert_auto_id_key[i]
-        key = Key.from_protobuf(key_pb)
-        entity.key(entity.key().path(key.path()))
-
-    # Tell the connection that the transaction is over.
-    self.connection().transaction(None)
-
-    # Clear our own ID in case this gets accidentally reused.
-    self._id = None
+    if not self.connection().transaction():
+      self._id = None
+      return
+
+    try:
+      mutation = self.mutation()
+      result = self.connection().commit(self.dataset().id(), mutation)
+    finally:
+      # Tell the connection that the transaction is over,
+      # even if it failed (so later reads aren't made inside it).
+      self.connection().transaction(None)
+
+      # Clear our own ID in case this gets accidentally reused.
+      self._id = None
+
+    # Anything looked up since the writes were made
+    # might have cached the versions from before them.
+    self.dataset()._uncache_key_pbs(
+        [entity_pb.key for entity_pb in mutation.upsert] +
+        [entity_pb.key for entity_pb in mutation.update] +
+        list(mutation.delete))
+
+    # For any of the auto-id entities, make sure we update their keys.
+    for i, entity in enumerate(self._auto_id_entities):
+      key_pb = result.insert_auto_id_key[i]
+      key = Key.from_protobuf(key_pb)
+      entity.key(entity.key().path(key.path()))
 
   def __enter__(self):
     self.begin()